@@ -0,0 +1,159 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARN', ERROR: 'ERROR'}
+
+
+class LogEntry:
+    """Một dòng nhật ký: thời điểm, mức, thiết bị (M, D, tags... hoặc None), nội dung"""
+    __slots__ = ('seq', 'timestamp', 'level', 'device', 'message')
+
+    def __init__(self, seq, timestamp, level, device, message):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.level = level
+        self.device = device
+        self.message = message
+
+    def format(self):
+        stamp = time.strftime('%H:%M:%S', time.localtime(self.timestamp))
+        millis = int(self.timestamp * 1000) % 1000
+        device = f" [{self.device}]" if self.device else ""
+        return f"{stamp}.{millis:03d} {LEVEL_NAMES.get(self.level, self.level):5}{device} {self.message}"
+
+    def as_dict(self):
+        return {'timestamp': self.timestamp, 'level': LEVEL_NAMES.get(self.level, self.level),
+                'device': self.device, 'message': self.message}
+
+
+class ActivityLog:
+    """Nhật ký hoạt động có giới hạn: vòng đệm capacity dòng, ghi file ở luồng nền.
+
+    log() chỉ thêm một LogEntry vào deque (giữ khóa rất ngắn) và đưa nó vào
+    hàng đợi file có giới hạn - không bao giờ chờ đĩa hay giao diện, nên gọi
+    được từ luồng I/O PLC. Khi hàng đợi file đầy (đĩa chậm), dòng mới không
+    được ghi file và được đếm trong dropped. Giao diện lấy các dòng mới theo
+    số thứ tự (since()) và cập nhật theo lô vài lần mỗi giây.
+
+    path: file nhật ký, đổi tên thành path.1, path.2... khi vượt max_bytes.
+    """
+    def __init__(self, capacity=5000, path=None, max_bytes=1 << 20, backups=3, file_level=INFO,
+                 queue_size=10000):
+        self.entries = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file_level = file_level
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        if path is not None:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(target=self._write_loop, name='activity-log', daemon=True)
+            self._thread.start()
+
+    def log(self, message, level=INFO, device=None):
+        with self.lock:
+            self.seq += 1
+            entry = LogEntry(self.seq, time.time(), level, device, message)
+            self.entries.append(entry)
+        if self._queue is not None and level >= self.file_level:
+            try:
+                self._queue.put_nowait(entry)
+            except queue.Full:
+                self.dropped += 1
+        return entry
+
+    def debug(self, message, device=None):
+        return self.log(message, DEBUG, device)
+
+    def info(self, message, device=None):
+        return self.log(message, INFO, device)
+
+    def warning(self, message, device=None):
+        return self.log(message, WARNING, device)
+
+    def error(self, message, device=None):
+        return self.log(message, ERROR, device)
+
+    def since(self, seq, level=DEBUG, device=None):
+        """Các dòng có số thứ tự > seq, lọc theo mức tối thiểu và thiết bị"""
+        with self.lock:
+            if not self.entries or self.entries[-1].seq <= seq:
+                return []
+            # Các dòng mới nằm ở cuối deque: duyệt ngược tới dòng đã có
+            count = min(len(self.entries), self.entries[-1].seq - seq)
+            entries = [self.entries[-i] for i in range(count, 0, -1)]
+        return [e for e in entries if matches(e, level, device)]
+
+    def snapshot(self, level=DEBUG, device=None):
+        """Mọi dòng còn trong vòng đệm thỏa bộ lọc"""
+        with self.lock:
+            entries = list(self.entries)
+        return [e for e in entries if matches(e, level, device)]
+
+    def devices(self):
+        with self.lock:
+            return sorted({e.device for e in self.entries if e.device})
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _write_loop(self):
+        f = open(self.path, 'a', encoding='utf-8')
+        size = f.tell()
+        try:
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    break
+                # Gom mọi dòng đang chờ thành một lần ghi
+                batch = [entry]
+                while len(batch) < 1000:
+                    try:
+                        entry = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if entry is None:
+                        self._queue.put(None)
+                        break
+                    batch.append(entry)
+                text = ''.join(e.format() + '\n' for e in batch)
+                f.write(text)
+                f.flush()
+                size += len(text.encode('utf-8'))
+                if size >= self.max_bytes:
+                    f.close()
+                    self._rotate()
+                    f = open(self.path, 'a', encoding='utf-8')
+                    size = 0
+        finally:
+            f.close()
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def close(self):
+        """Ghi nốt các dòng đang chờ rồi dừng luồng ghi file"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+
+def matches(entry, level=DEBUG, device=None):
+    return entry.level >= level and (device is None or entry.device == device)
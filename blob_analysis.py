@@ -0,0 +1,163 @@
+import time
+import cv2
+import numpy as np
+from hsv_mask import ColorClassifier
+from frame_pipeline import StageTimer
+
+
+class Blob:
+    """One connected region of a mask"""
+    def __init__(self, area, centroid, bbox):
+        self.area = area
+        self.centroid = centroid
+        self.bbox = bbox
+
+    def as_dict(self):
+        return {'area': self.area, 'centroid': self.centroid, 'bbox': self.bbox}
+
+
+class BlobResult:
+    """Blobs of one mask, with the capture time (wall clock) and frame number they belong to"""
+    def __init__(self, timestamp, frame_index, blobs, timing):
+        self.timestamp = timestamp
+        self.frame_index = frame_index
+        self.blobs = blobs
+        self.timing = timing
+
+    @property
+    def total_area(self):
+        return sum(blob.area for blob in self.blobs)
+
+    def as_dict(self):
+        return {'timestamp': self.timestamp, 'frame': self.frame_index,
+                'blobs': [blob.as_dict() for blob in self.blobs], 'timing_ms': self.timing}
+
+
+def wall_time(monotonic_timestamp):
+    """Wall clock time of a time.monotonic() timestamp (e.g. Frame.timestamp)"""
+    return time.time() - (time.monotonic() - monotonic_timestamp)
+
+
+class BlobAnalyzer:
+    """Morphological cleanup, connected components and an area filter on a binary mask.
+
+    Opening removes speckles, closing fills pinholes (size 0 skips a step).
+    Blobs come back largest first, at most max_blobs of them.
+    """
+    def __init__(self, min_area=50, max_area=None, open_size=3, close_size=3,
+                 connectivity=8, max_blobs=64):
+        self.min_area = min_area
+        self.max_area = max_area
+        self.open_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (open_size, open_size)) if open_size else None
+        self.close_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (close_size, close_size)) if close_size else None
+        self.connectivity = connectivity
+        self.max_blobs = max_blobs
+        self.timer = StageTimer()
+
+    def clean(self, mask):
+        if self.open_kernel is not None:
+            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.open_kernel)
+        if self.close_kernel is not None:
+            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self.close_kernel)
+        return mask
+
+    def analyze(self, mask, timestamp=None, frame_index=None):
+        start = time.perf_counter()
+        cleaned = self.clean(mask)
+        cleaned_at = time.perf_counter()
+        # Grana's block-based labelling: ~3x faster than the default on a 1080p mask (falls back to Wu for 4-connectivity)
+        count, _, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+            cleaned, self.connectivity, cv2.CV_32S, cv2.CCL_GRANA)
+        components_at = time.perf_counter()
+
+        # Area filter on the stats table in one vectorized step (row 0 is the background)
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        keep = areas >= self.min_area
+        if self.max_area is not None:
+            keep &= areas <= self.max_area
+        rows = np.nonzero(keep)[0] + 1
+        rows = rows[np.argsort(-stats[rows, cv2.CC_STAT_AREA], kind='stable')][:self.max_blobs]
+        blobs = [Blob(int(stats[row, cv2.CC_STAT_AREA]),
+                      (float(centroids[row, 0]), float(centroids[row, 1])),
+                      tuple(int(v) for v in stats[row, :4]))
+                 for row in rows]
+        done = time.perf_counter()
+
+        timing = {'morphology': (cleaned_at - start) * 1000,
+                  'components': (components_at - cleaned_at) * 1000,
+                  'filter': (done - components_at) * 1000}
+        for name, ms in timing.items():
+            self.timer.add(name, ms / 1000)
+        return BlobResult(time.time() if timestamp is None else timestamp, frame_index, blobs, timing)
+
+
+class FrameSkipper:
+    """Decides which frames the analysis stage processes so it keeps up with the camera.
+
+    'none' processes every frame, 'every' one frame in every n, and
+    'adaptive' skips frames while the measured processing time is longer
+    than the time since the last processed frame.
+    """
+    POLICIES = ('none', 'every', 'adaptive')
+
+    def __init__(self, policy='adaptive', every=2):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown frame skip policy {policy}")
+        self.policy = policy
+        self.every = max(1, every)
+        self.cost = 0.0
+        self.last = None
+        self.processed = 0
+        self.skipped = 0
+
+    def should_process(self, frame):
+        if self.policy == 'every':
+            process = frame.index % self.every == 0
+        elif self.policy == 'adaptive':
+            process = self.last is None or frame.timestamp - self.last >= self.cost
+        else:
+            process = True
+        if process:
+            self.last = frame.timestamp
+            self.processed += 1
+        else:
+            self.skipped += 1
+        return process
+
+    def record(self, seconds):
+        """Processing time of the last processed frame (smoothed)"""
+        self.cost = seconds if self.cost == 0.0 else 0.8 * self.cost + 0.2 * seconds
+
+
+class ColorBlobPipeline:
+    """Frame -> one-pass color classification -> blob analysis per saved color.
+
+    Usable without Qt from a color or project file:
+        pipeline = ColorBlobPipeline(load_colors('colors.json'))
+        results = pipeline.process(frame)   # {color name: BlobResult} or None if skipped
+    """
+    def __init__(self, colors, analyzer=None, skipper=None, classifier=None):
+        self.colors = colors
+        self.names = [color.get('name', f"Color_{index + 1}") for index, color in enumerate(colors)]
+        self.classifier = classifier if classifier is not None else ColorClassifier(colors)
+        self.analyzer = analyzer if analyzer is not None else BlobAnalyzer()
+        self.skipper = skipper if skipper is not None else FrameSkipper('none')
+        self.timer = StageTimer()
+
+    def process(self, frame):
+        if not self.skipper.should_process(frame):
+            return None
+        start = time.perf_counter()
+        hsv = cv2.cvtColor(frame.image, cv2.COLOR_BGR2HSV)
+        converted = time.perf_counter()
+        labels = self.classifier.classify(hsv)
+        classified = time.perf_counter()
+        timestamp = wall_time(frame.timestamp)
+        results = {name: self.analyzer.analyze(self.classifier.mask(labels, index), timestamp, frame.index)
+                   for index, name in enumerate(self.names)}
+        done = time.perf_counter()
+        self.timer.add('hsv', converted - start)
+        self.timer.add('classify', classified - converted)
+        self.timer.add('blobs', done - classified)
+        self.skipper.record(done - start)
+        return results
@@ -0,0 +1,239 @@
+import time
+import threading
+from collections import deque
+import numpy as np
+
+
+class Frame:
+    """A captured frame with its sequence number and capture time (time.monotonic)"""
+    def __init__(self, index, timestamp, image):
+        self.index = index
+        self.timestamp = timestamp
+        self.image = image
+
+
+class FrameQueue:
+    """Bounded queue that drops the oldest frame when full.
+
+    The consumer always gets the freshest frames; a slow processing stage
+    never makes the capture stage block or lag behind the camera.
+    block=True is for file sources, where every frame should be processed:
+    put() waits for room instead of dropping (until the queue is closed).
+    """
+    def __init__(self, maxsize=2, block=False):
+        self.frames = deque(maxlen=maxsize)
+        self.condition = threading.Condition()
+        self.block = block
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, frame):
+        with self.condition:
+            if self.block:
+                while len(self.frames) == self.frames.maxlen and not self.closed:
+                    self.condition.wait()
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append(frame)
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        """Oldest queued frame, or None on timeout / when closed"""
+        with self.condition:
+            if not self.frames and not self.closed:
+                self.condition.wait(timeout)
+            if not self.frames:
+                return None
+            frame = self.frames.popleft()
+            if self.block:
+                self.condition.notify_all()
+            return frame
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class RateMeter:
+    """Events per second over a sliding time window"""
+    def __init__(self, window=1.0):
+        self.window = window
+        self.times = deque()
+
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.times.append(now)
+        while self.times and now - self.times[0] > self.window:
+            self.times.popleft()
+
+    @property
+    def rate(self):
+        if len(self.times) < 2:
+            return 0.0
+        span = self.times[-1] - self.times[0]
+        return (len(self.times) - 1) / span if span > 0 else 0.0
+
+
+class LatencyStats:
+    """Percentiles over the most recent latency samples"""
+    def __init__(self, window=500):
+        self.window = window
+        self.samples = []
+
+    def add(self, value):
+        self.samples.append(value)
+        if len(self.samples) > self.window:
+            del self.samples[:len(self.samples) - self.window]
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class StageTimer:
+    """Durations of named pipeline stages, for per-stage timing reports"""
+    def __init__(self, window=200):
+        self.window = window
+        self.stages = {}
+
+    def add(self, name, seconds):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = LatencyStats(self.window)
+        stats.add(seconds * 1000)
+
+    def summary(self):
+        """{stage: (mean ms, p99 ms)} in the order the stages were first seen"""
+        return {name: (sum(stats.samples) / len(stats.samples), stats.percentile(99))
+                for name, stats in list(self.stages.items()) if stats.samples}
+
+
+class TripleBuffer:
+    """Hands the newest result from a producer thread to a consumer that polls at its own rate.
+
+    Three slots rotate: one the consumer is reading, one holding the newest
+    result, one the producer writes. The producer never overwrites what the
+    consumer holds, so results may reference preallocated arrays kept in
+    their slot (see array()) instead of fresh copies.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.arrays = [{}, {}, {}]
+        self.results = [None, None, None]
+        self.ready = None
+        self.reading = None
+        self.fresh = False
+
+    def acquire(self):
+        """Slot index the producer may write now"""
+        with self.lock:
+            return next(i for i in range(3) if i != self.ready and i != self.reading)
+
+    def array(self, slot, name, shape, dtype=np.uint8):
+        """Preallocated array of a slot, reallocated only when the shape changes"""
+        array = self.arrays[slot].get(name)
+        if array is None or array.shape != shape or array.dtype != dtype:
+            array = self.arrays[slot][name] = np.empty(shape, dtype=dtype)
+        return array
+
+    def publish(self, slot, result):
+        with self.lock:
+            self.results[slot] = result
+            self.ready = slot
+            self.fresh = True
+
+    def take(self):
+        """Newest result not taken yet, or None; call release() when done with it"""
+        with self.lock:
+            if not self.fresh:
+                return None
+            self.reading = self.ready
+            self.fresh = False
+            return self.results[self.reading]
+
+    def release(self):
+        with self.lock:
+            self.reading = None
+
+
+def fit_size(shape, size):
+    """(w, h) of an image of the given shape scaled to fit in size (w, h), keeping its aspect ratio"""
+    height, width = shape[:2]
+    scale = min(size[0] / width, size[1] / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+class CaptureWorker(threading.Thread):
+    """Reads frames from a cv2.VideoCapture-like source into a FrameQueue.
+
+    taps are extra callables given every captured frame (e.g. a recorder);
+    they must return quickly.
+    """
+    def __init__(self, source, queue, name='capture'):
+        super().__init__(name=name, daemon=True)
+        self.source = source
+        self.queue = queue
+        self.taps = []
+        self.meter = RateMeter()
+        self.frames = 0
+        self.finished = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        failures = 0
+        while not self._stop_event.is_set():
+            ret, image = self.source.read()
+            if not ret:
+                # Give a live camera a few chances before giving up
+                failures += 1
+                if failures > 50:
+                    break
+                time.sleep(0.01)
+                continue
+            failures = 0
+            frame = Frame(self.frames, time.monotonic(), image)
+            self.queue.put(frame)
+            for tap in self.taps:
+                tap(frame)
+            self.frames += 1
+            self.meter.tick()
+        self.finished = True
+        self.queue.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class ProcessingWorker(threading.Thread):
+    """Takes frames from a FrameQueue, runs process(frame) and hands the result to on_result"""
+    def __init__(self, queue, process, on_result, name='processing'):
+        super().__init__(name=name, daemon=True)
+        self.queue = queue
+        self.process = process
+        self.on_result = on_result
+        self.meter = RateMeter()
+        self.frames = 0
+        self.last_latency = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            frame = self.queue.get(timeout=0.1)
+            if frame is None:
+                if self.queue.closed:
+                    break
+                continue
+            result = self.process(frame)
+            self.frames += 1
+            self.last_latency = time.monotonic() - frame.timestamp
+            self.meter.tick()
+            if result is not None:
+                self.on_result(result)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
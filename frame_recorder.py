@@ -0,0 +1,366 @@
+import os
+import sys
+import time
+import struct
+import bisect
+import argparse
+import threading
+import cv2
+import numpy as np
+from hsv_mask import ColorClassifier, load_colors, apply_mask
+from frame_pipeline import Frame, FrameQueue
+
+# File layout:
+#   header  MAGIC, codec (4 bytes)
+#   records timestamp (float64, seconds from the first frame), length (uint32), encoded image
+#   index   (offset uint64, timestamp float64) per frame
+#   footer  index offset (uint64), frame count (uint32), INDEX_MAGIC
+# A recording cut short (no footer) is still readable: the index is rebuilt by scanning the records,
+# stopping at the first one that does not look like an encoded image of the file's codec.
+MAGIC = b'HSVREC1\0'
+INDEX_MAGIC = b'HSVIDX1\0'
+RECORD = struct.Struct('<dI')
+INDEX_ENTRY = struct.Struct('<Qd')
+FOOTER = struct.Struct('<QI8s')
+CODECS = {'jpg': '.jpg', 'png': '.png'}
+# First bytes of an encoded image, used to validate records when the index is rebuilt
+SIGNATURES = {'jpg': b'\xff\xd8\xff', 'png': b'\x89PNG\r\n\x1a\n'}
+
+
+class FrameRecorder:
+    """Writes frames and their capture times to a seekable recording.
+
+    'jpg' is compact (quality 95 keeps hues within a unit or two); 'png' is
+    lossless for exact range tuning at the cost of size and encode time.
+    """
+    def __init__(self, path, codec='jpg', quality=95):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec}, expected one of {', '.join(CODECS)}")
+        self.path = path
+        self.codec = codec
+        if codec == 'jpg':
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        else:
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + codec.ljust(4).encode('ascii'))
+        self.index = []
+        self.start = None
+
+    def write(self, image, timestamp=None):
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        if self.start is None:
+            self.start = timestamp
+        ok, data = cv2.imencode(CODECS[self.codec], image, self.params)
+        if not ok:
+            raise IOError("Frame encoding failed")
+        self.index.append((self.file.tell(), timestamp - self.start))
+        self.file.write(RECORD.pack(timestamp - self.start, len(data)))
+        self.file.write(data.tobytes())
+
+    def close(self):
+        if self.file is None:
+            return
+        index_offset = self.file.tell()
+        for offset, timestamp in self.index:
+            self.file.write(INDEX_ENTRY.pack(offset, timestamp))
+        self.file.write(FOOTER.pack(index_offset, len(self.index), INDEX_MAGIC))
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecorderTap:
+    """Records the frames of a CaptureWorker on a background thread.
+
+    Encoding never slows the capture thread down; if the disk or encoder
+    falls behind, the oldest queued frames are dropped and counted.
+    """
+    def __init__(self, recorder, maxsize=64):
+        self.recorder = recorder
+        self.queue = FrameQueue(maxsize=maxsize)
+        self.frames = 0
+        self.thread = threading.Thread(target=self._run, name='recorder', daemon=True)
+        self.thread.start()
+
+    def __call__(self, frame):
+        self.queue.put(frame)
+
+    @property
+    def dropped(self):
+        return self.queue.dropped
+
+    def _run(self):
+        while True:
+            frame = self.queue.get(timeout=0.1)
+            if frame is None:
+                if self.queue.closed:
+                    break
+                continue
+            self.recorder.write(frame.image, frame.timestamp)
+            self.frames += 1
+        self.recorder.close()
+
+    def close(self, wait=True):
+        """Stops recording; the frames still queued are written first.
+
+        With wait=False the caller does not wait for them (the GUI thread
+        stays responsive); the recorder thread closes the file when done.
+        """
+        self.queue.close()
+        if wait:
+            self.thread.join()
+
+
+class FrameReader:
+    """Random access to a recording: len(), read(index) and seek by time"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        header = self.file.read(len(MAGIC) + 4)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a frame recording")
+        self.codec = header[len(MAGIC):].decode('ascii').strip()
+        self.offsets, self.timestamps = self._load_index()
+
+    def _load_index(self):
+        size = os.fstat(self.file.fileno()).st_size
+        first = len(MAGIC) + 4
+        end = size
+        if size >= first + FOOTER.size:
+            self.file.seek(size - FOOTER.size)
+            index_offset, count, magic = FOOTER.unpack(self.file.read(FOOTER.size))
+            if magic == INDEX_MAGIC and first <= index_offset <= size - FOOTER.size:
+                if index_offset + count * INDEX_ENTRY.size == size - FOOTER.size:
+                    self.file.seek(index_offset)
+                    entries = list(INDEX_ENTRY.iter_unpack(self.file.read(count * INDEX_ENTRY.size)))
+                    return [e[0] for e in entries], [e[1] for e in entries]
+                # Damaged index: the records still end where it starts
+                end = index_offset
+        # No usable index: scan the records of an interrupted recording
+        signature = SIGNATURES.get(self.codec, b'')
+        offsets, timestamps = [], []
+        offset = first
+        previous = 0.0
+        while offset + RECORD.size + len(signature) <= end:
+            self.file.seek(offset)
+            timestamp, length = RECORD.unpack(self.file.read(RECORD.size))
+            if not (previous <= timestamp < float('inf')) or length < len(signature) or \
+                    offset + RECORD.size + length > end or self.file.read(len(signature)) != signature:
+                break
+            offsets.append(offset)
+            timestamps.append(timestamp)
+            previous = timestamp
+            offset += RECORD.size + length
+        return offsets, timestamps
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def duration(self):
+        return self.timestamps[-1] if self.timestamps else 0.0
+
+    def read(self, index):
+        """Frame(index, timestamp in seconds from the start, decoded BGR image)"""
+        self.file.seek(self.offsets[index])
+        timestamp, length = RECORD.unpack(self.file.read(RECORD.size))
+        data = np.frombuffer(self.file.read(length), dtype=np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Frame {index} of {self.path} cannot be decoded")
+        return Frame(index, timestamp, image)
+
+    def index_at(self, timestamp):
+        """Index of the last frame captured at or before timestamp"""
+        return max(0, bisect.bisect_right(self.timestamps, timestamp) - 1)
+
+    def frames(self, start=0, stop=None, step=1):
+        for index in range(start, len(self) if stop is None else min(stop, len(self)), step):
+            yield self.read(index)
+
+    def close(self):
+        self.file.close()
+
+
+class ReplaySource:
+    """cv2.VideoCapture look-alike playing a recording at its recorded pace.
+
+    speed scales the pace (2.0 = twice as fast); speed=0 plays as fast as
+    frames can be decoded. Plugs into CaptureWorker and HSVColorChecker in
+    place of a camera, so replayed frames take the same path as live ones.
+    """
+    def __init__(self, reader, speed=1.0, loop=False):
+        self.reader = reader
+        self.speed = speed
+        self.loop = loop
+        self.position = 0
+        self.started = None
+
+    def isOpened(self):
+        return len(self.reader) > 0
+
+    def read(self):
+        while True:
+            if self.position >= len(self.reader):
+                if not self.loop:
+                    return False, None
+                self.position = 0
+                self.started = None
+            try:
+                frame = self.reader.read(self.position)
+                break
+            except ValueError:
+                # A damaged frame is skipped, like a frame the camera never delivered
+                self.position += 1
+        if self.started is None:
+            self.started = time.monotonic() - (frame.timestamp / self.speed if self.speed else 0.0)
+        if self.speed:
+            delay = self.started + frame.timestamp / self.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.position += 1
+        return True, frame.image
+
+    def seek(self, timestamp):
+        self.position = self.reader.index_at(timestamp)
+        self.started = None
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = int(value)
+            self.started = None
+            return True
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.reader))
+        return 0.0
+
+    def release(self):
+        self.reader.close()
+
+
+def score_recording(reader, colors, step=1, min_pixels=50):
+    """Per-color pixel fraction statistics over a recording (every step-th frame)"""
+    classifier = ColorClassifier(colors)
+    counts = []
+    pixels = 1
+    for frame in reader.frames(step=step):
+        labels = classifier.classify(cv2.cvtColor(frame.image, cv2.COLOR_BGR2HSV))
+        counts.append(np.bincount(labels.ravel(), minlength=len(colors) + 1)[1:len(colors) + 1])
+        pixels = labels.size
+    counts = np.array(counts).reshape(-1, len(colors))
+    scores = []
+    for index, color in enumerate(colors):
+        column = counts[:, index]
+        fraction = column / pixels
+        scores.append({
+            'name': color.get('name', f"Color_{index + 1}"),
+            'frames': len(column),
+            'mean_fraction': float(fraction.mean()) if len(column) else 0.0,
+            'min_fraction': float(fraction.min()) if len(column) else 0.0,
+            'max_fraction': float(fraction.max()) if len(column) else 0.0,
+            'present_frames': int((column >= min_pixels).sum()),
+        })
+    return scores
+
+
+def benchmark(reader, color, limit=None):
+    """Decode and apply_mask throughput over a recording, no camera needed"""
+    count = len(reader) if limit is None else min(limit, len(reader))
+    decode = mask = 0.0
+    for index in range(count):
+        start = time.perf_counter()
+        frame = reader.read(index)
+        middle = time.perf_counter()
+        apply_mask(frame.image, color)
+        decode += middle - start
+        mask += time.perf_counter() - middle
+    return {
+        'frames': count,
+        'decode_ms': decode / count * 1000 if count else 0.0,
+        'mask_ms': mask / count * 1000 if count else 0.0,
+        'fps': count / (decode + mask) if decode + mask else 0.0,
+    }
+
+
+def record(source, path, codec='jpg', duration=None, max_frames=None):
+    """Records a cv2.VideoCapture-like source until it ends, duration, max_frames or Ctrl+C"""
+    started = time.monotonic()
+    frames = 0
+    with FrameRecorder(path, codec) as recorder:
+        try:
+            while True:
+                ret, image = source.read()
+                if not ret:
+                    break
+                recorder.write(image)
+                frames += 1
+                if max_frames is not None and frames >= max_frames:
+                    break
+                if duration is not None and time.monotonic() - started >= duration:
+                    break
+        except KeyboardInterrupt:
+            pass
+    return frames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record, score and benchmark camera recordings")
+    commands = parser.add_subparsers(dest='command', required=True)
+    rec = commands.add_parser('record', help="record a camera or video file")
+    rec.add_argument('output')
+    rec.add_argument('--camera', type=int, default=0)
+    rec.add_argument('--video', default=None)
+    rec.add_argument('--codec', choices=sorted(CODECS), default='jpg')
+    rec.add_argument('--duration', type=float, default=None, help="seconds")
+    rec.add_argument('--frames', type=int, default=None)
+    score = commands.add_parser('score', help="score saved color ranges against a recording")
+    score.add_argument('recording')
+    score.add_argument('--colors', required=True, help="color or project file")
+    score.add_argument('--step', type=int, default=1, help="score every n-th frame")
+    score.add_argument('--min-pixels', type=int, default=50)
+    bench = commands.add_parser('bench', help="frame rate of decode + apply_mask")
+    bench.add_argument('recording')
+    bench.add_argument('--colors', required=True, help="color or project file; the first color is used")
+    bench.add_argument('--frames', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        source = cv2.VideoCapture(args.video if args.video else args.camera)
+        if not source.isOpened():
+            print("Cannot open video source")
+            return 1
+        try:
+            frames = record(source, args.output, args.codec, args.duration, args.frames)
+        finally:
+            source.release()
+        print(f"Recorded {frames} frames to {args.output}")
+        return 0
+
+    reader = FrameReader(args.recording)
+    colors = load_colors(args.colors)
+    if args.command == 'score':
+        for entry in score_recording(reader, colors, args.step, args.min_pixels):
+            print(f"{entry['name']}: mean {entry['mean_fraction'] * 100:.2f}% "
+                  f"(min {entry['min_fraction'] * 100:.2f}%, max {entry['max_fraction'] * 100:.2f}%), "
+                  f"present in {entry['present_frames']}/{entry['frames']} frames")
+    else:
+        result = benchmark(reader, colors[0], args.frames)
+        print(f"{result['frames']} frames: decode {result['decode_ms']:.2f} ms, "
+              f"mask {result['mask_ms']:.2f} ms, {result['fps']:.1f} FPS")
+    reader.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,453 @@
+import os
+import re
+import sys
+import time
+import zlib
+import bisect
+import struct
+import argparse
+import threading
+import numpy as np
+
+# File lịch sử của một tag (ghi nối tiếp, không sửa phần đã ghi):
+#   header  MAGIC, độ dài tên (uint16), tên tag (utf-8)
+#   chunk   first_seq (uint64), count (uint32), t_first/t_last (int64, µs),
+#           min/max/sum giá trị (float64), độ dài dữ liệu nén (uint32), dữ liệu nén
+# Dữ liệu chunk: thời gian dạng delta int64 rồi giá trị float64, mỗi cột được
+# xếp lại theo byte (byte thứ nhất của mọi phần tử, rồi byte thứ hai, ...) trước
+# khi nén zlib - giá trị PLC ít thay đổi nên nén rất tốt.
+# File bị cắt giữa chừng (mất điện) vẫn đọc được: chunk cuối dở dang bị bỏ đi.
+MAGIC = b'HISTCH1\0'
+NAME = struct.Struct('<H')
+CHUNK = struct.Struct('<QIqqdddI')
+EXTENSION = '.hist'
+
+
+def _shuffle(array):
+    return array.view(np.uint8).reshape(-1, array.itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, count):
+    dtype = np.dtype(dtype)
+    return np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, count).T.copy().view(dtype).ravel()
+
+
+def encode_chunk(times, values, level=1):
+    deltas = np.diff(times, prepend=times[0]).astype('<i8')
+    return zlib.compress(_shuffle(deltas) + _shuffle(values.astype('<f8')), level)
+
+
+def decode_chunk(data, count, t_first):
+    raw = zlib.decompress(data)
+    times = t_first + np.cumsum(_unshuffle(raw[:count * 8], '<i8', count))
+    return times, _unshuffle(raw[count * 8:], '<f8', count)
+
+
+def file_name(tag):
+    """Tên file an toàn cho một tag (tên thật được lưu trong header)"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', tag) + EXTENSION
+
+
+class ChunkIndex:
+    """Chỉ mục thời gian các chunk trên đĩa của một tag (dựng lại khi mở file)"""
+    def __init__(self):
+        self.first_seq = []
+        self.count = []
+        self.t_first = []
+        self.t_last = []
+        self.stats = []    # (min, max, sum)
+        self.offsets = []  # vị trí dữ liệu nén
+        self.lengths = []
+
+    def add(self, first_seq, count, t_first, t_last, stats, offset, length):
+        self.first_seq.append(first_seq)
+        self.count.append(count)
+        self.t_first.append(t_first)
+        self.t_last.append(t_last)
+        self.stats.append(stats)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+
+    def __len__(self):
+        return len(self.first_seq)
+
+
+class TagHistory:
+    """Lịch sử một tag: vòng đệm numpy cấp phát sẵn, tràn ra file chunk nén.
+
+    Mỗi mẫu có số thứ tự (seq) tăng dần. Vòng đệm giữ capacity mẫu mới nhất;
+    khi có file, cứ đủ chunk_size mẫu chưa ghi là một chunk được nén và ghi
+    nối vào file, nên bộ nhớ không tăng theo thời gian chạy. Truy vấn lấy phần
+    còn trong vòng đệm từ bộ nhớ, phần cũ hơn từ các chunk trên đĩa.
+
+    read_only=True: chỉ dựng chỉ mục từ file (mở 'rb', không cắt bỏ phần cuối
+    dở dang), dùng được khi một tiến trình khác đang ghi file đó.
+    """
+    def __init__(self, name, capacity=65536, chunk_size=4096, path=None, level=1, read_only=False):
+        if chunk_size > capacity:
+            raise ValueError("chunk_size không được lớn hơn capacity")
+        self.name = name
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        self.path = path
+        self.level = level
+        self.read_only = read_only
+        self.times = np.zeros(capacity, dtype=np.int64)  # µs
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.next_seq = 0
+        self.spilled_seq = 0
+        self.memory_seq = 0  # mẫu đầu tiên được thêm vào vòng đệm từ khi mở
+        self.index = ChunkIndex()
+        self.file = None
+        if path is not None:
+            self._open()
+
+    def _open(self):
+        if self.read_only:
+            # Chunk đang được ghi dở ở cuối file bị bỏ qua, file không bị sửa
+            with open(self.path, 'rb') as self.file:
+                self._scan()
+            self.file = None
+            if len(self.index):
+                self.next_seq = self.spilled_seq = self.memory_seq = self.index.first_seq[-1] + self.index.count[-1]
+            return
+        if os.path.exists(self.path):
+            self.file = open(self.path, 'r+b')
+            end = self._scan()
+            self.file.truncate(end)
+            self.file.seek(end)
+            if len(self.index):
+                self.next_seq = self.spilled_seq = self.memory_seq = self.index.first_seq[-1] + self.index.count[-1]
+        else:
+            self.file = open(self.path, 'w+b')
+            name = self.name.encode('utf-8')
+            self.file.write(MAGIC + NAME.pack(len(name)) + name)
+
+    def _scan(self):
+        """Đọc các header chunk để dựng chỉ mục; trả về vị trí cuối chunk hợp lệ cuối cùng"""
+        size = os.fstat(self.file.fileno()).st_size
+        self.file.seek(0)
+        header = self.file.read(len(MAGIC) + NAME.size)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} không phải file lịch sử")
+        offset = len(header) + NAME.unpack(header[len(MAGIC):])[0]
+        while offset + CHUNK.size <= size:
+            self.file.seek(offset)
+            first_seq, count, t_first, t_last, vmin, vmax, vsum, length = CHUNK.unpack(self.file.read(CHUNK.size))
+            if count == 0 or offset + CHUNK.size + length > size:
+                break
+            self.index.add(first_seq, count, t_first, t_last, (vmin, vmax, vsum), offset + CHUNK.size, length)
+            offset += CHUNK.size + length
+        return offset
+
+    @property
+    def oldest_seq(self):
+        """seq của mẫu cũ nhất còn trong vòng đệm"""
+        return max(self.memory_seq, self.next_seq - self.capacity)
+
+    def append(self, times, values):
+        """Thêm một loạt mẫu (mảng thời gian µs và giá trị); tràn ra đĩa khi đủ chunk"""
+        if self.read_only:
+            raise ValueError(f"Lịch sử {self.name} được mở chỉ đọc")
+        done = 0
+        while done < len(times):
+            # Không bao giờ ghi đè mẫu chưa tràn ra đĩa
+            room = self.chunk_size - (self.next_seq - self.spilled_seq) if self.file is not None else self.capacity
+            n = min(len(times) - done, room)
+            position = self.next_seq % self.capacity
+            first = min(n, self.capacity - position)
+            self.times[position:position + first] = times[done:done + first]
+            self.values[position:position + first] = values[done:done + first]
+            if first < n:
+                self.times[:n - first] = times[done + first:done + n]
+                self.values[:n - first] = values[done + first:done + n]
+            self.next_seq += n
+            done += n
+            if self.file is not None and self.next_seq - self.spilled_seq >= self.chunk_size:
+                self.spill()
+
+    def _ordered(self, first_seq, last_seq):
+        positions = np.arange(first_seq, last_seq) % self.capacity
+        return self.times[positions], self.values[positions]
+
+    def spill(self):
+        """Nén và ghi các mẫu chưa tràn thành một chunk"""
+        if self.file is None or self.next_seq == self.spilled_seq:
+            return
+        times, values = self._ordered(self.spilled_seq, self.next_seq)
+        data = encode_chunk(times, values, self.level)
+        stats = (float(values.min()), float(values.max()), float(values.sum()))
+        offset = self.file.seek(0, os.SEEK_END)
+        self.file.write(CHUNK.pack(self.spilled_seq, len(times), int(times[0]), int(times[-1]),
+                                   stats[0], stats[1], stats[2], len(data)))
+        self.file.write(data)
+        self.file.flush()
+        self.index.add(self.spilled_seq, len(times), int(times[0]), int(times[-1]), stats,
+                       offset + CHUNK.size, len(data))
+        self.spilled_seq = self.next_seq
+
+    def memory(self):
+        """(thời gian, giá trị) mọi mẫu trong vòng đệm, cũ trước"""
+        return self._ordered(self.oldest_seq, self.next_seq)
+
+    def snapshot(self, start, end):
+        """Những gì một truy vấn [start, end] (µs) cần, chụp lại trong lúc giữ khóa:
+        các chunk trên đĩa có mẫu đã rời vòng đệm, và bản sao vòng đệm.
+
+        Chunk đã ghi không bao giờ bị sửa, nên việc đọc và giải nén chúng được
+        làm sau khi nhả khóa, không chặn luồng ghi mẫu.
+        """
+        index = self.index
+        limit = self.oldest_seq
+        chunks = []
+        i = bisect.bisect_left(index.t_last, start)
+        while i < len(index) and index.t_first[i] <= end and index.first_seq[i] < limit:
+            keep = min(index.count[i], limit - index.first_seq[i])
+            chunks.append((index.offsets[i], index.lengths[i], index.count[i], index.t_first[i],
+                           index.t_last[i], index.stats[i], keep))
+            i += 1
+        return self.path, chunks, self.memory()
+
+    def close(self):
+        if self.file is not None:
+            self.spill()
+            self.file.close()
+            self.file = None
+
+
+def read_chunks(path, chunks):
+    """Giải nén các chunk của snapshot(), lần lượt (thời gian µs, giá trị)"""
+    if not chunks:
+        return
+    with open(path, 'rb') as f:
+        for offset, length, count, t_first, _, _, keep in chunks:
+            f.seek(offset)
+            times, values = decode_chunk(f.read(length), count, t_first)
+            yield times[:keep], values[:keep]
+
+
+def _bucket_of(times, start, span, buckets):
+    return np.minimum(((times - start) * buckets // span).astype(np.intp), buckets - 1)
+
+
+def _accumulate(index, values, mins, maxs, sums, counts):
+    """Gộp min/max/tổng/số mẫu theo bucket (mỗi đoạn bucket liền nhau được rút gọn một lần)"""
+    if len(index) == 0:
+        return
+    starts = np.flatnonzero(np.diff(index, prepend=-1))
+    buckets = index[starts]
+    np.minimum.at(mins, buckets, np.minimum.reduceat(values, starts))
+    np.maximum.at(maxs, buckets, np.maximum.reduceat(values, starts))
+    np.add.at(sums, buckets, np.add.reduceat(values, starts))
+    np.add.at(counts, buckets, np.diff(np.append(starts, len(index))))
+
+
+class Historian:
+    """Lưu lịch sử các giá trị đọc từ PLC theo tag, truy vấn theo khoảng thời gian.
+
+    Thêm mẫu chỉ là chép vào mảng cấp phát sẵn; việc nén chỉ xảy ra mỗi
+    chunk_size mẫu của một tag, nên vòng lặp đọc hàng nghìn mẫu/giây không bị
+    chậm và bộ nhớ cố định (capacity mẫu mỗi tag). directory=None: chỉ giữ
+    trong bộ nhớ. Dùng được từ nhiều luồng (luồng đọc ghi, giao diện truy vấn).
+    read_only=True: chỉ truy vấn các file đã có, an toàn khi một tiến trình
+    khác (main.py --history) đang ghi cùng thư mục.
+    """
+    def __init__(self, directory=None, capacity=65536, chunk_size=4096, level=1, read_only=False):
+        if read_only and directory is None:
+            raise ValueError("Historian chỉ đọc cần thư mục lịch sử")
+        self.directory = directory
+        self.read_only = read_only
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        self.level = level
+        self.series = {}
+        self.samples = 0
+        self.lock = threading.Lock()
+        if directory is not None:
+            if not read_only:
+                os.makedirs(directory, exist_ok=True)
+            for entry in sorted(os.listdir(directory)):
+                if entry.endswith(EXTENSION):
+                    name = self._read_name(os.path.join(directory, entry))
+                    if name is not None:
+                        self._series(name)
+
+    @staticmethod
+    def _read_name(path):
+        with open(path, 'rb') as f:
+            header = f.read(len(MAGIC) + NAME.size)
+            if header[:len(MAGIC)] != MAGIC or len(header) < len(MAGIC) + NAME.size:
+                return None
+            length = NAME.unpack(header[len(MAGIC):])[0]
+            name = f.read(length)
+            # Header đang được ghi dở (tag mới của một tiến trình khác)
+            return name.decode('utf-8') if len(name) == length else None
+
+    def _series(self, name):
+        series = self.series.get(name)
+        if series is None:
+            path = os.path.join(self.directory, file_name(name)) if self.directory is not None else None
+            if self.read_only and not os.path.exists(path):
+                raise ValueError(f"Historian chỉ đọc không có tag {name}")
+            series = self.series[name] = TagHistory(name, self.capacity, self.chunk_size, path, self.level,
+                                                    self.read_only)
+        return series
+
+    def tags(self):
+        with self.lock:
+            return list(self.series)
+
+    def record(self, name, value, timestamp=None):
+        """Thêm một mẫu; timestamp là time.time() (giây)"""
+        timestamp = time.time() if timestamp is None else timestamp
+        self.record_array(name, [timestamp], [value])
+
+    def record_array(self, name, timestamps, values):
+        """Thêm nhiều mẫu của một tag một lần"""
+        times = (np.asarray(timestamps, dtype=np.float64) * 1e6).astype(np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        with self.lock:
+            self._series(name).append(times, values)
+            self.samples += len(times)
+
+    def record_values(self, values, timestamp=None):
+        """Thêm kết quả một lần đọc {tag: giá trị}; tag mảng được lưu thành tag[0], tag[1], ..."""
+        timestamp = time.time() if timestamp is None else timestamp
+        time_us = np.array([int(timestamp * 1e6)], dtype=np.int64)
+        with self.lock:
+            for name, value in values.items():
+                if isinstance(value, (list, tuple)):
+                    for i, item in enumerate(value):
+                        self._series(f"{name}[{i}]").append(time_us, np.array([float(item)]))
+                    self.samples += len(value)
+                else:
+                    self._series(name).append(time_us, np.array([float(value)]))
+                    self.samples += 1
+
+    def on_scan(self, result):
+        """Listener cho ScanEngine: lưu mọi giá trị của một chu kỳ quét"""
+        self.record_values(result.values, result.timestamp)
+
+    def latest(self, name):
+        """(timestamp, giá trị) của mẫu mới nhất, hoặc None"""
+        with self.lock:
+            series = self.series.get(name)
+            if series is None or series.next_seq == 0:
+                return None
+            position = (series.next_seq - 1) % series.capacity
+            return float(series.times[position]) / 1e6, float(series.values[position])
+
+    def query(self, name, start=None, end=None):
+        """(mảng timestamp giây, mảng giá trị) của tag trong [start, end]"""
+        start_us = -2 ** 62 if start is None else int(start * 1e6)
+        end_us = 2 ** 62 if end is None else int(end * 1e6)
+        with self.lock:
+            series = self.series.get(name)
+            if series is None:
+                return np.empty(0), np.empty(0)
+            path, chunks, memory = series.snapshot(start_us, end_us)
+        parts = list(read_chunks(path, chunks)) + [memory]
+        times = np.concatenate([p[0] for p in parts])
+        values = np.concatenate([p[1] for p in parts])
+        keep = (times >= start_us) & (times <= end_us)
+        return times[keep] / 1e6, values[keep]
+
+    def downsample(self, name, start, end, buckets):
+        """min/max/trung bình của tag trên buckets khoảng đều nhau trong [start, end].
+
+        Trả về dict các mảng 'time' (giữa bucket), 'min', 'max', 'avg', 'count';
+        bucket rỗng có giá trị NaN. Chunk nằm gọn trong một bucket dùng min/max/tổng
+        lưu sẵn trong header, không cần giải nén.
+        """
+        start_us, end_us = int(start * 1e6), int(end * 1e6)
+        span = max(1, end_us - start_us)
+        mins = np.full(buckets, np.inf)
+        maxs = np.full(buckets, -np.inf)
+        sums = np.zeros(buckets)
+        counts = np.zeros(buckets, dtype=np.int64)
+        with self.lock:
+            series = self.series.get(name)
+            if series is None:
+                path, chunks, memory = None, [], (np.empty(0, dtype=np.int64), np.empty(0))
+            else:
+                path, chunks, memory = series.snapshot(start_us, end_us)
+        decode = []
+        for chunk in chunks:
+            _, _, count, first, last, (vmin, vmax, vsum), keep = chunk
+            if (keep == count and first >= start_us and last <= end_us
+                    and (first - start_us) * buckets // span == (last - start_us) * buckets // span):
+                b = min((first - start_us) * buckets // span, buckets - 1)
+                mins[b] = min(mins[b], vmin)
+                maxs[b] = max(maxs[b], vmax)
+                sums[b] += vsum
+                counts[b] += count
+            else:
+                decode.append(chunk)
+        for times, values in list(read_chunks(path, decode)) + [memory]:
+            keep = (times >= start_us) & (times <= end_us)
+            _accumulate(_bucket_of(times[keep], start_us, span, buckets), values[keep], mins, maxs, sums, counts)
+
+        empty = counts == 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = sums / counts
+        mins[empty] = maxs[empty] = avg[empty] = np.nan
+        centres = start + (np.arange(buckets) + 0.5) * (end - start) / buckets
+        return {'time': centres, 'min': mins, 'max': maxs, 'avg': avg, 'count': counts}
+
+    def flush(self):
+        """Ghi ra đĩa mọi mẫu chưa tràn (chunk có thể ngắn hơn chunk_size)"""
+        with self.lock:
+            for series in self.series.values():
+                series.spill()
+
+    def stats(self):
+        with self.lock:
+            return {name: {'samples': series.next_seq, 'in_memory': series.next_seq - series.oldest_seq,
+                           'chunks': len(series.index),
+                           'disk_bytes': sum(series.index.lengths) + len(series.index) * CHUNK.size}
+                    for name, series in self.series.items()}
+
+    def close(self):
+        with self.lock:
+            for series in self.series.values():
+                series.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Xem lịch sử tag đã lưu bởi Historian")
+    parser.add_argument('directory')
+    parser.add_argument('tag', nargs='?', help="bỏ trống để liệt kê các tag")
+    parser.add_argument('--start', type=float, default=None, help="timestamp (giây), mặc định: mẫu đầu tiên")
+    parser.add_argument('--end', type=float, default=None, help="timestamp (giây), mặc định: mẫu cuối cùng")
+    parser.add_argument('--buckets', type=int, default=20, help="số khoảng min/max/trung bình")
+    args = parser.parse_args(argv)
+
+    # Chỉ đọc: không cắt file mà main.py --history có thể đang ghi
+    with Historian(args.directory, read_only=True) as historian:
+        if args.tag is None:
+            for name, stats in historian.stats().items():
+                print(f"{name}: {stats['samples']} mẫu, {stats['chunks']} chunk, {stats['disk_bytes']} byte")
+            return 0
+        times, _ = historian.query(args.tag, args.start, args.end)
+        if len(times) == 0:
+            print(f"Không có mẫu của {args.tag}")
+            return 1
+        start = times[0] if args.start is None else args.start
+        end = times[-1] if args.end is None else args.end
+        result = historian.downsample(args.tag, start, end, args.buckets)
+        for t, vmin, vmax, avg, count in zip(result['time'], result['min'], result['max'],
+                                             result['avg'], result['count']):
+            if count:
+                stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))
+                print(f"{stamp}  min {vmin:g}  max {vmax:g}  tb {avg:g}  ({count} mẫu)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,75 @@
 import cv2
 import numpy as np
+import os
 import sys
+import time
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QLabel, QPushButton, QSlider, 
-                            QComboBox, QGroupBox, QGridLayout, QCheckBox)
+                            QComboBox, QGroupBox, QGridLayout, QCheckBox,
+                            QFileDialog, QSpinBox, QMessageBox)
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QImage, QPixmap
+from hsv_mask import (make_color_range, apply_mask, ColorClassifier,
+                      label_palette, colorize_labels)
+from roi import ROI, roi_labels, roi_mask
+from project import Project, load_project, project_path
+from frame_pipeline import (FrameQueue, CaptureWorker, ProcessingWorker, RateMeter,
+                            StageTimer, TripleBuffer, fit_size)
+from multi_camera import MultiCameraManager, tile_images
+from frame_recorder import FrameRecorder, FrameReader, RecorderTap, ReplaySource
+from hsv_fit import HSVHistogram, fit_range, evaluate
+from blob_analysis import BlobAnalyzer, FrameSkipper, wall_time
+
+# Qt >= 5.14 reads BGR pixels directly; older versions need the channels swapped
+HAS_BGR888 = hasattr(QImage, 'Format_BGR888')
+
+
+def bgr_qimage(image):
+    """QImage over a BGR array without copying it; the array must outlive the QImage.
+
+    Qt < 5.14 has no BGR888: the channels are swapped into a separate RGB array
+    (the caller's array may still be in use, e.g. for color picking) and the
+    QImage owns a copy of it.
+    """
+    h, w = image.shape[:2]
+    if HAS_BGR888:
+        return QImage(image.data, w, h, image.strides[0], QImage.Format_BGR888)
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return QImage(rgb.data, w, h, rgb.strides[0], QImage.Format_RGB888).copy()
+
 
 class HSVColorChecker(QMainWindow):
-    def __init__(self):
+    def __init__(self, project=None):
         super().__init__()
         self.setWindowTitle("HSV Color Checker By Factory Automation")
         self.setGeometry(100, 100, 1200, 700)
         
         # Initialize camera
         self.camera = None
+        self.cameras = []
         self.camera_index = 0
         
+        # Capture -> processing pipeline, running off the GUI thread
+        self.frame_queue = None
+        self.capture_worker = None
+        self.processing_worker = None
+        
+        # Processing thread -> GUI hand-off: the newest rendered frame, shown at the screen refresh rate
+        self.display_slot = TripleBuffer()
+        self.stage_timer = StageTimer()
+        self.display_meter = RateMeter()
+        self.last_render = 0.0
+        self.display_interval = 1 / 60
+        
+        # Several cameras at once: one capture thread per camera, masking on a shared pool
+        self.camera_manager = None
+        self.tile_size = (0, 0)
+        self.last_tiles = None
+        
+        # Recording of the live stream, and a recording replayed in place of a camera
+        self.recorder = None
+        self.replay_path = None
+        
         # HSV range variables
         self.h_min = 0
         self.h_max = 179
@@ -25,11 +78,38 @@ class HSVColorChecker(QMainWindow):
         self.v_min = 0
         self.v_max = 255
         
+        # Snapshot of the current range, read by the processing thread
+        self.hsv_range = make_color_range(self.h_min, self.h_max, self.s_min,
+                                          self.s_max, self.v_min, self.v_max)
+        
+        # Project file shared with plc_interface.py and vision_bridge.py; keeps its PLCs and tags on save
+        self.project = project if project is not None else Project()
+        
         # Save current color range to our list
-        self.saved_colors = []
+        self.saved_colors = list(self.project.colors)
+        
+        # Regions of interest; replaced (never mutated) so the processing thread sees a consistent list
+        self.rois = list(self.project.rois)
+        self.roi_draft = []
+        
+        # Pixel samples for range fitting: (x, y, w, h, is_background) regions and their histograms
+        self.sample_regions = []
+        self.sample_across_frames = False
+        self.color_samples = HSVHistogram()
+        self.background_samples = HSVHistogram()
+        
+        # Blob analysis of the current range mask (None = off); skips frames when it cannot keep up
+        self.blob_analyzer = None
+        self.blob_skipper = FrameSkipper('adaptive')
+        self.last_blobs = None
+        
+        # Lookup tables classifying all saved colors (plus the current range) in one pass
+        self.classify_all = False
+        self.rebuild_classifier()
         
         # Initialize UI
         self.init_ui()
+        self.update_saved_colors_display()
         
     def init_ui(self):
         central_widget = QWidget()
@@ -74,6 +154,11 @@ class HSVColorChecker(QMainWindow):
         self.camera_select = QComboBox()
         self.camera_select.addItems([f"Camera {i}" for i in range(5)])
         
+        # Number of cameras opened together, starting at the selected one
+        self.camera_count_input = QSpinBox()
+        self.camera_count_input.setRange(1, 5)
+        self.camera_count_input.setPrefix("Count: ")
+        
         self.start_camera_btn = QPushButton("Start Camera")
         self.start_camera_btn.clicked.connect(self.toggle_camera)
         self.start_camera_btn.setStyleSheet("""
@@ -91,11 +176,70 @@ class HSVColorChecker(QMainWindow):
         
         camera_controls.addWidget(camera_label)
         camera_controls.addWidget(self.camera_select)
+        camera_controls.addWidget(self.camera_count_input)
         camera_controls.addWidget(self.start_camera_btn)
         camera_controls.addStretch()
         
         left_panel.addLayout(camera_controls)
         
+        # Record the camera stream, or replay a recording through the same pipeline
+        record_controls = QHBoxLayout()
+        self.record_btn = QPushButton("Record")
+        self.record_btn.setCheckable(True)
+        self.record_btn.setEnabled(False)
+        self.record_btn.clicked.connect(self.toggle_recording)
+        self.open_recording_btn = QPushButton("Open Recording")
+        self.open_recording_btn.clicked.connect(self.open_recording)
+        self.replay_speed_select = QComboBox()
+        self.replay_speed_select.addItems(["1x", "2x", "4x", "Max"])
+        self.replay_speed_select.currentIndexChanged.connect(self.update_replay_speed)
+        record_controls.addWidget(self.record_btn)
+        record_controls.addWidget(self.open_recording_btn)
+        record_controls.addWidget(QLabel("Replay speed:"))
+        record_controls.addWidget(self.replay_speed_select)
+        record_controls.addStretch()
+        left_panel.addLayout(record_controls)
+        
+        # Region of interest tools: processing is limited to the drawn regions
+        roi_controls = QHBoxLayout()
+        roi_controls.addWidget(QLabel("Mouse:"))
+        self.roi_tool_select = QComboBox()
+        self.roi_tool_select.addItems(["Pick color", "Draw ROI rectangle", "Draw ROI polygon",
+                                       "Sample color", "Sample background"])
+        self.roi_tool_select.currentIndexChanged.connect(self.cancel_roi_draft)
+        roi_controls.addWidget(self.roi_tool_select)
+        self.clear_rois_btn = QPushButton("Clear ROIs")
+        self.clear_rois_btn.clicked.connect(self.clear_rois)
+        roi_controls.addWidget(self.clear_rois_btn)
+        roi_controls.addStretch()
+        left_panel.addLayout(roi_controls)
+        
+        # Per-ROI results
+        self.roi_results_label = QLabel("No ROIs (whole frame is processed)")
+        self.roi_results_label.setStyleSheet("font-family: monospace;")
+        left_panel.addWidget(self.roi_results_label)
+        
+        # Blob analysis of the mask: cleanup, connected components and an area filter
+        blob_controls = QHBoxLayout()
+        self.blob_cb = QCheckBox("Blob analysis")
+        self.blob_cb.stateChanged.connect(self.update_blob_analysis)
+        self.blob_min_area_input = QSpinBox()
+        self.blob_min_area_input.setRange(1, 1000000)
+        self.blob_min_area_input.setValue(100)
+        self.blob_min_area_input.setPrefix("Min area: ")
+        self.blob_min_area_input.valueChanged.connect(self.update_blob_analysis)
+        blob_controls.addWidget(self.blob_cb)
+        blob_controls.addWidget(self.blob_min_area_input)
+        blob_controls.addStretch()
+        left_panel.addLayout(blob_controls)
+        self.blob_results_label = QLabel("")
+        self.blob_results_label.setStyleSheet("font-family: monospace;")
+        left_panel.addWidget(self.blob_results_label)
+        
+        # Pipeline throughput
+        self.pipeline_stats_label = QLabel("Capture: 0.0 FPS | Processing: 0.0 FPS | Dropped: 0")
+        left_panel.addWidget(self.pipeline_stats_label)
+        
         # HSV Color value display
         self.color_value_label = QLabel("Click on the image to get HSV value")
         self.color_value_label.setStyleSheet("""
@@ -238,6 +382,16 @@ class HSVColorChecker(QMainWindow):
         """)
         saved_colors_layout.addWidget(self.saved_colors_label)
         
+        # Save / load the ranges in a project file so other programs (vision_bridge.py) can use them
+        colors_file_layout = QHBoxLayout()
+        self.save_colors_btn = QPushButton("Save Project")
+        self.save_colors_btn.clicked.connect(self.save_colors_file)
+        self.load_colors_btn = QPushButton("Open Project")
+        self.load_colors_btn.clicked.connect(self.load_colors_file)
+        colors_file_layout.addWidget(self.save_colors_btn)
+        colors_file_layout.addWidget(self.load_colors_btn)
+        saved_colors_layout.addLayout(colors_file_layout)
+        
         saved_colors_group.setLayout(saved_colors_layout)
         right_panel.addWidget(saved_colors_group)
         
@@ -248,8 +402,35 @@ class HSVColorChecker(QMainWindow):
         
         self.dual_range_cb = QCheckBox("Use dual range (for colors like red)")
         self.dual_range_cb.setChecked(False)
+        self.dual_range_cb.stateChanged.connect(self.update_hsv_range)
         dual_range_layout.addWidget(self.dual_range_cb)
         
+        self.classify_all_cb = QCheckBox("Show all saved colors (one-pass classification)")
+        self.classify_all_cb.setChecked(False)
+        self.classify_all_cb.stateChanged.connect(self.update_classify_all)
+        dual_range_layout.addWidget(self.classify_all_cb)
+        
+        # Range fitting from the pixels sampled with the "Sample color" / "Sample background" tools
+        self.sample_frames_cb = QCheckBox("Keep sampling the regions on every frame")
+        self.sample_frames_cb.stateChanged.connect(self.update_sample_across_frames)
+        dual_range_layout.addWidget(self.sample_frames_cb)
+        fit_layout = QHBoxLayout()
+        self.fit_coverage_input = QSpinBox()
+        self.fit_coverage_input.setRange(50, 100)
+        self.fit_coverage_input.setValue(95)
+        self.fit_coverage_input.setPrefix("Cover ")
+        self.fit_coverage_input.setSuffix("%")
+        self.fit_range_btn = QPushButton("Fit Range")
+        self.fit_range_btn.clicked.connect(self.fit_sampled_range)
+        self.clear_samples_btn = QPushButton("Clear Samples")
+        self.clear_samples_btn.clicked.connect(self.clear_samples)
+        fit_layout.addWidget(self.fit_coverage_input)
+        fit_layout.addWidget(self.fit_range_btn)
+        fit_layout.addWidget(self.clear_samples_btn)
+        dual_range_layout.addLayout(fit_layout)
+        self.fit_quality_label = QLabel("No samples")
+        dual_range_layout.addWidget(self.fit_quality_label)
+        
         dual_range_group.setLayout(dual_range_layout)
         right_panel.addWidget(dual_range_group)
         
@@ -278,17 +459,40 @@ class HSVColorChecker(QMainWindow):
         content_layout.addLayout(right_panel)
         main_layout.addLayout(content_layout)
         
-        # Timer for camera
-        self.camera_timer = QTimer()
-        self.camera_timer.timeout.connect(self.update_frame)
+        # Size the processing thread scales finished images to
+        self.display_size = self.camera_label.size()
+        
+        # Display timer at the screen refresh rate, independent of the processing rate
+        screen = QApplication.primaryScreen()
+        refresh = screen.refreshRate() if screen is not None else 0
+        self.display_interval = 1.0 / (refresh if refresh > 0 else 60.0)
+        self.display_timer = QTimer()
+        self.display_timer.setTimerType(Qt.PreciseTimer)
+        self.display_timer.timeout.connect(self.show_frame)
+        
+        # Timer for pipeline statistics
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.update_pipeline_stats)
         
-        # Mouse click event
-        self.camera_label.mousePressEvent = self.get_color_at_point
+        # Timer showing the synchronized multi-camera view
+        self.multi_view_timer = QTimer()
+        self.multi_view_timer.timeout.connect(self.show_multi_frames)
+        
+        # Mouse events: color picking or ROI drawing, depending on the selected tool
+        self.camera_label.mousePressEvent = self.camera_mouse_press
+        self.camera_label.mouseMoveEvent = self.camera_mouse_move
+        self.camera_label.mouseReleaseEvent = self.camera_mouse_release
         
     def toggle_camera(self):
         if self.camera is None:
-            self.camera = cv2.VideoCapture(self.camera_select.currentIndex())
-            if self.camera.isOpened():
+            first = self.camera_select.currentIndex()
+            if self.replay_path is not None and first == self.camera_select.count() - 1:
+                cameras = [ReplaySource(FrameReader(self.replay_path), self.replay_speed(), loop=True)]
+            else:
+                cameras = [cv2.VideoCapture(first + i) for i in range(self.camera_count_input.value())]
+            if all(camera.isOpened() for camera in cameras):
+                self.camera = cameras[0]
+                self.cameras = cameras
                 self.start_camera_btn.setText("Stop Camera")
                 self.start_camera_btn.setStyleSheet("""
                     QPushButton {
@@ -302,13 +506,20 @@ class HSVColorChecker(QMainWindow):
                         background: #d32f2f;
                     }
                 """)
-                self.camera_timer.start(30)
+                if len(cameras) > 1:
+                    self.start_multi_pipeline()
+                else:
+                    self.start_pipeline()
+                    self.record_btn.setEnabled(True)
             else:
-                self.camera = None
+                for camera in cameras:
+                    camera.release()
         else:
-            self.camera_timer.stop()
-            self.camera.release()
+            self.stop_pipeline()
+            for camera in self.cameras:
+                camera.release()
             self.camera = None
+            self.cameras = []
             self.start_camera_btn.setText("Start Camera")
             self.start_camera_btn.setStyleSheet("""
                 QPushButton {
@@ -325,60 +536,395 @@ class HSVColorChecker(QMainWindow):
             self.camera_label.clear()
             self.mask_label.clear()
             
-    def update_frame(self):
-        ret, frame = self.camera.read()
-        if ret:
+    def start_pipeline(self):
+        # Drop-oldest queue between capture and processing keeps latency bounded
+        self.frame_queue = FrameQueue(maxsize=2)
+        self.capture_worker = CaptureWorker(self.camera, self.frame_queue)
+        self.processing_worker = ProcessingWorker(self.frame_queue, self.process_frame,
+                                                  lambda rendered: self.display_slot.publish(*rendered))
+        self.capture_worker.start()
+        self.processing_worker.start()
+        self.display_timer.start(max(1, int(self.display_interval * 1000)))
+        self.stats_timer.start(500)
+        
+    def start_multi_pipeline(self):
+        # Tiles are scaled on the pool so the GUI thread only pastes them together
+        columns = int(np.ceil(np.sqrt(len(self.cameras))))
+        rows = int(np.ceil(len(self.cameras) / columns))
+        self.tile_size = (self.display_size.width() // columns, self.display_size.height() // rows)
+        self.last_tiles = None
+        self.camera_manager = MultiCameraManager(self.cameras, self.process_tile)
+        self.camera_manager.start()
+        self.multi_view_timer.start(33)
+        self.stats_timer.start(500)
+        
+    def stop_pipeline(self):
+        self.stop_recording()
+        self.record_btn.setEnabled(False)
+        self.stats_timer.stop()
+        self.display_timer.stop()
+        self.multi_view_timer.stop()
+        if self.camera_manager is not None:
+            self.camera_manager.stop()
+            self.camera_manager = None
+        if self.capture_worker is not None:
+            self.capture_worker.stop()
+            self.frame_queue.close()
+            self.processing_worker.stop()
+        self.capture_worker = None
+        self.processing_worker = None
+        self.frame_queue = None
+        
+    def filter_frame(self, image, rois):
+        # Returns (filtered frame, per-ROI result lines or None, current range mask or None)
+        if rois:
+            return self.process_rois(image, rois) + (None,)
+        if self.classify_all:
+            return self.classify_colors(image), None, None
+        mask, filtered_frame = self.apply_hsv_mask(image)
+        return filtered_frame, None, mask
+        
+    def process_frame(self, frame):
+        # Runs on the processing thread: masks every frame, renders only as often as the screen refreshes
+        start = time.perf_counter()
+        rois, draft, samples = self.rois, self.roi_draft, self.sample_regions
+        filtered_frame, roi_results, mask = self.filter_frame(frame.image, rois)
+        if samples and self.sample_across_frames:
+            self.add_samples(frame.image, samples)
+        masked = time.perf_counter()
+        self.stage_timer.add('mask', masked - start)
+        analyzer, blobs = self.blob_analyzer, None
+        if analyzer is not None and mask is not None and self.blob_skipper.should_process(frame):
+            blobs = analyzer.analyze(mask, wall_time(frame.timestamp), frame.index)
+            analyzed = time.perf_counter()
+            self.blob_skipper.record(analyzed - masked)
+            self.stage_timer.add('blobs', analyzed - masked)
+            self.last_blobs = blobs
+            masked = analyzed
+        if masked - self.last_render < self.display_interval:
+            return None
+        self.last_render = masked
+        
+        slot = self.display_slot.acquire()
+        camera_view = self.render(frame.image, slot, 'camera')
+        if rois or draft or samples:
+            # Overlays are drawn on the small display copy, never on a full-size copy of the frame
+            scale = camera_view.shape[1] / frame.image.shape[1]
+            self.draw_overlays(camera_view, scale, rois, samples, draft)
+        mask_view = self.render(filtered_frame, slot, 'mask')
+        blobs = self.last_blobs if analyzer is not None and mask is not None else None
+        if blobs is not None:
+            scale = mask_view.shape[1] / frame.image.shape[1]
+            for blob in blobs.blobs:
+                x, y, w, h = (int(v * scale) for v in blob.bbox)
+                cv2.rectangle(mask_view, (x, y), (x + w, y + h), (0, 255, 255), 1)
+        rendered = (frame, bgr_qimage(camera_view), bgr_qimage(mask_view), roi_results, blobs)
+        self.stage_timer.add('render', time.perf_counter() - masked)
+        return slot, rendered
+        
+    def render(self, image, slot, name):
+        # One resize straight into the slot's preallocated buffer at the label size
+        size = fit_size(image.shape, (self.display_size.width(), self.display_size.height()))
+        view = self.display_slot.array(slot, name, (size[1], size[0], 3))
+        cv2.resize(image, size, dst=view, interpolation=cv2.INTER_LINEAR)
+        return view
+        
+    def draw_overlays(self, view, scale, rois, samples, draft):
+        def scaled(points):
+            return [(int(x * scale), int(y * scale)) for x, y in points]
+        for roi in rois:
+            ROI(roi.name, scaled(roi.points)).draw(view)
+        for x, y, w, h, is_background in samples:
+            (x0, y0), (x1, y1) = scaled([(x, y), (x + w, y + h)])
+            cv2.rectangle(view, (x0, y0), (x1, y1), (0, 0, 255) if is_background else (0, 255, 0), 1)
+        if len(draft) > 1:
+            ROI("", scaled(draft)).draw(view, (255, 0, 255))
+        
+    def show_frame(self):
+        # Runs on the GUI thread at the screen refresh rate: only hands the newest images to the labels
+        result = self.display_slot.take()
+        if result is None:
+            return
+        start = time.perf_counter()
+        frame, camera_image, mask_image, roi_results, blobs = result
+        if self.camera is not None:
             # Store the frame for color picking
-            self.current_frame = frame
-            
-            # Show the regular frame
-            self.display_frame(frame, self.camera_label)
+            self.current_frame = frame.image
+            self.camera_label.setPixmap(QPixmap.fromImage(camera_image))
+            self.mask_label.setPixmap(QPixmap.fromImage(mask_image))
+            if roi_results is not None:
+                self.roi_results_label.setText("\n".join(roi_results))
+            if blobs is not None:
+                self.show_blobs(blobs)
+        # The pixmaps own copies now; the slot's buffers may be reused
+        self.display_slot.release()
+        self.stage_timer.add('show', time.perf_counter() - start)
+        self.display_meter.tick()
+        
+    def process_tile(self, image):
+        # Runs on the multi-camera pool: filter one camera frame and scale both views to a tile
+        filtered_frame, _, _ = self.filter_frame(image, self.rois)
+        return (cv2.resize(image, self.tile_size, interpolation=cv2.INTER_AREA),
+                cv2.resize(filtered_frame, self.tile_size, interpolation=cv2.INTER_AREA))
+        
+    def show_multi_frames(self):
+        # Frames captured within 50 ms of each other, one per camera
+        frames = self.camera_manager.synchronized() if self.camera_manager is not None else None
+        if frames is None:
+            return
+        key = tuple(frame.index for frame, _ in frames.values())
+        if key == self.last_tiles:
+            return
+        self.last_tiles = key
+        tiles = [result for _, result in frames.values()]
+        camera_mosaic = tile_images([camera for camera, _ in tiles], self.tile_size)
+        mask_mosaic = tile_images([mask for _, mask in tiles], self.tile_size)
+        self.current_frame = camera_mosaic
+        self.camera_label.setPixmap(QPixmap.fromImage(bgr_qimage(camera_mosaic)))
+        self.mask_label.setPixmap(QPixmap.fromImage(bgr_qimage(mask_mosaic)))
+        
+    def update_pipeline_stats(self):
+        if self.camera_manager is not None:
+            self.pipeline_stats_label.setText("\n".join(
+                f"{name}: Capture {stats['capture_fps']:.1f} FPS | Processing {stats['processing_fps']:.1f} FPS | "
+                f"Latency {stats['latency_p50_ms']:.0f} ms | Dropped {stats['dropped']}"
+                for name, stats in self.camera_manager.stats().items()))
+            return
+        if self.capture_worker is None:
+            return
+        text = (f"Capture: {self.capture_worker.meter.rate:.1f} FPS | "
+                f"Processing: {self.processing_worker.meter.rate:.1f} FPS | "
+                f"Display: {self.display_meter.rate:.1f} FPS | "
+                f"Dropped: {self.frame_queue.dropped}")
+        if self.recorder is not None:
+            text += f" | Recorded: {self.recorder.frames} (dropped {self.recorder.dropped})"
+        # Per-stage timing: mean / p99 in ms
+        text += "\n" + " | ".join(f"{name} {mean:.1f}/{p99:.1f} ms"
+                                  for name, (mean, p99) in self.stage_timer.summary().items())
+        self.pipeline_stats_label.setText(text)
             
-            # Apply HSV mask and show it
-            self.apply_hsv_mask(frame)
+    def toggle_recording(self, checked):
+        if not checked:
+            self.stop_recording()
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Record", "recording.hsvrec", "Recordings (*.hsvrec)")
+        if not path or self.capture_worker is None:
+            self.record_btn.setChecked(False)
+            return
+        # Frames are encoded on the recorder's own thread, never on the capture thread
+        self.recorder = RecorderTap(FrameRecorder(path))
+        self.capture_worker.taps.append(self.recorder)
+        
+    def stop_recording(self):
+        if self.recorder is None:
+            return
+        if self.capture_worker is not None and self.recorder in self.capture_worker.taps:
+            self.capture_worker.taps.remove(self.recorder)
+        self.recorder.close(wait=False)
+        self.recorder = None
+        self.record_btn.setChecked(False)
+        
+    def open_recording(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open Recording", "", "Recordings (*.hsvrec)")
+        if not path:
+            return
+        if self.camera is not None:
+            self.toggle_camera()
+        # The recording becomes the last entry of the camera list and plays in a loop
+        if self.replay_path is not None:
+            self.camera_select.removeItem(self.camera_select.count() - 1)
+        self.replay_path = path
+        self.camera_select.addItem(f"Recording: {os.path.basename(path)}")
+        self.camera_select.setCurrentIndex(self.camera_select.count() - 1)
+        self.toggle_camera()
+        
+    def replay_speed(self):
+        return [1.0, 2.0, 4.0, 0.0][self.replay_speed_select.currentIndex()]
+        
+    def update_replay_speed(self, index):
+        if isinstance(self.camera, ReplaySource):
+            self.camera.speed = self.replay_speed()
+            self.camera.started = None
             
     def apply_hsv_mask(self, frame):
-        # Convert to HSV
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        
-        # Create mask based on current HSV range
-        if self.dual_range_cb.isChecked() and self.h_min > self.h_max:
-            # For colors like red that wrap around the hue circle
-            mask1 = cv2.inRange(hsv, np.array([0, self.s_min, self.v_min]), 
-                               np.array([self.h_max, self.s_max, self.v_max]))
-            mask2 = cv2.inRange(hsv, np.array([self.h_min, self.s_min, self.v_min]), 
-                               np.array([179, self.s_max, self.v_max]))
-            mask = cv2.bitwise_or(mask1, mask2)
+        # Mask with the current range snapshot; returns (mask, frame with only the filtered regions)
+        return apply_mask(frame, self.hsv_range)
+        
+    def update_blob_analysis(self, *args):
+        # A new analyzer replaces the old one in one assignment, like the range snapshot
+        if self.blob_cb.isChecked():
+            self.last_blobs = None
+            self.blob_analyzer = BlobAnalyzer(min_area=self.blob_min_area_input.value())
         else:
-            # Normal range
-            mask = cv2.inRange(hsv, np.array([self.h_min, self.s_min, self.v_min]), 
-                              np.array([self.h_max, self.s_max, self.v_max]))
-        
-        # Apply the mask to get only the filtered regions
-        filtered_frame = cv2.bitwise_and(frame, frame, mask=mask)
-        
-        # Display the mask
-        self.display_frame(filtered_frame, self.mask_label)
-        
-    def display_frame(self, frame, label):
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = frame_rgb.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(frame_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        label.setPixmap(QPixmap.fromImage(qt_image).scaled(
-            label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            self.blob_analyzer = None
+            self.blob_results_label.setText("")
             
-    def get_color_at_point(self, event):
+    def show_blobs(self, result):
+        largest = result.blobs[:3]
+        text = f"Blobs: {len(result.blobs)} | total area {result.total_area} px"
+        text += f" | analyzed {self.blob_skipper.processed}, skipped {self.blob_skipper.skipped}"
+        for blob in largest:
+            text += f"\n  area {blob.area} at ({blob.centroid[0]:.0f}, {blob.centroid[1]:.0f}) bbox {blob.bbox}"
+        self.blob_results_label.setText(text)
+        
+    def process_rois(self, frame, rois):
+        # Convert, mask and count only inside the ROIs; everything outside stays black
+        filtered_frame = np.zeros_like(frame)
+        classifier, palette = self.color_classifier
+        results = []
+        for roi in rois:
+            x, y, w, h = roi.bounds(frame.shape)
+            if self.classify_all:
+                labels = roi_labels(frame, roi, classifier)
+                if labels is None:
+                    results.append(f"{roi.name}: outside the frame")
+                    continue
+                filtered_frame[y:y + h, x:x + w] = colorize_labels(labels, palette)
+                counts = np.bincount(labels.ravel(), minlength=len(classifier.colors) + 1)
+                names = [color.get('name', "Current") for color in classifier.colors]
+                results.append(f"{roi.name}: " + ", ".join(
+                    f"{name}={count}" for name, count in zip(names, counts[1:])))
+            else:
+                mask, crop = roi_mask(frame, roi, self.hsv_range)
+                if mask is None:
+                    results.append(f"{roi.name}: outside the frame")
+                    continue
+                filtered_frame[y:y + h, x:x + w] = cv2.bitwise_and(crop, crop, mask=mask)
+                area = w * h if roi.is_rect else cv2.countNonZero(roi.crop_mask(frame.shape))
+                count = cv2.countNonZero(mask)
+                results.append(f"{roi.name}: {count} px ({100.0 * count / max(1, area):.1f}%)")
+        return filtered_frame, results
+        
+    def classify_colors(self, frame):
+        # Label every pixel with the saved color it matches, painted with that color's hue
+        classifier, palette = self.color_classifier
+        labels = classifier.classify(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV))
+        return colorize_labels(labels, palette)
+        
+    def label_to_frame(self, event):
+        # Mouse position on camera_label -> pixel of the current frame, or None
         if not hasattr(self, 'current_frame'):
-            return
-            
-        # Get click position relative to the image
+            return None
         x = int(event.x() * self.current_frame.shape[1] / self.camera_label.width())
         y = int(event.y() * self.current_frame.shape[0] / self.camera_label.height())
+        if x < 0 or y < 0 or x >= self.current_frame.shape[1] or y >= self.current_frame.shape[0]:
+            return None
+        return x, y
+        
+    def camera_mouse_press(self, event):
+        tool = self.roi_tool_select.currentIndex()
+        if tool == 0:
+            self.get_color_at_point(event)
+            return
+        if self.camera_manager is not None:
+            # ROIs and sample regions are in single-camera coordinates, not on the mosaic
+            return
+        point = self.label_to_frame(event)
+        if tool == 2 and event.button() == Qt.RightButton:
+            # Right click closes the polygon
+            if len(self.roi_draft) >= 3:
+                self.add_roi(self.roi_draft)
+            self.roi_draft = []
+        elif point is None:
+            return
+        elif tool == 2:
+            self.roi_draft = self.roi_draft + [point]
+        else:
+            self.roi_draft = [point, point]
+            
+    def camera_mouse_move(self, event):
+        point = self.label_to_frame(event)
+        if self.roi_tool_select.currentIndex() in (1, 3, 4) and self.roi_draft and point is not None:
+            self.roi_draft = [self.roi_draft[0], point]
+            
+    def camera_mouse_release(self, event):
+        tool = self.roi_tool_select.currentIndex()
+        if tool not in (1, 3, 4) or not self.roi_draft:
+            return
+        (x0, y0), (x1, y1) = self.roi_draft
+        self.roi_draft = []
+        dragged = abs(x1 - x0) > 4 and abs(y1 - y0) > 4
+        if tool == 1:
+            # Ignore plain clicks
+            if dragged:
+                self.add_roi([(x0, y0), (x1, y1)])
+        elif dragged:
+            self.add_sample_region(min(x0, x1), min(y0, y1), abs(x1 - x0), abs(y1 - y0), tool == 4)
+        else:
+            # A click samples a 5x5 patch around the pixel
+            self.add_sample_region(x0 - 2, y0 - 2, 5, 5, tool == 4)
+            
+    def add_sample_region(self, x, y, w, h, is_background):
+        region = (x, y, w, h, is_background)
+        self.sample_regions = self.sample_regions + [region]
+        if hasattr(self, 'current_frame') and self.camera_manager is None:
+            self.add_samples(self.current_frame, [region])
+        self.update_fit_quality()
+        
+    def add_samples(self, image, regions):
+        # Only the sampled rectangles are converted to HSV
+        for x, y, w, h, is_background in regions:
+            x0, y0 = max(0, x), max(0, y)
+            crop = image[y0:y + h, x0:x + w]
+            if crop.size == 0:
+                continue
+            histogram = self.background_samples if is_background else self.color_samples
+            histogram.add(cv2.cvtColor(crop, cv2.COLOR_BGR2HSV))
+            
+    def update_sample_across_frames(self, state):
+        self.sample_across_frames = self.sample_frames_cb.isChecked()
+        
+    def clear_samples(self):
+        self.sample_regions = []
+        self.color_samples.clear()
+        self.background_samples.clear()
+        self.update_fit_quality()
+        
+    def fit_sampled_range(self):
+        if not self.color_samples.total:
+            self.fit_quality_label.setText("Sample the color first")
+            return
+        color = fit_range(self.color_samples, self.fit_coverage_input.value() / 100)
+        # Dual ranges map back to the sliders as h_min > h_max
+        if color['use_dual_range']:
+            h_min, h_max = color['lower2'][0], color['upper1'][0]
+        else:
+            h_min, h_max = color['lower1'][0], color['upper1'][0]
+        self.dual_range_cb.setChecked(color['use_dual_range'])
+        self.h_min_slider.setValue(int(h_min))
+        self.h_max_slider.setValue(int(h_max))
+        self.s_min_slider.setValue(int(color['lower1'][1]))
+        self.s_max_slider.setValue(int(color['upper1'][1]))
+        self.v_min_slider.setValue(int(color['lower1'][2]))
+        self.v_max_slider.setValue(int(color['upper1'][2]))
+        self.update_fit_quality()
+        
+    def update_fit_quality(self):
+        if not self.color_samples.total:
+            self.fit_quality_label.setText("No samples")
+            return
+        report = evaluate(self.hsv_range, self.color_samples, self.background_samples)
+        text = f"Current range covers {report['coverage']:.1%} of {report['samples']} color samples"
+        if 'background' in report:
+            text += f", {report['background']:.1%} of {report['background_samples']} background samples"
+        self.fit_quality_label.setText(text)
+            
+    def add_roi(self, points):
+        self.rois = self.rois + [ROI(f"ROI_{len(self.rois)+1}", points)]
         
-        # Ensure within bounds
-        if x >= self.current_frame.shape[1] or y >= self.current_frame.shape[0]:
+    def cancel_roi_draft(self, index):
+        self.roi_draft = []
+        
+    def clear_rois(self):
+        self.rois = []
+        self.roi_draft = []
+        self.roi_results_label.setText("No ROIs (whole frame is processed)")
+        
+    def get_color_at_point(self, event):
+        point = self.label_to_frame(event)
+        if point is None:
             return
+        x, y = point
             
         # Get the BGR color at that point
         bgr_color = self.current_frame[y, x]
@@ -400,50 +946,86 @@ class HSVColorChecker(QMainWindow):
     def update_h_min(self, value):
         self.h_min = value
         self.h_min_value.setText(str(value))
+        self.update_hsv_range()
         
     def update_h_max(self, value):
         self.h_max = value
         self.h_max_value.setText(str(value))
+        self.update_hsv_range()
         
     def update_s_min(self, value):
         self.s_min = value
         self.s_min_value.setText(str(value))
+        self.update_hsv_range()
         
     def update_s_max(self, value):
         self.s_max = value
         self.s_max_value.setText(str(value))
+        self.update_hsv_range()
         
     def update_v_min(self, value):
         self.v_min = value
         self.v_min_value.setText(str(value))
+        self.update_hsv_range()
         
     def update_v_max(self, value):
         self.v_max = value
         self.v_max_value.setText(str(value))
+        self.update_hsv_range()
+        
+    def update_hsv_range(self):
+        # Replace the snapshot in one assignment so the processing thread never sees a half update
+        self.hsv_range = make_color_range(self.h_min, self.h_max, self.s_min, self.s_max,
+                                          self.v_min, self.v_max, self.dual_range_cb.isChecked())
+        self.rebuild_classifier()
+        
+    def rebuild_classifier(self):
+        # Only called when a slider or the saved colors change, never per frame
+        colors = self.saved_colors + [self.hsv_range]
+        self.color_classifier = (ColorClassifier(colors), label_palette(colors))
+        
+    def update_classify_all(self, state):
+        self.classify_all = self.classify_all_cb.isChecked()
         
     def save_color_range(self):
-        if self.dual_range_cb.isChecked() and self.h_min > self.h_max:
-            # For colors that wrap around (like red)
-            color_info = {
-                'name': f"Color_{len(self.saved_colors)+1}",
-                'use_dual_range': True,
-                'lower1': np.array([0, self.s_min, self.v_min]),
-                'upper1': np.array([self.h_max, self.s_max, self.v_max]),
-                'lower2': np.array([self.h_min, self.s_min, self.v_min]),
-                'upper2': np.array([179, self.s_max, self.v_max])
-            }
-        else:
-            # Normal range
-            color_info = {
-                'name': f"Color_{len(self.saved_colors)+1}",
-                'use_dual_range': False,
-                'lower1': np.array([self.h_min, self.s_min, self.v_min]),
-                'upper1': np.array([self.h_max, self.s_max, self.v_max])
-            }
+        # The classifier labels fit in uint8; one label is kept for the slider range being edited
+        if len(self.saved_colors) >= 254:
+            QMessageBox.warning(self, "Save Color", "At most 254 colors can be saved")
+            return
+        color_info = make_color_range(self.h_min, self.h_max, self.s_min, self.s_max,
+                                      self.v_min, self.v_max, self.dual_range_cb.isChecked(),
+                                      name=f"Color_{len(self.saved_colors)+1}")
             
         self.saved_colors.append(color_info)
+        self.rebuild_classifier()
         self.update_saved_colors_display()
         
+    def save_colors_file(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save Project", "project.json", "JSON (*.json)")
+        if path:
+            self.project.colors = list(self.saved_colors)
+            self.project.rois = list(self.rois)
+            self.project.compile()
+            self.project.save(path)
+            
+    def load_colors_file(self):
+        # Also opens plain color files saved by earlier versions
+        path, _ = QFileDialog.getOpenFileName(self, "Open Project", "", "JSON (*.json)")
+        if path:
+            try:
+                project = load_project(path)
+                if len(project.colors) >= 255:
+                    raise ValueError("At most 254 colors can be loaded")
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, "Open Project", f"Cannot open {path}: {e}")
+                return
+            self.project = project
+            self.saved_colors = list(self.project.colors)
+            self.rois = list(self.project.rois)
+            self.roi_draft = []
+            self.rebuild_classifier()
+            self.update_saved_colors_display()
+        
     def update_saved_colors_display(self):
         if not self.saved_colors:
             self.saved_colors_label.setText("No colors saved yet")
@@ -492,11 +1074,14 @@ class HSVColorChecker(QMainWindow):
         
     def closeEvent(self, event):
         if self.camera is not None:
-            self.camera.release()
+            self.stop_pipeline()
+            for camera in self.cameras:
+                camera.release()
         event.accept()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = HSVColorChecker()
+    path = project_path(sys.argv)
+    window = HSVColorChecker(load_project(path) if path else None)
     window.show()
     sys.exit(app.exec_()) 
\ No newline at end of file
@@ -0,0 +1,135 @@
+import threading
+import numpy as np
+from hsv_mask import make_color_range, color_ranges
+
+# Histogram bins: every hue, saturation and value in steps of SV_STEP
+H_BINS = 180
+SV_STEP = 4
+SV_BINS = 256 // SV_STEP
+
+
+class HSVHistogram:
+    """3D H/S/V histogram accumulated from pixel samples over many frames.
+
+    Adding pixels is one np.bincount over their flattened bin indexes, so a
+    dragged region of a few thousand pixels costs well under a millisecond.
+    Safe to add from the processing thread while the GUI thread fits.
+    """
+    def __init__(self):
+        self.counts = np.zeros(H_BINS * SV_BINS * SV_BINS, dtype=np.int64)
+        self.lock = threading.Lock()
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def add(self, hsv, mask=None):
+        """Adds the pixels of an HSV image (optionally only where mask is non-zero)"""
+        pixels = hsv.reshape(-1, 3) if mask is None else hsv[mask != 0]
+        if len(pixels) == 0:
+            return
+        pixels = pixels.astype(np.intp)
+        index = (np.minimum(pixels[:, 0], H_BINS - 1) * SV_BINS + (pixels[:, 1] // SV_STEP)) * SV_BINS \
+            + pixels[:, 2] // SV_STEP
+        counts = np.bincount(index, minlength=len(self.counts))
+        with self.lock:
+            self.counts += counts
+
+    def add_region(self, hsv, rect):
+        """Adds the pixels of an (x, y, w, h) rectangle, clipped to the image"""
+        x, y, w, h = rect
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(hsv.shape[1], x + w), min(hsv.shape[0], y + h)
+        if x1 > x0 and y1 > y0:
+            self.add(hsv[y0:y1, x0:x1])
+
+    def clear(self):
+        with self.lock:
+            self.counts[:] = 0
+
+    def cube(self):
+        with self.lock:
+            return self.counts.reshape(H_BINS, SV_BINS, SV_BINS).copy()
+
+
+def shortest_interval(counts, fraction, circular=False):
+    """(start, end) bins of the shortest interval holding fraction of counts.
+
+    For a circular axis end may run past the last bin (wrap-around).
+    """
+    n = len(counts)
+    total = counts.sum()
+    if total == 0:
+        return 0, n - 1
+    target = fraction * total
+    values = np.concatenate([counts, counts]) if circular else counts
+    cumulative = np.concatenate([[0], np.cumsum(values)])
+    starts = np.arange(n)
+    # Smallest end with cumulative[end + 1] - cumulative[start] >= target
+    ends = np.searchsorted(cumulative, cumulative[starts] + target - 1e-9) - 1
+    ends = np.maximum(ends, starts)
+    valid = ends < len(values)
+    if circular:
+        valid &= ends - starts < n
+    lengths = np.where(valid, ends - starts, len(values))
+    best = int(np.argmin(lengths))
+    return best, int(min(ends[best], best + n - 1 if circular else n - 1))
+
+
+def range_mask(color):
+    """Boolean histogram cube of the bins inside a color range (S/V bins by their centre)"""
+    centres = np.arange(SV_BINS) * SV_STEP + (SV_STEP - 1) / 2
+    hues = np.arange(H_BINS)
+    mask = np.zeros((H_BINS, SV_BINS, SV_BINS), dtype=bool)
+    for lower, upper in color_ranges(color):
+        h = (hues >= lower[0]) & (hues <= upper[0])
+        s = (centres >= lower[1]) & (centres <= upper[1])
+        v = (centres >= lower[2]) & (centres <= upper[2])
+        mask[np.ix_(h, s, v)] = True
+    return mask
+
+
+def coverage(histogram, color):
+    """Fraction of the histogram's samples inside a color range"""
+    cube = histogram.cube()
+    total = cube.sum()
+    return float(cube[range_mask(color)].sum() / total) if total else 0.0
+
+
+def fit_range(histogram, target=0.95, name=None):
+    """Tightest range (dual for hues wrapping past 179) holding about target of the samples.
+
+    Each channel first gets the shortest interval holding target^(1/3) of its
+    marginal; the per-channel share grows until the joint coverage of the
+    three intervals reaches target.
+    """
+    cube = histogram.cube()
+    total = cube.sum()
+    if total == 0:
+        raise ValueError("No samples to fit")
+    hue = cube.sum(axis=(1, 2))
+    saturation = cube.sum(axis=(0, 2))
+    value = cube.sum(axis=(0, 1))
+    share = target ** (1 / 3)
+    for _ in range(12):
+        h_start, h_end = shortest_interval(hue, share, circular=True)
+        s_start, s_end = shortest_interval(saturation, share)
+        v_start, v_end = shortest_interval(value, share)
+        wraps = h_end >= H_BINS
+        color = make_color_range(h_start, h_end % H_BINS if wraps else h_end,
+                                 s_start * SV_STEP, min(255, s_end * SV_STEP + SV_STEP - 1),
+                                 v_start * SV_STEP, min(255, v_end * SV_STEP + SV_STEP - 1),
+                                 dual_range=wraps, name=name)
+        if cube[range_mask(color)].sum() >= target * total or share >= 1.0:
+            break
+        share = min(1.0, share + (1.0 - share) / 2 + 1e-3)
+    return color
+
+
+def evaluate(color, samples, background=None):
+    """Quality of a range: share of sampled color pixels covered, and of background pixels wrongly covered"""
+    report = {'samples': samples.total, 'coverage': coverage(samples, color)}
+    if background is not None and background.total:
+        report['background_samples'] = background.total
+        report['background'] = coverage(background, color)
+    return report
@@ -0,0 +1,217 @@
+import json
+import cv2
+import numpy as np
+
+
+def make_color_range(h_min, h_max, s_min, s_max, v_min, v_max, dual_range=False, name=None):
+    """Build a color range dict in the same format as HSVColorChecker.saved_colors"""
+    color = {} if name is None else {'name': name}
+    if dual_range and h_min > h_max:
+        # For colors like red that wrap around the hue circle
+        color.update({
+            'use_dual_range': True,
+            'lower1': np.array([0, s_min, v_min]),
+            'upper1': np.array([h_max, s_max, v_max]),
+            'lower2': np.array([h_min, s_min, v_min]),
+            'upper2': np.array([179, s_max, v_max])
+        })
+    else:
+        color.update({
+            'use_dual_range': False,
+            'lower1': np.array([h_min, s_min, v_min]),
+            'upper1': np.array([h_max, s_max, v_max])
+        })
+    return color
+
+
+def color_to_dict(color):
+    """JSON-friendly copy of a color range (arrays become lists)"""
+    return {key: value.tolist() if isinstance(value, np.ndarray) else value
+            for key, value in color.items()}
+
+
+def color_from_dict(data):
+    """Inverse of color_to_dict"""
+    return {key: np.array(value) if key.startswith(('lower', 'upper')) else value
+            for key, value in data.items()}
+
+
+def save_colors(path, colors, rois=()):
+    """Saves the color ranges, plus the regions of interest (roi.ROI) they are measured in"""
+    data = {'colors': [color_to_dict(color) for color in colors]}
+    if rois:
+        data['rois'] = [roi.to_dict() for roi in rois]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+def load_colors(path):
+    with open(path, encoding='utf-8') as f:
+        return [color_from_dict(color) for color in json.load(f)['colors']]
+
+
+def build_mask(hsv, color):
+    """Binary mask (0/255) of the pixels of an HSV image inside a color range"""
+    mask = cv2.inRange(hsv, color['lower1'], color['upper1'])
+    if color['use_dual_range']:
+        mask = cv2.bitwise_or(mask, cv2.inRange(hsv, color['lower2'], color['upper2']))
+    return mask
+
+
+def apply_mask(frame, color):
+    """Returns (mask, filtered BGR frame) for one color range"""
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    mask = build_mask(hsv, color)
+    return mask, cv2.bitwise_and(frame, frame, mask=mask)
+
+
+def color_ranges(color):
+    """(lower, upper) pairs of a color range dict"""
+    ranges = [(color['lower1'], color['upper1'])]
+    if color['use_dual_range']:
+        ranges.append((color['lower2'], color['upper2']))
+    return ranges
+
+
+def _lowest_bit_labels(owners, width):
+    """Table mapping every width-bit mask to 1 + the color owning its lowest set bit (0 = none)"""
+    values = np.arange(1 << width, dtype=np.int64)
+    lowest = values & -values
+    table = np.zeros(1 << width, dtype=np.uint8)
+    hit = values > 0
+    bit_index = np.log2(lowest[hit]).astype(np.intp)
+    owners = np.append(np.asarray(owners, dtype=np.uint8) + 1, np.zeros(width, dtype=np.uint8))
+    table[hit] = owners[bit_index]
+    return table
+
+
+class ColorClassifier:
+    """Classifies every pixel against all saved colors in a single pass.
+
+    Each range gets one bit. Three per-channel tables hold, for every H, S
+    and V value, the bits of the ranges that accept it; cv2.LUT looks all
+    three up at once, the AND of the channels gives the ranges a pixel falls
+    in, and a last table turns that bit set into a label (1 + color index,
+    0 = no match). The ranges of a dual-range color share S/V bounds, so the
+    wrap-around hue interval is stored as one bit. On overlap the earlier
+    color wins. Building the tables is cheap; rebuild only when a range changes.
+    With more than MAX_RANGES distinct ranges the classifier falls back to one
+    inRange per color (slower, same labels).
+    """
+    MAX_RANGES = 32
+
+    def __init__(self, colors):
+        self.colors = list(colors)
+        if len(self.colors) > 255:
+            raise ValueError("At most 255 colors can be classified")
+
+        # One group per (color, S/V bounds): hue intervals with equal S/V are merged
+        groups = []
+        for index, color in enumerate(self.colors):
+            for lower, upper in color_ranges(color):
+                key = (index, int(lower[1]), int(upper[1]), int(lower[2]), int(upper[2]))
+                for group in groups:
+                    if group[0] == key:
+                        group[1].append((int(lower[0]), int(upper[0])))
+                        break
+                else:
+                    groups.append((key, [(int(lower[0]), int(upper[0]))]))
+        self.bits = len(groups)
+        if self.bits > self.MAX_RANGES:
+            self.table = None
+            return
+
+        if self.bits <= 8:
+            dtype = np.uint8
+        elif self.bits <= 16:
+            dtype = np.uint16
+        else:
+            dtype = np.int32
+        self.table = np.zeros((1, 256, 3), dtype=dtype)
+        owners = []
+        for bit, ((index, s_lo, s_hi, v_lo, v_hi), hues) in enumerate(groups):
+            flag = np.array(1 << bit).astype(dtype)
+            for h_lo, h_hi in hues:
+                self.table[0, h_lo:h_hi + 1, 0] |= flag
+            self.table[0, s_lo:s_hi + 1, 1] |= flag
+            self.table[0, v_lo:v_hi + 1, 2] |= flag
+            owners.append(index)
+
+        if self.bits <= 16:
+            self.labels = _lowest_bit_labels(owners, 8 if self.bits <= 8 else 16)
+        else:
+            self.labels = _lowest_bit_labels(owners[:16], 16)
+            self.labels_high = _lowest_bit_labels(owners[16:], 16)
+
+    def classify(self, hsv):
+        """Label image (uint8): 0 = no color, i + 1 = self.colors[i]"""
+        if self.bits == 0:
+            return np.zeros(hsv.shape[:2], dtype=np.uint8)
+        if self.table is None:
+            # Later colors first, so earlier colors overwrite them on overlap
+            labels = np.zeros(hsv.shape[:2], dtype=np.uint8)
+            for index in range(len(self.colors) - 1, -1, -1):
+                labels[build_mask(hsv, self.colors[index]) != 0] = index + 1
+            return labels
+        h, s, v = cv2.split(cv2.LUT(hsv, self.table))
+        cv2.bitwise_and(h, s, dst=h)
+        cv2.bitwise_and(h, v, dst=h)
+        if self.bits <= 8:
+            return cv2.LUT(h, self.labels)
+        if self.bits <= 16:
+            return np.take(self.labels, h)
+        labels = np.take(self.labels, h & 0xFFFF)
+        high = np.take(self.labels_high, (h >> 16) & 0xFFFF)
+        return np.where(labels != 0, labels, high)
+
+    def mask(self, labels, index):
+        """Binary mask (0/255) of color index from a label image"""
+        return cv2.compare(labels, index + 1, cv2.CMP_EQ)
+
+
+class ColorMeasurement:
+    def __init__(self, name, count, centroid, bbox):
+        self.name = name
+        self.count = count
+        self.centroid = centroid
+        self.bbox = bbox
+
+    def as_dict(self):
+        return {'name': self.name, 'count': self.count,
+                'centroid': self.centroid, 'bbox': self.bbox}
+
+
+def measure_colors(labels, colors):
+    """Pixel count, centroid and bounding box of every color in a label image"""
+    results = []
+    for index, color in enumerate(colors):
+        mask = cv2.compare(labels, index + 1, cv2.CMP_EQ)
+        moments = cv2.moments(mask, binaryImage=True)
+        count = int(moments['m00'])
+        if count:
+            centroid = (int(moments['m10'] / count), int(moments['m01'] / count))
+            bbox = cv2.boundingRect(mask)
+        else:
+            centroid = (0, 0)
+            bbox = (0, 0, 0, 0)
+        results.append(ColorMeasurement(color.get('name', f"Color_{index + 1}"), count, centroid, bbox))
+    return results
+
+
+def label_palette(colors):
+    """BGR lookup table (1, 256, 3) giving each label the pure hue at the middle of its range"""
+    palette = np.zeros((1, 256, 3), dtype=np.uint8)
+    for index, color in enumerate(colors[:255]):
+        if color['use_dual_range']:
+            # Wrapped range: middle of [lower2 .. 179] + [0 .. upper1]
+            span = (180 - int(color['lower2'][0])) + int(color['upper1'][0])
+            hue = (int(color['lower2'][0]) + span // 2) % 180
+        else:
+            hue = (int(color['lower1'][0]) + int(color['upper1'][0])) // 2
+        palette[0, index + 1] = cv2.cvtColor(np.uint8([[[hue, 255, 255]]]), cv2.COLOR_HSV2BGR)[0, 0]
+    return palette
+
+
+def colorize_labels(labels, palette):
+    """Paint a label image with a palette from label_palette()"""
+    return cv2.LUT(cv2.merge([labels, labels, labels]), palette)
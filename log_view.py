@@ -0,0 +1,89 @@
+from activity_log import DEBUG, INFO, WARNING, ERROR
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QPlainTextEdit, QComboBox
+from PyQt5.QtCore import QTimer
+
+
+class LogView(QWidget):
+    """Hiển thị ActivityLog: cập nhật theo lô mỗi interval ms, lọc theo mức và thiết bị.
+
+    Mỗi lần cập nhật chỉ gọi appendPlainText một lần cho mọi dòng mới, và
+    QPlainTextEdit giữ tối đa log.entries.maxlen dòng nên không phình ra khi
+    đọc/ghi liên tục.
+    """
+    LEVELS = [("Tất cả", DEBUG), ("INFO trở lên", INFO), ("Cảnh báo trở lên", WARNING), ("Chỉ lỗi", ERROR)]
+
+    def __init__(self, log, parent=None, interval=250):
+        super().__init__(parent)
+        self.log = log
+        self.last_seq = 0
+        self.known_devices = set()
+
+        self.display = QPlainTextEdit()
+        self.display.setReadOnly(True)
+        self.display.setMaximumBlockCount(log.entries.maxlen)
+        self.level_select = QComboBox()
+        for label, level in self.LEVELS:
+            self.level_select.addItem(label, level)
+        self.level_select.setCurrentIndex(1)
+        self.level_select.currentIndexChanged.connect(self.reload)
+        self.device_select = QComboBox()
+        self.device_select.addItem("Mọi thiết bị", None)
+        self.device_select.currentIndexChanged.connect(self.reload)
+        clear_btn = QPushButton("Xóa nhật ký")
+        clear_btn.clicked.connect(self.clear)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Mức:"))
+        controls.addWidget(self.level_select)
+        controls.addWidget(QLabel("Thiết bị:"))
+        controls.addWidget(self.device_select)
+        controls.addStretch()
+        controls.addWidget(clear_btn)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(controls)
+        layout.addWidget(self.display)
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start(interval)
+
+    @property
+    def level(self):
+        return self.level_select.currentData()
+
+    @property
+    def device(self):
+        return self.device_select.currentData()
+
+    def flush(self):
+        """Đưa các dòng mới từ lần cập nhật trước lên màn hình"""
+        if self.log.seq == self.last_seq:
+            return
+        entries = self.log.since(self.last_seq)
+        if not entries:
+            return
+        self.last_seq = entries[-1].seq
+        self.update_devices(entries)
+        lines = [e.format() for e in entries if e.level >= self.level and self.device in (None, e.device)]
+        if lines:
+            self.display.appendPlainText('\n'.join(lines))
+
+    def update_devices(self, entries):
+        for entry in entries:
+            if entry.device and entry.device not in self.known_devices:
+                self.known_devices.add(entry.device)
+                self.device_select.addItem(entry.device, entry.device)
+
+    def reload(self):
+        """Dựng lại nội dung từ vòng đệm khi đổi bộ lọc"""
+        self.last_seq = self.log.seq
+        entries = self.log.snapshot(self.level, self.device)
+        self.display.setPlainText('\n'.join(e.format() for e in entries))
+        self.display.verticalScrollBar().setValue(self.display.verticalScrollBar().maximum())
+
+    def clear(self):
+        self.log.clear()
+        self.last_seq = self.log.seq
+        self.display.clear()
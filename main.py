@@ -1,7 +1,16 @@
 import rk_mcprotocol as mc
+import sys
 import time
+from tag_db import TagDatabase, TagDef
 
-def main():
+# Bảng tag: địa chỉ được kiểm tra và kế hoạch đọc/ghi được dựng sẵn một lần
+TAGS = TagDatabase([
+    TagDef('bits', 'M0', size=101),
+    TagDef('setpoint', 'D1', type='uint16'),
+    TagDef('value', 'D15', type='uint16'),
+])
+
+def main(mc=mc, historian=None):
     HOST = '192.168.0.23'  # Địa chỉ IP của PLC
     PORT = 1025
     
@@ -14,23 +23,26 @@ def main():
             try:
                 # Ghi bit M0-M100 ON
                 print("\nGhi bit M0-M100 ON:")
-                print(mc.write_bit(s, headdevice='m0', data_list=[1]*101))
+                print(TAGS.write(s, 'bits', [1]*101, mc))
                 
                 # Đợi 1 giây
                 time.sleep(1)
                 
                 # Ghi bit M0-M100 OFF
                 print("\nGhi bit M0-M100 OFF:")
-                print(mc.write_bit(s, headdevice='m0', data_list=[0]*101))
+                print(TAGS.write(s, 'bits', [0]*101, mc))
                 
-                # Ghi giá trị 0 vào D0
-                print("\nGhi giá trị 0 vào D0:")
-                print(mc.write_sign_word(s, headdevice='d1', data_list=[45], signed_type=False))
+                # Ghi giá trị 45 vào D1
+                print("\nGhi giá trị 45 vào D1:")
+                print(TAGS.write(s, 'setpoint', 45, mc))
                 
-                # Đọc giá trị từ D20
-                print("\nĐọc giá trị từ D20:")
-                value = mc.read_sign_word(s, headdevice='d15', length=1, signed_type=False)
-                print(f"Giá trị của D20: {value}")
+                # Đọc giá trị từ D15
+                print("\nĐọc giá trị từ D15:")
+                values = TAGS.read(s, ['value'], mc)
+                value = values['value']
+                print(f"Giá trị của D15: {value}")
+                if historian is not None:
+                    historian.record_values(values)
                 
                 # Đợi 1 giây trước khi lặp lại
                 time.sleep(1)
@@ -46,7 +58,19 @@ def main():
         if 's' in locals():
             s.close()
             print("Đã đóng kết nối với PLC")
+        if historian is not None:
+            historian.close()
 
 if __name__ == "__main__":
-    main()
+    # --history <thư mục>: lưu giá trị đọc được vào Historian thay vì chỉ in ra
+    historian = None
+    if '--history' in sys.argv and sys.argv.index('--history') + 1 < len(sys.argv):
+        from historian import Historian
+        historian = Historian(sys.argv[sys.argv.index('--history') + 1])
+    if '--async' in sys.argv:
+        # Dùng client asyncio SLMP thay cho rk_mcprotocol
+        import slmp_async
+        main(slmp_async, historian)
+    else:
+        main(historian=historian)
 
@@ -0,0 +1,226 @@
+import numpy as np
+from plc_devices import DEVICES, parse_address, format_number, frame_limit
+from read_planner import ReadBlock
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QComboBox, QSpinBox,
+                             QTableView, QHeaderView, QAbstractItemView)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QFont
+
+# Thiết bị xem được trong bảng bộ nhớ: thiết bị bit được gộp 16 điểm một hàng
+MEMORY_DEVICES = ('D', 'R', 'W', 'M', 'L', 'B', 'X', 'Y')
+BIT_WEIGHTS = (1 << np.arange(16)).astype(np.uint16)
+
+
+class DeviceMemoryModel(QAbstractTableModel):
+    """Bảng bộ nhớ của một thiết bị: mỗi hàng là một word (D, R, W) hoặc 16 bit (M, X, ...).
+
+    Giá trị được giữ trong một mảng numpy cho cả thiết bị (R: 32768 word =
+    64 KB), nên data() chỉ tra mảng và định dạng đúng các ô mà view đang vẽ.
+    Chỉ các hàng được đọc về (apply) mới có giá trị; các hàng đổi giá trị được
+    báo bằng dataChanged theo từng đoạn liền nhau.
+    """
+    HEADERS = ["Địa chỉ", "Thập phân", "Hex", "Có dấu", "32 bit"]
+    ADDRESS, DECIMAL, HEX, SIGNED, DWORD, BITS = range(6)
+
+    def __init__(self, device=DEVICES['D'], parent=None):
+        super().__init__(parent)
+        self.set_device(device)
+
+    def set_device(self, device):
+        self.beginResetModel()
+        self.device = device
+        self.step = 16 if device.is_bit else 1
+        self.rows = device.points // self.step
+        self.words = np.zeros(self.rows, dtype=np.uint16)
+        self.valid = np.zeros(self.rows, dtype=bool)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS) + (1 if self.device.is_bit else 0)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or orientation != Qt.Horizontal:
+            return None
+        if section == self.BITS:
+            last = format_number(self.device, self.step - 1)
+            return f"Bit ({last}..0)"
+        return self.HEADERS[section]
+
+    def label(self, row):
+        return f"{self.device.name}{format_number(self.device, row * self.step)}"
+
+    def row_of(self, address):
+        return address // self.step
+
+    def data(self, index, role=Qt.DisplayRole):
+        row, column = index.row(), index.column()
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignLeft | Qt.AlignVCenter) if column in (self.ADDRESS, self.BITS) \
+                else int(Qt.AlignRight | Qt.AlignVCenter)
+        if role != Qt.DisplayRole:
+            return None
+        if column == self.ADDRESS:
+            return self.label(row)
+        if not self.valid[row]:
+            return ""
+        word = int(self.words[row])
+        if column == self.DECIMAL:
+            return str(word)
+        if column == self.HEX:
+            return f"{word:04X}"
+        if column == self.SIGNED:
+            return str(word - 0x10000 if word & 0x8000 else word)
+        if column == self.DWORD:
+            # Word thấp ở hàng này, word cao ở hàng kế tiếp (như tag int32)
+            if row + 1 >= self.rows or not self.valid[row + 1]:
+                return ""
+            dword = word | (int(self.words[row + 1]) << 16)
+            return str(dword - 0x100000000 if dword & 0x80000000 else dword)
+        if column == self.BITS:
+            return format(word, '016b')
+        return None
+
+    def blocks(self, first, last):
+        """Các ReadBlock phủ hàng first..last, mỗi block không vượt giới hạn frame"""
+        rows_per_frame = frame_limit(self.device) // self.step
+        blocks = []
+        for row in range(first, last + 1, rows_per_frame):
+            count = min(rows_per_frame, last + 1 - row)
+            blocks.append(ReadBlock(self.device, row * self.step, count * self.step))
+        return blocks
+
+    def missing(self, first, last):
+        """Còn hàng chưa đọc về trong đoạn first..last"""
+        return not self.valid[first:last + 1].all()
+
+    def apply(self, blocks, raws):
+        """Nhận giá trị thô của các block, báo dataChanged cho các hàng đổi giá trị.
+
+        Trả về số hàng thay đổi.
+        """
+        changed_rows = 0
+        columns = self.columnCount() - 1
+        for block, raw in zip(blocks, raws):
+            if block.device is not self.device:
+                continue
+            if self.device.is_bit:
+                bits = np.asarray(raw, dtype=np.uint16).reshape(-1, 16)
+                words = (bits * BIT_WEIGHTS).sum(axis=1, dtype=np.uint16)
+            else:
+                words = np.asarray(raw, dtype=np.int64).astype(np.uint16)
+            start = self.row_of(block.start)
+            end = start + len(words)
+            changed = (self.words[start:end] != words) | ~self.valid[start:end]
+            if not changed.any():
+                continue
+            self.words[start:end] = words
+            self.valid[start:end] = True
+            changed_rows += int(changed.sum())
+            # Cột 32 bit của hàng trước cũng dùng word của hàng này
+            rows = np.flatnonzero(changed) + start
+            rows = np.union1d(rows, rows[rows > 0] - 1)
+            breaks = np.flatnonzero(np.diff(rows) > 1)
+            for first, last in zip(np.r_[rows[0], rows[breaks + 1]], np.r_[rows[breaks], rows[-1]]):
+                self.dataChanged.emit(self.index(int(first), 1), self.index(int(last), columns), [Qt.DisplayRole])
+        return changed_rows
+
+    def invalidate(self):
+        """Bỏ mọi giá trị đã đọc (khi mất kết nối), các ô giá trị hiển thị trống"""
+        self.valid[:] = False
+        self.dataChanged.emit(self.index(0, 1), self.index(self.rows - 1, self.columnCount() - 1), [Qt.DisplayRole])
+
+
+class MemoryView(QWidget):
+    """Bảng bộ nhớ thiết bị cuộn được, chỉ đọc các hàng đang hiển thị cộng thêm prefetch hàng hai phía.
+
+    QTableView chỉ vẽ các hàng trong khung nhìn và chiều cao hàng cố định,
+    nên cuộn tới R32767 không phụ thuộc số hàng. window_changed báo cho nơi
+    điều khiển luồng I/O khi khung nhìn (hoặc thiết bị) đổi để đọc ngay.
+    """
+    window_changed = pyqtSignal()
+
+    def __init__(self, parent=None, prefetch=64):
+        super().__init__(parent)
+        self.prefetch = prefetch
+        self.model = DeviceMemoryModel(parent=self)
+
+        self.device_select = QComboBox()
+        for name in MEMORY_DEVICES:
+            device = DEVICES[name]
+            self.device_select.addItem(f"{name}0 - {name}{format_number(device, device.points - 1)}", name)
+        self.device_select.currentIndexChanged.connect(self.change_device)
+        self.goto_input = QLineEdit()
+        self.goto_input.setPlaceholderText("Tới địa chỉ, ví dụ R32000")
+        self.goto_input.returnPressed.connect(self.goto_address)
+        self.period_input = QSpinBox()
+        self.period_input.setRange(50, 60000)
+        self.period_input.setValue(500)
+        self.period_input.setSuffix(" ms")
+        self.status_label = QLabel("")
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setFont(QFont("Consolas", 9))
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setAlternatingRowColors(True)
+        self.table.verticalHeader().hide()
+        # Chiều cao hàng và độ rộng cột cố định: không bao giờ đo nội dung của mọi hàng
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(self.table.fontMetrics().height() + 6)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.horizontalHeader().setDefaultSectionSize(90)
+        self.table.verticalScrollBar().valueChanged.connect(self.window_changed)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Thiết bị:"))
+        controls.addWidget(self.device_select)
+        controls.addWidget(self.goto_input)
+        controls.addWidget(QLabel("Làm mới:"))
+        controls.addWidget(self.period_input)
+        controls.addWidget(self.status_label)
+        controls.addStretch()
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+    def change_device(self):
+        self.model.set_device(DEVICES[self.device_select.currentData()])
+        self.table.scrollToTop()
+        self.window_changed.emit()
+
+    def goto_address(self):
+        try:
+            device, address = parse_address(self.goto_input.text())
+        except ValueError as e:
+            self.status_label.setText(str(e))
+            return
+        if device.name not in MEMORY_DEVICES:
+            self.status_label.setText(f"Bảng bộ nhớ không hỗ trợ thiết bị {device.name}")
+            return
+        if device is not self.model.device:
+            self.device_select.setCurrentIndex(self.device_select.findData(device.name))
+        index = self.model.index(self.model.row_of(address), 0)
+        self.table.scrollTo(index, QAbstractItemView.PositionAtTop)
+        self.table.selectRow(index.row())
+
+    def visible_rows(self):
+        """(hàng đầu, hàng cuối) đang hiển thị"""
+        first = max(0, self.table.rowAt(0))
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        if last < 0:
+            last = self.model.rows - 1
+        return first, last
+
+    def fetch_range(self):
+        """Các hàng cần đọc: khung nhìn cộng prefetch hàng mỗi phía"""
+        first, last = self.visible_rows()
+        return max(0, first - self.prefetch), min(self.model.rows - 1, last + self.prefetch)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.window_changed.emit()
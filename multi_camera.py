@@ -0,0 +1,205 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import cv2
+import numpy as np
+from hsv_mask import ColorClassifier, load_colors
+from frame_pipeline import FrameQueue, CaptureWorker, RateMeter, LatencyStats
+
+
+class CameraChannel:
+    """One camera: its capture thread, its drop-oldest queue and its recent results"""
+    def __init__(self, name, source, history=8):
+        self.name = name
+        self.source = source
+        self.queue = FrameQueue(maxsize=2)
+        self.capture = CaptureWorker(source, self.queue, name=f"capture-{name}")
+        self.meter = RateMeter()
+        self.latency = LatencyStats()
+        self.results = deque(maxlen=history)  # (Frame, result), oldest first
+        self.errors = 0
+        self.dispatcher = None
+
+    def stats(self):
+        return {
+            'capture_fps': self.capture.meter.rate,
+            'processing_fps': self.meter.rate,
+            'latency_p50_ms': self.latency.percentile(50),
+            'latency_p99_ms': self.latency.percentile(99),
+            'dropped': self.queue.dropped,
+            'errors': self.errors,
+        }
+
+
+class MultiCameraManager:
+    """Captures N cameras at once and processes their frames on a shared pool.
+
+    Every camera is read by its own CaptureWorker. A light dispatcher thread
+    per camera hands the freshest frame to the pool and waits for it, so each
+    camera has at most one frame in flight and latency stays bounded; the
+    pool (threads by default, processes with use_processes=True) spreads the
+    cameras over the cores. OpenCV releases the GIL, so threads already scale;
+    processes need a picklable process function and copy every frame.
+    """
+    def __init__(self, sources, process, workers=None, use_processes=False,
+                 initializer=None, initargs=(), history=8):
+        if not isinstance(sources, dict):
+            sources = {f"cam{index}": source for index, source in enumerate(sources)}
+        self.channels = [CameraChannel(name, source, history) for name, source in sources.items()]
+        self.process = process
+        self.workers = workers or min(len(self.channels), os.cpu_count() or 1)
+        self.use_processes = use_processes
+        self.initializer = initializer
+        self.initargs = initargs
+        self.pool = None
+        self.lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def start(self):
+        executor = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        self.pool = executor(max_workers=self.workers, initializer=self.initializer, initargs=self.initargs)
+        self._stop_event.clear()
+        for channel in self.channels:
+            channel.capture.start()
+            channel.dispatcher = threading.Thread(target=self._dispatch, args=(channel,),
+                                                  name=f"dispatch-{channel.name}", daemon=True)
+            channel.dispatcher.start()
+
+    def stop(self):
+        self._stop_event.set()
+        for channel in self.channels:
+            channel.capture.stop()
+            channel.queue.close()
+        for channel in self.channels:
+            if channel.dispatcher is not None:
+                channel.dispatcher.join()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def running(self):
+        return any(channel.dispatcher is not None and channel.dispatcher.is_alive()
+                   for channel in self.channels)
+
+    def _dispatch(self, channel):
+        while not self._stop_event.is_set():
+            frame = channel.queue.get(timeout=0.1)
+            if frame is None:
+                if channel.queue.closed:
+                    break
+                continue
+            try:
+                result = self.pool.submit(self.process, frame.image).result()
+            except Exception:
+                channel.errors += 1
+                continue
+            channel.latency.add((time.monotonic() - frame.timestamp) * 1000)
+            channel.meter.tick()
+            with self.lock:
+                channel.results.append((frame, result))
+
+    def latest(self):
+        """{camera name: (Frame, result)} of the newest result of every camera that has one"""
+        with self.lock:
+            return {channel.name: channel.results[-1] for channel in self.channels if channel.results}
+
+    def synchronized(self, tolerance=0.05):
+        """One result per camera, all captured within tolerance seconds of each other, or None.
+
+        The reference is the oldest of the cameras' newest captures; every
+        camera contributes the result captured closest to it, so the set is
+        as recent as the slowest camera allows.
+        """
+        with self.lock:
+            if not all(channel.results for channel in self.channels):
+                return None
+            reference = min(channel.results[-1][0].timestamp for channel in self.channels)
+            chosen = {}
+            for channel in self.channels:
+                frame, result = min(channel.results, key=lambda item: abs(item[0].timestamp - reference))
+                if abs(frame.timestamp - reference) > tolerance:
+                    return None
+                chosen[channel.name] = (frame, result)
+            return chosen
+
+    def stats(self):
+        return {channel.name: channel.stats() for channel in self.channels}
+
+
+def tile_images(images, size, columns=None):
+    """Mosaic of BGR images, each resized to size (w, h), laid out row by row"""
+    columns = columns or int(np.ceil(np.sqrt(len(images))))
+    rows = int(np.ceil(len(images) / columns))
+    w, h = size
+    mosaic = np.zeros((rows * h, columns * w, 3), dtype=np.uint8)
+    for index, image in enumerate(images):
+        row, column = divmod(index, columns)
+        mosaic[row * h:(row + 1) * h, column * w:(column + 1) * w] = cv2.resize(
+            image, (w, h), interpolation=cv2.INTER_AREA)
+    return mosaic
+
+
+# Per-process classifier for the command line runner (built once by the pool initializer)
+_classifier = None
+
+
+def init_classifier(colors):
+    global _classifier
+    _classifier = ColorClassifier(colors)
+
+
+def count_colors(image):
+    """Pixel count of every classified color; small result, cheap to send back from a process"""
+    labels = _classifier.classify(cv2.cvtColor(image, cv2.COLOR_BGR2HSV))
+    counts = np.bincount(labels.ravel(), minlength=len(_classifier.colors) + 1)
+    return counts[1:len(_classifier.colors) + 1].tolist()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capture and classify several cameras in parallel")
+    parser.add_argument('--colors', required=True, help="color or project file saved by hsv_color_checker.py")
+    parser.add_argument('--cameras', type=int, nargs='*', default=[], help="camera indexes")
+    parser.add_argument('--video', nargs='*', default=[], help="video files used as extra cameras")
+    parser.add_argument('--workers', type=int, default=None, help="pool size (default: one per camera, up to the core count)")
+    parser.add_argument('--processes', action='store_true', help="use a process pool instead of threads")
+    parser.add_argument('--stats-interval', type=float, default=1.0)
+    parser.add_argument('--duration', type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args(argv)
+
+    colors = load_colors(args.colors)
+    sources = {f"cam{index}": cv2.VideoCapture(index) for index in args.cameras}
+    sources.update({os.path.basename(path): cv2.VideoCapture(path) for path in args.video})
+    if not sources or not all(source.isOpened() for source in sources.values()):
+        print("Cannot open all video sources")
+        return 1
+    if not args.processes:
+        init_classifier(colors)
+    manager = MultiCameraManager(sources, count_colors, args.workers, args.processes,
+                                 initializer=init_classifier if args.processes else None,
+                                 initargs=(colors,) if args.processes else ())
+    manager.start()
+    started = time.monotonic()
+    try:
+        while manager.running():
+            time.sleep(args.stats_interval)
+            for name, stats in manager.stats().items():
+                print(f"{name}: capture {stats['capture_fps']:5.1f} fps | processing {stats['processing_fps']:5.1f} fps | "
+                      f"latency p50 {stats['latency_p50_ms']:.1f} ms p99 {stats['latency_p99_ms']:.1f} ms | "
+                      f"dropped {stats['dropped']}")
+            if args.duration is not None and time.monotonic() - started >= args.duration:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stop()
+        for source in sources.values():
+            source.release()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import sys
+import json
+import time
+import argparse
+import platform
+import rk_mcprotocol as mc
+from plc_devices import BIT_LIMIT, WORD_LIMIT, DWORD_LIMIT, check_result
+
+# (tên lệnh, headdevice bắt đầu, giới hạn số điểm, hàm tạo tham số)
+OPERATIONS = {
+    'read_bit': ('m0', BIT_LIMIT, lambda n: {'length': n}),
+    'read_sign_word': ('d0', WORD_LIMIT, lambda n: {'length': n, 'signed_type': True}),
+    'read_sign_Dword': ('r0', DWORD_LIMIT, lambda n: {'length': n, 'signed_type': True}),
+    'write_bit': ('m0', BIT_LIMIT, lambda n: {'data_list': [i & 1 for i in range(n)]}),
+    'write_sign_word': ('d0', WORD_LIMIT, lambda n: {'data_list': list(range(n)), 'signed_type': True}),
+    'write_sign_Dword': ('r0', DWORD_LIMIT, lambda n: {'data_list': list(range(n)), 'signed_type': True}),
+}
+# Lệnh ghi đè M0-M3583, D0-D959, R0-R959 bằng dữ liệu thử: với PLC thật chỉ chạy khi có --allow-writes
+READ_OPERATIONS = ['read_bit', 'read_sign_word', 'read_sign_Dword']
+
+
+def sweep_lengths(limit):
+    """1, 2, 4, ... tới giới hạn frame (luôn gồm cả giới hạn)"""
+    lengths = []
+    n = 1
+    while n < limit:
+        lengths.append(n)
+        n *= 2
+    lengths.append(limit)
+    return lengths
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def summarize(latencies, points):
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        'samples': len(ordered),
+        'min_ms': ordered[0],
+        'mean_ms': total / len(ordered),
+        'p50_ms': percentile(ordered, 50),
+        'p90_ms': percentile(ordered, 90),
+        'p99_ms': percentile(ordered, 99),
+        'max_ms': ordered[-1],
+        'points_per_s': points * len(ordered) / (total / 1000) if total > 0 else 0.0,
+    }
+
+
+def measure(call, repeat, warmup=3):
+    for _ in range(warmup):
+        check_result(call())
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        check_result(call())
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def bench_operations(s, protocol, operations, repeat, max_length=None):
+    results = []
+    for name in operations:
+        head, limit, make_kwargs = OPERATIONS[name]
+        func = getattr(protocol, name)
+        for length in sweep_lengths(min(limit, max_length or limit)):
+            kwargs = make_kwargs(length)
+            latencies = measure(lambda: func(s, headdevice=head, **kwargs), repeat)
+            entry = {'operation': name, 'length': length}
+            entry.update(summarize(latencies, length))
+            results.append(entry)
+            print(f"{name:18s} n={length:5d}  p50={entry['p50_ms']:8.3f} ms  "
+                  f"p99={entry['p99_ms']:8.3f} ms  {entry['points_per_s']:12.0f} điểm/s")
+    return results
+
+
+def bench_single_vs_block(s, protocol, counts, repeat):
+    """So sánh đọc N thanh ghi D bằng N lệnh đơn lẻ với một lệnh đọc block"""
+    results = []
+    for count in counts:
+        def singles():
+            for i in range(count):
+                check_result(protocol.read_sign_word(s, headdevice=f'd{i}', length=1, signed_type=True))
+            return None
+
+        single = summarize(measure(singles, repeat), count)
+        block = summarize(measure(lambda: protocol.read_sign_word(
+            s, headdevice='d0', length=count, signed_type=True), repeat), count)
+        results.append({'count': count, 'single': single, 'block': block,
+                        'speedup': single['mean_ms'] / block['mean_ms'] if block['mean_ms'] else 0.0})
+        print(f"D0-D{count - 1}: {count} lệnh đơn {single['mean_ms']:8.3f} ms, "
+              f"1 block {block['mean_ms']:8.3f} ms (x{results[-1]['speedup']:.1f})")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Trả về danh sách các phép đo có p50 chậm hơn baseline quá tolerance"""
+    previous = {(r['operation'], r['length']): r for r in baseline.get('operations', [])}
+    regressions = []
+    for entry in results['operations']:
+        old = previous.get((entry['operation'], entry['length']))
+        if old and old['p50_ms'] > 0 and entry['p50_ms'] > old['p50_ms'] * (1 + tolerance):
+            regressions.append({'operation': entry['operation'], 'length': entry['length'],
+                                'baseline_p50_ms': old['p50_ms'], 'p50_ms': entry['p50_ms']})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo độ trễ và thông lượng giao tiếp PLC")
+    parser.add_argument('--host', default='192.168.0.23')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--backend', choices=('rk', 'async'), default='rk',
+                        help="rk_mcprotocol hoặc slmp_async")
+    parser.add_argument('--simulator', action='store_true',
+                        help="chạy PLC simulator cục bộ thay vì kết nối --host/--port")
+    parser.add_argument('--sim-latency-ms', type=float, default=0.0)
+    parser.add_argument('--operations', nargs='+', choices=sorted(OPERATIONS), default=None,
+                        help="mặc định: mọi lệnh với --simulator, chỉ các lệnh đọc với PLC thật")
+    parser.add_argument('--allow-writes', action='store_true',
+                        help="cho phép lệnh ghi (ghi đè M0-M3583, D0-D959, R0-R959) trên PLC thật")
+    parser.add_argument('--repeat', type=int, default=50, help="số lần đo mỗi cấu hình")
+    parser.add_argument('--max-length', type=int, default=None, help="giới hạn số điểm tối đa khi quét")
+    parser.add_argument('--compare-counts', type=int, nargs='*', default=[1, 10, 100])
+    parser.add_argument('--output', default='bench_output.json', help="file kết quả JSON")
+    parser.add_argument('--baseline', default=None, help="file JSON kết quả cũ để so sánh")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="mức chậm hơn cho phép so với baseline")
+    args = parser.parse_args(argv)
+
+    if args.operations is None:
+        args.operations = list(OPERATIONS) if args.simulator else READ_OPERATIONS
+    writes = [name for name in args.operations if name not in READ_OPERATIONS]
+    if writes and not args.simulator and not args.allow_writes:
+        parser.error(f"{', '.join(writes)} ghi đè bộ nhớ PLC {args.host}: thêm --allow-writes "
+                     f"hoặc dùng --simulator")
+
+    if args.backend == 'async':
+        import slmp_async as protocol
+    else:
+        protocol = mc
+
+    host, port = args.host, args.port
+    simulator = None
+    if args.simulator:
+        from plc_simulator import PLCSimulator
+        simulator = PLCSimulator(port=0, latency=args.sim_latency_ms / 1000)
+        host, port = simulator.start_background()
+
+    s = protocol.open_socket(host, port)
+    try:
+        results = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'endpoint': f"{host}:{port}",
+            'simulator': args.simulator,
+            'backend': args.backend,
+            'python': platform.python_version(),
+            'repeat': args.repeat,
+            'operations': bench_operations(s, protocol, args.operations, args.repeat, args.max_length),
+            'single_vs_block': bench_single_vs_block(s, protocol, args.compare_counts, args.repeat),
+        }
+    finally:
+        s.close()
+        if simulator is not None:
+            simulator.stop_background()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Đã ghi kết quả vào {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"CHẬM HƠN: {r['operation']} n={r['length']}: "
+                  f"{r['baseline_p50_ms']:.3f} -> {r['p50_ms']:.3f} ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
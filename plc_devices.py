@@ -0,0 +1,103 @@
+import re
+
+
+class Device:
+    """Thông tin một loại thiết bị FX5U: hệ cơ số địa chỉ, số điểm, mã thiết bị SLMP"""
+    def __init__(self, name, radix, points, is_bit, code):
+        self.name = name
+        self.radix = radix
+        self.points = points
+        self.is_bit = is_bit
+        self.code = code
+
+    def __repr__(self):
+        return f"Device({self.name})"
+
+
+# Giới hạn bộ nhớ mặc định của FX5U (README mục 5)
+DEVICES = {
+    'X': Device('X', 8, 1024, True, 0x9C),
+    'Y': Device('Y', 8, 1024, True, 0x9D),
+    'M': Device('M', 10, 7680, True, 0x90),
+    'B': Device('B', 16, 256, True, 0xA0),
+    'L': Device('L', 10, 7680, True, 0x92),
+    'F': Device('F', 10, 128, True, 0x93),
+    'D': Device('D', 10, 8000, False, 0xA8),
+    'W': Device('W', 16, 512, False, 0xB4),
+    'R': Device('R', 10, 32768, False, 0xAF),
+}
+
+# Số điểm tối đa trong một frame đọc/ghi liên tục (README mục 3)
+BIT_LIMIT = 3584
+WORD_LIMIT = 960
+DWORD_LIMIT = 480
+
+_ADDRESS_RE = re.compile(r'^\s*([A-Za-z])\s*([0-9A-Fa-f]+)\s*$')
+
+
+def parse_address(text):
+    """Tách chuỗi địa chỉ như 'M12', 'X17', 'W1F' thành (Device, số địa chỉ)"""
+    match = _ADDRESS_RE.match(text)
+    if match is None:
+        raise ValueError(f"Địa chỉ không hợp lệ: '{text}'")
+    name, number = match.group(1).upper(), match.group(2)
+    device = DEVICES.get(name)
+    if device is None:
+        raise ValueError(f"Không hỗ trợ thiết bị '{name}' trong địa chỉ '{text}'")
+    try:
+        address = int(number, device.radix)
+    except ValueError:
+        raise ValueError(f"Địa chỉ '{text}' sai hệ cơ số ({device.radix}) của thiết bị {name}")
+    check_range(device, address)
+    return device, address
+
+
+def check_range(device, address, length=1):
+    """Kiểm tra vùng địa chỉ nằm trong giới hạn của thiết bị"""
+    if address < 0 or length < 1 or address + length > device.points:
+        raise ValueError(f"Vùng {device.name}{format_number(device, address)} "
+                         f"dài {length} điểm vượt giới hạn {device.points} điểm của {device.name}")
+
+
+def format_number(device, address):
+    """Số địa chỉ theo hệ cơ số của thiết bị (X/Y bát phân, B/W thập lục phân)"""
+    if device.radix == 8:
+        return format(address, 'o')
+    if device.radix == 16:
+        return format(address, 'X')
+    return str(address)
+
+
+def headdevice(device, address):
+    """Chuỗi headdevice dùng cho rk_mcprotocol, ví dụ 'm12', 'x17', 'w1f'"""
+    return f"{device.name}{format_number(device, address)}".lower()
+
+
+# rk_mcprotocol bắt cả lỗi socket và trả về chuỗi "TênLỗi - nội dung". Các tên này là lỗi
+# đường truyền; UnboundLocalError xuất hiện khi phản hồi bị cụt hoặc lẫn phản hồi trễ của lệnh trước
+LINK_ERROR_NAMES = frozenset(('TimeoutError', 'timeout', 'ConnectionError', 'ConnectionResetError',
+                              'ConnectionAbortedError', 'ConnectionRefusedError', 'BrokenPipeError',
+                              'OSError', 'UnboundLocalError'))
+
+
+class PLCError(IOError):
+    """Lỗi PLC hoặc lỗi tham số mà rk_mcprotocol trả về dạng chuỗi - kết nối vẫn dùng được"""
+
+
+class PLCLinkError(ConnectionError):
+    """Lỗi socket/timeout mà rk_mcprotocol trả về dạng chuỗi - phải mở lại kết nối"""
+
+
+def check_result(result):
+    """rk_mcprotocol trả về chuỗi lỗi thay vì raise exception - chuyển thành exception"""
+    if isinstance(result, str) and result.strip() != "OK":
+        message = result.strip()
+        if message.split(' - ', 1)[0] in LINK_ERROR_NAMES:
+            raise PLCLinkError(message)
+        raise PLCError(message)
+    return result
+
+
+def frame_limit(device):
+    """Số điểm tối đa trong một lần đọc/ghi liên tục của thiết bị"""
+    return BIT_LIMIT if device.is_bit else WORD_LIMIT
@@ -1,20 +1,62 @@
 import sys
+import time
 import rk_mcprotocol as mc
+from plc_worker import PLCWorker
+from write_queue import WriteQueue
+from plc_devices import DEVICES, headdevice
+from tag_db import TagDatabase, TagDef
+from read_planner import read_blocks
+from project import load_project, project_path
+from trend_panel import TrendWidget
+from activity_log import ActivityLog, INFO, WARNING, ERROR
+from log_view import LogView
+from memory_view import MemoryView
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QLabel, QLineEdit, QPushButton, 
-                            QTextEdit, QGroupBox, QSpinBox, QCheckBox,
-                            QGridLayout, QFrame, QRadioButton)
+                            QGroupBox, QSpinBox, QCheckBox,
+                            QGridLayout, QFrame, QRadioButton, QComboBox, QTabWidget)
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QPalette, QColor, QFont
 
 class PLCInterface(QMainWindow):
-    def __init__(self):
+    # Khoảng thời gian hiển thị của biểu đồ xu hướng (giây, None = toàn bộ)
+    TREND_WINDOWS = [("10 giây", 10), ("1 phút", 60), ("10 phút", 600), ("1 giờ", 3600),
+                     ("8 giờ", 8 * 3600), ("Toàn bộ", None)]
+
+    def __init__(self, protocol=mc, project=None, historian=None, activity_log=None):
         super().__init__()
         self.setWindowTitle("PLC Communication Interface by Factory Automation")
         self.setGeometry(100, 100, 1000, 800)
         
-        # Biến lưu socket kết nối
-        self.socket = None
+        # Luồng I/O sở hữu socket kết nối, mọi lệnh PLC đi qua hàng đợi của nó
+        # protocol: rk_mcprotocol (mặc định) hoặc slmp_async với cùng giao diện hàm
+        self.protocol = protocol
+        self.is_connected = False
+        # Dự án (project.py): địa chỉ PLC và kế hoạch đọc tag đã dựng sẵn
+        self.project = project
+        # Historian (historian.py) lưu giá trị đọc được, None = không lưu
+        self.historian = historian
+        # Nhật ký hoạt động có giới hạn, giao diện chỉ cập nhật theo lô vài lần mỗi giây
+        self.activity_log = activity_log if activity_log is not None else ActivityLog()
+        # Tag đang vẽ trên biểu đồ xu hướng, đọc gộp bằng một kế hoạch dựng sẵn
+        self.trend_tags = TagDatabase()
+        self.trend_busy = False
+        self.trend_error = None
+        # Bảng bộ nhớ: chỉ một lệnh đọc khung nhìn chờ tại một thời điểm,
+        # khung nhìn đổi trong lúc chờ thì đọc lại ngay khi lệnh trước xong
+        self.memory_busy = False
+        self.memory_pending = False
+        self.memory_error = None
+        self.worker = PLCWorker(protocol)
+        self.worker.connected.connect(self.on_connected)
+        self.worker.disconnected.connect(self.on_disconnected)
+        self.worker.request_done.connect(self.on_request_done)
+        self.worker.request_failed.connect(self.on_request_failed)
+        self.worker.start()
+        
+        # Hàng đợi ghi: gộp các lệnh ghi liên tiếp thành ít lần ghi block
+        self.write_queue = WriteQueue(self.send_write_block, flush_interval=0.02,
+                                      on_flush=self.on_write_flush)
         
         # Thiết lập style
         self.setup_style()
@@ -57,7 +99,7 @@ class PLCInterface(QMainWindow):
                 border: 1px solid #bdc3c7;
                 border-radius: 3px;
             }
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 border: 1px solid #bdc3c7;
                 border-radius: 3px;
             }
@@ -113,14 +155,22 @@ class PLCInterface(QMainWindow):
         
         self.ip_input = QLineEdit("192.168.0.23")
         self.port_input = QLineEdit("1025")
+        endpoint = self.project.plc() if self.project is not None else None
+        if endpoint is not None:
+            self.ip_input.setText(endpoint.host)
+            self.port_input.setText(str(endpoint.port))
         self.connect_btn = QPushButton("Kết nối")
         self.connect_btn.clicked.connect(self.toggle_connection)
+        self.read_tags_btn = QPushButton("Đọc tag dự án")
+        self.read_tags_btn.clicked.connect(self.read_project_tags)
+        self.read_tags_btn.setVisible(endpoint is not None and bool(self.project.read_plan()))
         
         connection_layout.addWidget(QLabel("IP:"))
         connection_layout.addWidget(self.ip_input)
         connection_layout.addWidget(QLabel("Port:"))
         connection_layout.addWidget(self.port_input)
         connection_layout.addWidget(self.connect_btn)
+        connection_layout.addWidget(self.read_tags_btn)
         connection_layout.addStretch()
         connection_group.setLayout(connection_layout)
         
@@ -134,7 +184,7 @@ class PLCInterface(QMainWindow):
         # Điều khiển đơn bit M
         m_single_layout = QGridLayout()
         self.m_address_input = QSpinBox()
-        self.m_address_input.setRange(0, 1000)
+        self.m_address_input.setRange(0, DEVICES['M'].points - 1)
         self.m_read_btn = QPushButton("Đọc")
         self.m_read_btn.clicked.connect(self.read_m_bit)
         self.m_write_btn = QPushButton("Ghi")
@@ -177,7 +227,7 @@ class PLCInterface(QMainWindow):
         
         d_control_layout = QGridLayout()
         self.d_address_input = QSpinBox()
-        self.d_address_input.setRange(0, 1000)
+        self.d_address_input.setRange(0, DEVICES['D'].points - 1)
         self.d_value_input = QSpinBox()
         self.d_value_input.setRange(-32768, 32767)
         self.d_read_btn = QPushButton("Đọc")
@@ -208,20 +258,75 @@ class PLCInterface(QMainWindow):
         control_layout.addWidget(m_bit_group)
         control_layout.addWidget(d_register_group)
         
+        # Biểu đồ xu hướng
+        trend_group = QGroupBox("Biểu đồ xu hướng")
+        trend_layout = QVBoxLayout()
+        trend_controls = QHBoxLayout()
+        self.trend_tag_input = QLineEdit()
+        self.trend_tag_input.setPlaceholderText("D100 hoặc tên tag dự án")
+        self.trend_tag_input.setMinimumWidth(150)
+        self.trend_tag_input.returnPressed.connect(self.add_trend_tag)
+        self.trend_add_btn = QPushButton("Thêm")
+        self.trend_add_btn.clicked.connect(self.add_trend_tag)
+        self.trend_trace_select = QComboBox()
+        self.trend_remove_btn = QPushButton("Bỏ")
+        self.trend_remove_btn.clicked.connect(self.remove_trend_tag)
+        self.trend_period_input = QSpinBox()
+        self.trend_period_input.setRange(10, 60000)
+        self.trend_period_input.setValue(100)
+        self.trend_period_input.setSuffix(" ms")
+        self.trend_period_input.valueChanged.connect(self.update_trend_period)
+        self.trend_window_select = QComboBox()
+        for label, _ in self.TREND_WINDOWS:
+            self.trend_window_select.addItem(label)
+        self.trend_window_select.setCurrentIndex(1)
+        self.trend_window_select.currentIndexChanged.connect(self.update_trend_window)
+        self.trend_btn = QPushButton("Bắt đầu")
+        self.trend_btn.clicked.connect(self.toggle_trend)
+        self.trend_status_label = QLabel("")
+        
+        trend_controls.addWidget(QLabel("Tag:"))
+        trend_controls.addWidget(self.trend_tag_input)
+        trend_controls.addWidget(self.trend_add_btn)
+        trend_controls.addWidget(self.trend_trace_select)
+        trend_controls.addWidget(self.trend_remove_btn)
+        trend_controls.addWidget(QLabel("Chu kỳ:"))
+        trend_controls.addWidget(self.trend_period_input)
+        trend_controls.addWidget(QLabel("Hiển thị:"))
+        trend_controls.addWidget(self.trend_window_select)
+        trend_controls.addWidget(self.trend_btn)
+        trend_controls.addWidget(self.trend_status_label)
+        trend_controls.addStretch()
+        self.trend_widget = TrendWidget(window=self.TREND_WINDOWS[1][1])
+        trend_layout.addLayout(trend_controls)
+        trend_layout.addWidget(self.trend_widget)
+        trend_group.setLayout(trend_layout)
+        
+        # Bảng bộ nhớ thiết bị
+        memory_group = QGroupBox("Bộ nhớ thiết bị")
+        memory_layout = QVBoxLayout()
+        self.memory_view = MemoryView()
+        self.memory_view.window_changed.connect(self.on_memory_window)
+        self.memory_view.period_input.valueChanged.connect(self.update_memory_period)
+        memory_layout.addWidget(self.memory_view)
+        memory_group.setLayout(memory_layout)
+        
+        self.panel_tabs = QTabWidget()
+        self.panel_tabs.addTab(trend_group, "Biểu đồ")
+        self.panel_tabs.addTab(memory_group, "Bộ nhớ")
+        self.panel_tabs.currentChanged.connect(self.on_memory_window)
+        
         # Vùng hiển thị log
         log_group = QGroupBox("Nhật ký hoạt động")
         log_layout = QVBoxLayout()
-        self.log_display = QTextEdit()
-        self.log_display.setReadOnly(True)
-        clear_log_btn = QPushButton("Xóa nhật ký")
-        clear_log_btn.clicked.connect(self.log_display.clear)
-        log_layout.addWidget(self.log_display)
-        log_layout.addWidget(clear_log_btn)
+        self.log_view = LogView(self.activity_log)
+        log_layout.addWidget(self.log_view)
         log_group.setLayout(log_layout)
         
         # Thêm các nhóm vào layout chính
         main_layout.addWidget(connection_group)
         main_layout.addLayout(control_layout)
+        main_layout.addWidget(self.panel_tabs, 1)
         main_layout.addWidget(log_group)
         
        
@@ -229,6 +334,23 @@ class PLCInterface(QMainWindow):
         self.connection_timer = QTimer()
         self.connection_timer.timeout.connect(self.check_connection)
         
+        # Timer flush hàng đợi ghi
+        self.write_timer = QTimer()
+        self.write_timer.timeout.connect(self.write_queue.poll)
+        self.write_timer.start(20)
+        
+        # Timer đọc tag của biểu đồ theo chu kỳ và timer vẽ theo lô (~30 khung hình/giây)
+        self.trend_timer = QTimer()
+        self.trend_timer.timeout.connect(self.poll_trend)
+        self.trend_frame_timer = QTimer()
+        self.trend_frame_timer.timeout.connect(self.refresh_trend)
+        self.trend_frame_timer.start(33)
+        
+        # Timer làm mới bảng bộ nhớ
+        self.memory_timer = QTimer()
+        self.memory_timer.timeout.connect(self.poll_memory)
+        self.trend_frames = 0
+        
         # Cập nhật trạng thái ban đầu
         self.update_ui_state(False)
         
@@ -238,120 +360,301 @@ class PLCInterface(QMainWindow):
         self.m_write_btn.setEnabled(connected)
         self.d_read_btn.setEnabled(connected)
         self.d_write_btn.setEnabled(connected)
+        self.read_tags_btn.setEnabled(connected)
+        self.trend_btn.setEnabled(connected)
         for btn in self.quick_m_buttons:
             btn.setEnabled(connected)
             
     def quick_write_m(self, address, state):
         """Ghi nhanh giá trị bit M"""
-        if self.socket is None:
-            self.log_message("Chưa kết nối với PLC")
+        if not self.is_connected:
+            self.log_message("Chưa kết nối với PLC", WARNING)
             return
             
-        try:
-            value = 1 if state else 0
-            mc.write_bit(self.socket, headdevice=f'm{address}', data_list=[value])
-            self.log_message(f"Đã ghi bit M{address} = {value}")
-        except Exception as e:
-            self.log_message(f"Lỗi ghi bit M: {str(e)}")
-            self.quick_m_buttons[address].setChecked(not state)
+        self.write_queue.write_point(DEVICES['M'], address, 1 if state else 0, source='quick')
             
     def read_m_bit(self):
         """Đọc giá trị bit M"""
-        if self.socket is None:
-            self.log_message("Chưa kết nối với PLC")
+        if not self.is_connected:
+            self.log_message("Chưa kết nối với PLC", WARNING)
             return
             
-        try:
-            address = self.m_address_input.value()
-            value = mc.read_bit(self.socket, headdevice=f'm{address}', length=1)[0]
-            if value == 1:
-                self.m_value_on.setChecked(True)
-            else:
-                self.m_value_off.setChecked(True)
-            self.log_message(f"Đã đọc bit M{address} = {value}")
-        except Exception as e:
-            self.log_message(f"Lỗi đọc bit M: {str(e)}")
+        address = self.m_address_input.value()
+        self.worker.submit('read_m', self.protocol.read_bit, context=address,
+                           headdevice=headdevice(DEVICES['M'], address), length=1)
             
     def read_d_register(self):
         """Đọc giá trị thanh ghi D"""
-        if self.socket is None:
-            self.log_message("Chưa kết nối với PLC")
+        if not self.is_connected:
+            self.log_message("Chưa kết nối với PLC", WARNING)
+            return
+            
+        address = self.d_address_input.value()
+        self.worker.submit('read_d', self.protocol.read_sign_word, context=address,
+                           headdevice=headdevice(DEVICES['D'], address), length=1, signed_type=True)
+            
+    def read_project_tags(self):
+        """Đọc toàn bộ tag của PLC trong dự án bằng kế hoạch đọc gộp đã biên dịch sẵn"""
+        if not self.is_connected:
+            self.log_message("Chưa kết nối với PLC", WARNING)
             return
             
+        plan = self.project.read_plan()
+        self.worker.submit('read_tags', plan.execute, context=plan, protocol=self.protocol)
+            
+    def add_trend_tag(self):
+        """Thêm một đường vào biểu đồ: tên tag dự án hoặc địa chỉ (D100, R200, M5, X17...)"""
+        text = self.trend_tag_input.text().strip()
+        if not text:
+            return
         try:
-            address = self.d_address_input.value()
-            value = mc.read_sign_word(self.socket, headdevice=f'd{address}', length=1, signed_type=True)[0]
-            self.d_value_input.setValue(value)
-            self.log_message(f"Đã đọc thanh ghi D{address} = {value}")
-        except Exception as e:
-            self.log_message(f"Lỗi đọc thanh ghi D: {str(e)}")
+            database = self.project.tag_database() if self.project is not None else None
+            if database is not None and text in database:
+                tag = database[text]
+            else:
+                tag = TagDef(text.upper(), text)
+            if tag.size != 1:
+                raise ValueError(f"Tag {tag.name} là mảng {tag.size} phần tử, biểu đồ chỉ vẽ tag đơn")
+            self.trend_tags.add(tag)
+        except ValueError as e:
+            self.log_message(f"Không thêm được đường xu hướng: {e}", WARNING)
+            return
+        self.trend_widget.add_trace(tag.name)
+        self.trend_trace_select.addItem(tag.name)
+        self.trend_tag_input.clear()
+        
+    def remove_trend_tag(self):
+        name = self.trend_trace_select.currentText()
+        if name and name in self.trend_tags:
+            self.trend_tags.remove(name)
+            self.trend_widget.remove_trace(name)
+            self.trend_trace_select.removeItem(self.trend_trace_select.currentIndex())
+            
+    def toggle_trend(self):
+        if self.trend_timer.isActive():
+            self.trend_timer.stop()
+            self.trend_btn.setText("Bắt đầu")
+        else:
+            self.trend_timer.start(self.trend_period_input.value())
+            self.trend_btn.setText("Dừng")
+            
+    def update_trend_period(self, period):
+        if self.trend_timer.isActive():
+            self.trend_timer.start(period)
+            
+    def update_trend_window(self, index):
+        self.trend_widget.window = self.TREND_WINDOWS[index][1]
+        self.trend_widget.update()
+        
+    def poll_trend(self):
+        """Đọc các tag của biểu đồ; chỉ một lệnh đọc biểu đồ được chờ tại một thời điểm"""
+        if not self.is_connected or self.trend_busy or not len(self.trend_tags):
+            return
+        plan = self.trend_tags.plan()
+        self.trend_busy = True
+        self.worker.submit('trend', plan.execute, context=plan, protocol=self.protocol)
+        
+    def refresh_trend(self):
+        self.trend_widget.flush()
+        self.trend_frames += 1
+        if self.trend_frames % 15 == 0 and self.trend_widget.traces:
+            samples = sum(trace.levels[0].count for trace in self.trend_widget.traces.values())
+            self.trend_status_label.setText(f"{samples} mẫu | vẽ {self.trend_widget.render_ms:.1f} ms")
+            
+    def poll_memory(self):
+        """Đọc các hàng đang hiển thị của bảng bộ nhớ cộng phần prefetch bằng các lệnh đọc block"""
+        if not self.is_connected or not self.memory_view.isVisible():
+            return
+        if self.memory_busy:
+            self.memory_pending = True
+            return
+        first, last = self.memory_view.fetch_range()
+        blocks = self.memory_view.model.blocks(first, last)
+        self.memory_busy = True
+        self.memory_pending = False
+        self.worker.submit('memory', read_blocks, context=blocks, blocks=blocks, protocol=self.protocol)
+        
+    def on_memory_window(self):
+        """Khung nhìn của bảng bộ nhớ đổi: đọc ngay nếu có hàng chưa có giá trị"""
+        if self.is_connected and self.memory_view.isVisible():
+            first, last = self.memory_view.fetch_range()
+            if self.memory_view.model.missing(first, last):
+                self.poll_memory()
+                
+    def update_memory_period(self, period):
+        if self.memory_timer.isActive():
+            self.memory_timer.start(period)
             
     def toggle_connection(self):
-        if self.socket is None:
-            try:
-                self.socket = mc.open_socket(self.ip_input.text(), int(self.port_input.text()))
-                self.log_message("Đã kết nối thành công với PLC")
-                self.connect_btn.setText("Ngắt kết nối")
-                self.connection_timer.start(1000)
-                self.update_ui_state(True)
-            except Exception as e:
-                self.log_message(f"Lỗi kết nối: {str(e)}")
+        if not self.is_connected:
+            self.connect_btn.setEnabled(False)
+            self.worker.connect_plc(self.ip_input.text(), int(self.port_input.text()))
         else:
-            self.socket.close()
-            self.socket = None
-            self.log_message("Đã ngắt kết nối với PLC")
-            self.connect_btn.setText("Kết nối")
-            self.connection_timer.stop()
-            self.update_ui_state(False)
+            self.worker.disconnect_plc()
+            
+    def on_connected(self, host, port):
+        self.is_connected = True
+        self.log_message("Đã kết nối thành công với PLC")
+        self.connect_btn.setText("Ngắt kết nối")
+        self.connect_btn.setEnabled(True)
+        self.connection_timer.start(1000)
+        self.memory_timer.start(self.memory_view.period_input.value())
+        self.update_ui_state(True)
+        self.on_memory_window()
+        
+    def on_disconnected(self, reason):
+        self.is_connected = False
+        self.log_message(reason, WARNING)
+        self.connect_btn.setText("Kết nối")
+        self.connect_btn.setEnabled(True)
+        self.connection_timer.stop()
+        self.memory_timer.stop()
+        self.memory_busy = False
+        self.memory_view.model.invalidate()
+        self.update_ui_state(False)
             
     def check_connection(self):
-        if self.socket is not None:
-            try:
-                mc.read_sign_word(self.socket, headdevice='d0', length=1, signed_type=False)
-            except Exception as e:
-                self.log_message(f"Mất kết nối: {str(e)}")
-                self.socket.close()
-                self.socket = None
-                self.connect_btn.setText("Kết nối")
-                self.connection_timer.stop()
-                self.update_ui_state(False)
+        # Chỉ gửi heartbeat khi hàng đợi rảnh để không dồn lệnh khi PLC phản hồi chậm
+        if self.is_connected and self.worker.pending() == 0:
+            self.worker.submit('heartbeat', self.protocol.read_sign_word,
+                               headdevice='d0', length=1, signed_type=False)
                 
     def write_m_bit(self):
-        if self.socket is None:
-            self.log_message("Chưa kết nối với PLC")
+        if not self.is_connected:
+            self.log_message("Chưa kết nối với PLC", WARNING)
             return
             
-        try:
-            address = self.m_address_input.value()
-            value = 1 if self.m_value_on.isChecked() else 0
-            mc.write_bit(self.socket, headdevice=f'm{address}', data_list=[value])
-            self.log_message(f"Đã ghi bit M{address} = {value}")
-        except Exception as e:
-            self.log_message(f"Lỗi ghi bit M: {str(e)}")
+        address = self.m_address_input.value()
+        value = 1 if self.m_value_on.isChecked() else 0
+        self.write_queue.write_point(DEVICES['M'], address, value)
             
     def write_d_register(self):
-        if self.socket is None:
-            self.log_message("Chưa kết nối với PLC")
+        if not self.is_connected:
+            self.log_message("Chưa kết nối với PLC", WARNING)
             return
             
-        try:
-            address = self.d_address_input.value()
-            value = self.d_value_input.value()
-            mc.write_sign_word(self.socket, headdevice=f'd{address}', data_list=[value], signed_type=True)
-            self.log_message(f"Đã ghi thanh ghi D{address} = {value}")
-        except Exception as e:
-            self.log_message(f"Lỗi ghi thanh ghi D: {str(e)}")
+        address = self.d_address_input.value()
+        value = self.d_value_input.value()
+        self.write_queue.write_point(DEVICES['D'], address, value)
+            
+    def send_write_block(self, block):
+        """Gửi một block ghi đã gộp sang luồng I/O"""
+        self.worker.submit('write_block', getattr(self.protocol, block.func_name),
+                           context=block, **block.kwargs(signed_type=True))
+            
+    def on_write_flush(self, report):
+        if report.coalesced:
+            self.log_message(f"Gộp {report.requested} lệnh ghi thành {len(report.blocks)} lần ghi "
+                             f"({len(report.coalesced)} lệnh bị thay bởi lệnh sau)", device='write')
+            
+    def on_request_done(self, name, result, latency_ms, context):
+        """Nhận kết quả từ luồng I/O"""
+        if name == 'read_m':
+            value = result[0]
+            if value == 1:
+                self.m_value_on.setChecked(True)
+            else:
+                self.m_value_off.setChecked(True)
+            self.log_message(f"Đã đọc bit M{context} = {value} ({latency_ms:.1f} ms)", device='M')
+        elif name == 'read_d':
+            value = result[0]
+            self.d_value_input.setValue(value)
+            self.log_message(f"Đã đọc thanh ghi D{context} = {value} ({latency_ms:.1f} ms)", device='D')
+        elif name == 'read_tags':
+            self.log_message(f"Đã đọc {len(result)} tag trong {len(context)} lệnh ({latency_ms:.1f} ms)", device='tags')
+            if self.historian is not None:
+                self.historian.record_values(result)
+            for name, value in result.items():
+                unit = context.tags[name].unit
+                self.log_message(f"  {name} = {value}{' ' + unit if unit else ''}", device='tags')
+        elif name == 'trend':
+            self.trend_busy = False
+            self.trend_error = None
+            timestamp = time.time()
+            self.trend_widget.add_values(result, timestamp)
+            if self.historian is not None:
+                self.historian.record_values(result, timestamp)
+        elif name == 'memory':
+            self.memory_busy = False
+            self.memory_error = None
+            changed = self.memory_view.model.apply(context, result)
+            first, last = context[0].start, context[-1].start + context[-1].length - 1
+            device = context[0].device
+            self.memory_view.status_label.setText(f"{headdevice(device, first).upper()} - {headdevice(device, last).upper()}: "
+                                                  f"{len(context)} lệnh, {latency_ms:.1f} ms, {changed} hàng thay đổi")
+            if self.memory_pending:
+                self.poll_memory()
+        elif name == 'write_block':
+            for tag, value in zip(context.tags, context.values):
+                kind = "bit" if context.device.is_bit else "thanh ghi"
+                self.log_message(f"Đã ghi {kind} {tag} = {value} ({latency_ms:.1f} ms)", device=context.device.name)
+            
+    def on_request_failed(self, name, error, latency_ms, context):
+        """Xử lý lỗi trả về từ luồng I/O"""
+        if name == 'heartbeat':
+            self.worker.disconnect_plc(f"Mất kết nối: {error}")
+        elif name == 'read_m':
+            self.log_message(f"Lỗi đọc bit M: {error}", ERROR, 'M')
+        elif name == 'read_d':
+            self.log_message(f"Lỗi đọc thanh ghi D: {error}", ERROR, 'D')
+        elif name == 'read_tags':
+            self.log_message(f"Lỗi đọc tag dự án: {error}", ERROR, 'tags')
+        elif name == 'trend':
+            self.trend_busy = False
+            # Chỉ ghi lỗi đầu tiên của một chuỗi lỗi giống nhau
+            if error != self.trend_error:
+                self.log_message(f"Lỗi đọc tag biểu đồ: {error}", ERROR, 'trend')
+            self.trend_error = error
+        elif name == 'memory':
+            self.memory_busy = False
+            if error != self.memory_error:
+                self.log_message(f"Lỗi đọc bảng bộ nhớ: {error}", ERROR, context[0].device.name)
+            self.memory_error = error
+        elif name == 'write_block':
+            kind = "bit" if context.device.is_bit else "thanh ghi"
+            self.log_message(f"Lỗi ghi {kind} {', '.join(context.tags)}: {error}", ERROR, context.device.name)
+            # Trả nút điều khiển nhanh về trạng thái cũ, chỉ với lệnh ghi phát từ chính nút đó
+            if context.device.name == 'M':
+                for offset, (value, source) in enumerate(zip(context.values, context.sources)):
+                    address = context.start + offset
+                    if source == 'quick' and address < len(self.quick_m_buttons):
+                        self.quick_m_buttons[address].setChecked(not value)
             
-    def log_message(self, message):
-        self.log_display.append(message)
+    def log_message(self, message, level=INFO, device=None):
+        # Chỉ thêm vào vòng đệm, LogView đưa lên màn hình theo lô
+        self.activity_log.log(message, level, device)
         
     def closeEvent(self, event):
-        if self.socket is not None:
-            self.socket.close()
+        self.connection_timer.stop()
+        self.write_timer.stop()
+        self.trend_timer.stop()
+        self.trend_frame_timer.stop()
+        self.memory_timer.stop()
+        self.write_queue.flush()
+        self.worker.stop()
+        if self.historian is not None:
+            self.historian.close()
+        self.log_view.timer.stop()
+        self.activity_log.close()
         event.accept()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = PLCInterface()
+    path = project_path(sys.argv)
+    project = load_project(path) if path else None
+    # --history <thư mục>: lưu giá trị biểu đồ và tag dự án đọc được vào Historian
+    historian = None
+    if '--history' in sys.argv and sys.argv.index('--history') + 1 < len(sys.argv):
+        from historian import Historian
+        historian = Historian(sys.argv[sys.argv.index('--history') + 1])
+    # --log <file>: ghi nhật ký hoạt động ra file (xoay vòng khi đủ 1 MB)
+    activity_log = None
+    if '--log' in sys.argv and sys.argv.index('--log') + 1 < len(sys.argv):
+        activity_log = ActivityLog(path=sys.argv[sys.argv.index('--log') + 1])
+    if '--async' in sys.argv:
+        import slmp_async
+        window = PLCInterface(slmp_async, project, historian, activity_log)
+    else:
+        window = PLCInterface(project=project, historian=historian, activity_log=activity_log)
     window.show()
     sys.exit(app.exec_()) 
\ No newline at end of file
@@ -0,0 +1,298 @@
+import sys
+import time
+import socket
+import argparse
+import struct
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import rk_mcprotocol as mc
+from plc_devices import PLCError, check_result
+from slmp_async import SLMPError
+
+DEFAULT_SOURCE = 'default'
+LATENCY_WINDOW = 1000
+
+
+# Lỗi socket/timeout hoặc frame trả về bị cụt (struct.error): kết nối không còn tin được, phải mở lại
+LINK_ERRORS = (OSError, EOFError, socket.timeout, asyncio.TimeoutError, struct.error)
+
+
+def is_link_error(error):
+    """Lỗi đường truyền (cần mở lại kết nối) hay lỗi do PLC/tham số trả về.
+
+    Phân loại theo kiểu exception: PLCError (chuỗi lỗi PLC/tham số của
+    rk_mcprotocol qua check_result) và SLMPError là PLC từ chối yêu cầu, kết
+    nối vẫn tốt; lỗi tham số (ValueError, TypeError...) cũng vậy. Chuỗi lỗi
+    socket/timeout của rk_mcprotocol được check_result đổi thành PLCLinkError
+    (một ConnectionError) nên được xem là lỗi đường truyền.
+    """
+    if isinstance(error, (PLCError, SLMPError)):
+        return False
+    return isinstance(error, LINK_ERRORS)
+
+
+class PLCRequest:
+    def __init__(self, func_name, kwargs, future):
+        self.func_name = func_name
+        self.kwargs = kwargs
+        self.future = future
+        self.queued_at = time.monotonic()
+
+
+class PLCState:
+    """Hàng đợi và thống kê của một PLC, dùng chung cho mọi kết nối tới PLC đó"""
+    def __init__(self, name, host, ports):
+        self.name = name
+        self.host = host
+        self.ports = list(ports)
+        self.condition = threading.Condition()
+        self.queues = OrderedDict()  # nguồn -> deque(PLCRequest), lấy xoay vòng
+        self.connections = []
+        self.closed = False
+
+        self.requests = 0
+        self.errors = 0
+        self.connects = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.waits = deque(maxlen=LATENCY_WINDOW)
+
+    def queue_depth(self):
+        return sum(len(q) for q in self.queues.values())
+
+    def put(self, source, request):
+        with self.condition:
+            self.queues.setdefault(source, deque()).append(request)
+            self.condition.notify()
+
+    def take(self):
+        """Lấy yêu cầu kế tiếp, xoay vòng giữa các nguồn để không nguồn nào chiếm hết PLC"""
+        with self.condition:
+            while not self.queues and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                return None
+            source, queue = next(iter(self.queues.items()))
+            request = queue.popleft()
+            del self.queues[source]
+            if queue:
+                self.queues[source] = queue
+            return request
+
+
+class PLCConnection(threading.Thread):
+    """Một kết nối tới một cổng SLMP của PLC; thực hiện tuần tự từng yêu cầu"""
+    def __init__(self, state, port, pool):
+        super().__init__(name=f"plc-{state.name}-{port}", daemon=True)
+        self.state = state
+        self.port = port
+        self.pool = pool
+        self.socket = None
+        self.backoff = 0.0
+        self.next_attempt = 0.0
+
+    def run(self):
+        while True:
+            request = self.state.take()
+            if request is None:
+                break
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            self._execute(request)
+        self._close()
+
+    def _ensure_socket(self):
+        """Mở kết nối khi cần (lazy), chờ theo backoff sau mỗi lần thất bại"""
+        if self.socket is not None:
+            return
+        now = time.monotonic()
+        if now < self.next_attempt:
+            raise ConnectionError(f"PLC {self.state.name}:{self.port} đang chờ kết nối lại "
+                                  f"({self.next_attempt - now:.1f} s)")
+        try:
+            self.socket = self.pool.protocol.open_socket(self.state.host, self.port)
+            if self.pool.socket_timeout is not None:
+                self.socket.settimeout(self.pool.socket_timeout)
+        except Exception:
+            self._fail_connect()
+            raise
+        self.backoff = 0.0
+        self.state.connects += 1
+
+    def _fail_connect(self):
+        self.backoff = min(self.pool.backoff_max,
+                           self.backoff * 2 if self.backoff else self.pool.backoff_initial)
+        self.next_attempt = time.monotonic() + self.backoff
+
+    def _close(self):
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+            self.socket = None
+
+    def _execute(self, request):
+        start = time.monotonic()
+        self.state.waits.append((start - request.queued_at) * 1000)
+        try:
+            self._ensure_socket()
+            func = getattr(self.pool.protocol, request.func_name)
+            result = check_result(func(self.socket, **request.kwargs))
+        except Exception as e:
+            self.state.errors += 1
+            if self.socket is not None and is_link_error(e):
+                self._close()
+                self._fail_connect()
+            request.future.set_exception(e)
+            return
+        self.state.requests += 1
+        self.state.latencies.append((time.monotonic() - start) * 1000)
+        request.future.set_result(result)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class PLCConnectionPool:
+    """Quản lý kết nối tới nhiều PLC.
+
+    Mỗi PLC có một kết nối cố định cho mỗi cổng SLMP được khai báo. Yêu cầu tới
+    cùng một kết nối được thực hiện tuần tự, các PLC khác nhau chạy song song.
+    Trong một PLC, các nguồn gửi yêu cầu (GUI, bộ quét, ...) được phục vụ xoay
+    vòng. Kết nối chỉ được mở khi có yêu cầu và mở lại với backoff tăng dần.
+
+    socket_timeout: timeout (giây) đặt lại cho socket sau khi mở, None giữ
+    mặc định của protocol (rk_mcprotocol: 6 s).
+    """
+    def __init__(self, protocol=mc, backoff_initial=0.5, backoff_max=30.0, socket_timeout=None):
+        self.protocol = protocol
+        self.socket_timeout = socket_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.plcs = {}
+
+    def add_plc(self, name, host, ports=(1025,)):
+        if name in self.plcs:
+            raise ValueError(f"PLC '{name}' đã tồn tại")
+        state = PLCState(name, host, ports)
+        for port in state.ports:
+            connection = PLCConnection(state, port, self)
+            state.connections.append(connection)
+            connection.start()
+        self.plcs[name] = state
+        return state
+
+    def submit(self, name, func_name, source=DEFAULT_SOURCE, **kwargs):
+        """Đưa yêu cầu (ví dụ 'read_bit', headdevice='m0', length=8) vào hàng đợi, trả về Future"""
+        state = self.plcs[name]
+        future = Future()
+        state.put(source, PLCRequest(func_name, kwargs, future))
+        return future
+
+    def call(self, name, func_name, source=DEFAULT_SOURCE, timeout=None, **kwargs):
+        """Gửi yêu cầu và chờ kết quả"""
+        return self.submit(name, func_name, source, **kwargs).result(timeout)
+
+    def stats(self):
+        result = {}
+        for name, state in self.plcs.items():
+            latencies = list(state.latencies)
+            with state.condition:
+                depth = state.queue_depth()
+            result[name] = {
+                'host': state.host,
+                'ports': state.ports,
+                'connected': sum(1 for c in state.connections if c.socket is not None),
+                'queue_depth': depth,
+                'requests': state.requests,
+                'errors': state.errors,
+                'connects': state.connects,
+                'latency_avg_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+                'latency_p50_ms': percentile(latencies, 50),
+                'latency_p99_ms': percentile(latencies, 99),
+                'wait_p99_ms': percentile(list(state.waits), 99),
+            }
+        return result
+
+    def close(self):
+        for state in self.plcs.values():
+            with state.condition:
+                state.closed = True
+                pending = [r for q in state.queues.values() for r in q]
+                state.queues.clear()
+                state.condition.notify_all()
+            for request in pending:
+                request.future.cancel()
+            for connection in state.connections:
+                connection.join()
+
+
+def check_reconnect(protocol=mc, latency=0.5, socket_timeout=0.3):
+    """Chạy thử với PLCSimulator: một lần timeout phải đóng socket, kết nối lại
+    ở yêu cầu sau và đọc đúng giá trị. Trả về danh sách lỗi (rỗng nếu đạt).
+    """
+    from plc_devices import DEVICES
+    from plc_simulator import PLCSimulator
+    simulator = PLCSimulator(port=0, latency=latency)
+    host, port = simulator.start_background()
+    simulator.memory.write_words(DEVICES['D'], 100, [1234])
+    pool = PLCConnectionPool(protocol, backoff_initial=0.05, socket_timeout=socket_timeout)
+    pool.add_plc('sim', host, ports=(port,))
+    failures = []
+    try:
+        try:
+            pool.call('sim', 'read_sign_word', headdevice='d100', length=1, signed_type=True)
+            failures.append("lệnh đọc chậm hơn timeout không báo lỗi")
+        except Exception as e:
+            if not is_link_error(e):
+                failures.append(f"timeout không được xem là lỗi đường truyền: {type(e).__name__}: {e}")
+        stats = pool.stats()['sim']
+        if stats['connected']:
+            failures.append("socket chưa được đóng sau timeout")
+
+        simulator.latency = 0.0
+        time.sleep(pool.backoff_initial * 2)
+        try:
+            value = pool.call('sim', 'read_sign_word', headdevice='d100', length=1, signed_type=True)
+            if value != [1234]:
+                failures.append(f"đọc lại D100 sau khi kết nối lại được {value}, cần [1234]")
+        except Exception as e:
+            failures.append(f"đọc lại sau khi kết nối lại lỗi: {type(e).__name__}: {e}")
+        stats = pool.stats()['sim']
+        if stats['connects'] != 2:
+            failures.append(f"số lần kết nối {stats['connects']}, cần 2")
+    finally:
+        pool.close()
+        simulator.stop_background()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kiểm tra kết nối lại của PLCConnectionPool với PLC simulator")
+    parser.add_argument('--backend', choices=('rk', 'async'), default='rk',
+                        help="rk_mcprotocol hoặc slmp_async")
+    parser.add_argument('--sim-latency-ms', type=float, default=500.0, help="độ trễ phản hồi của simulator")
+    parser.add_argument('--timeout-ms', type=float, default=300.0, help="timeout socket của pool")
+    args = parser.parse_args(argv)
+
+    if args.backend == 'async':
+        import slmp_async as protocol
+    else:
+        protocol = mc
+    failures = check_reconnect(protocol, args.sim_latency_ms / 1000, args.timeout_ms / 1000)
+    for failure in failures:
+        print(f"LỖI: {failure}")
+    if failures:
+        return 1
+    print("Kết nối lại sau timeout: đạt")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
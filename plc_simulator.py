@@ -0,0 +1,247 @@
+import sys
+import array
+import random
+import struct
+import asyncio
+import argparse
+import threading
+from plc_devices import DEVICES, BIT_LIMIT, WORD_LIMIT
+from slmp_async import (CMD_BATCH_READ, CMD_BATCH_WRITE, SUB_BIT, SUB_WORD,
+                        REQUEST_SUBHEADER, RESPONSE_SUBHEADER, pack_bits, unpack_bits)
+
+# Mã lỗi SLMP trả về khi yêu cầu không hợp lệ
+ERR_COMMAND = 0xC059
+ERR_BIT_POINTS = 0xC051
+ERR_WORD_POINTS = 0xC052
+ERR_RANGE = 0xC056
+ERR_DEVICE = 0xC05B
+ERR_REQUEST = 0xC061
+# Mã lỗi dùng khi giả lập lỗi ngẫu nhiên
+ERR_INJECTED = 0xC05F
+
+DEVICES_BY_CODE = {device.code: device for device in DEVICES.values()}
+
+
+class DeviceMemory:
+    """Bộ nhớ thiết bị FX5U: bit lưu trong bytearray, word lưu trong array('H')"""
+    def __init__(self):
+        self.bits = {name: bytearray(d.points) for name, d in DEVICES.items() if d.is_bit}
+        self.words = {name: array.array('H', bytes(2 * d.points)) for name, d in DEVICES.items() if not d.is_bit}
+
+    def read_bits(self, device, address, count):
+        return self.bits[device.name][address:address + count]
+
+    def write_bits(self, device, address, values):
+        self.bits[device.name][address:address + len(values)] = bytes(values)
+
+    def read_words(self, device, address, count):
+        if device.is_bit:
+            # Truy cập theo word trên thiết bị bit: 16 điểm mỗi word, điểm đầu ở bit thấp
+            bits = self.bits[device.name]
+            result = array.array('H')
+            for i in range(count):
+                start = address + i * 16
+                word = 0
+                for j, bit in enumerate(bits[start:start + 16]):
+                    word |= bit << j
+                result.append(word)
+            return result
+        return self.words[device.name][address:address + count]
+
+    def write_words(self, device, address, values):
+        if device.is_bit:
+            bits = self.bits[device.name]
+            for i, word in enumerate(values):
+                start = address + i * 16
+                bits[start:start + 16] = bytes((word >> j) & 1 for j in range(16))
+            return
+        self.words[device.name][address:address + len(values)] = array.array('H', values)
+
+
+class SLMPError(Exception):
+    def __init__(self, end_code):
+        super().__init__(f"{end_code:04X}")
+        self.end_code = end_code
+
+
+class PLCSimulator:
+    """Server TCP giả lập FX5U nói frame 3E binary (batch read/write 0401/1401).
+
+    latency / jitter (giây) làm chậm mỗi phản hồi; drop_rate, timeout_rate,
+    error_rate là xác suất đóng kết nối, không trả lời, hoặc trả mã lỗi.
+    """
+    def __init__(self, host='127.0.0.1', port=1025, latency=0.0, jitter=0.0,
+                 drop_rate=0.0, timeout_rate=0.0, error_rate=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.timeout_rate = timeout_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.memory = DeviceMemory()
+        self.requests = 0
+        self.faults = 0
+        self.server = None
+        self._loop = None
+        self._thread = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def start_background(self):
+        """Chạy simulator trên một thread nền, trả về (host, port)"""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='plc-simulator', daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.host, self.port
+
+    def stop_background(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+
+    async def _shutdown(self):
+        """Đóng server và các kết nối đang mở"""
+        self.server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(9)
+                if header[:2] != REQUEST_SUBHEADER:
+                    break
+                length = struct.unpack_from('<H', header, 7)[0]
+                body = await reader.readexactly(length)
+                self.requests += 1
+
+                delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                fault = self.random.random()
+                if fault < self.drop_rate:
+                    self.faults += 1
+                    break
+                fault -= self.drop_rate
+                if fault < self.timeout_rate:
+                    self.faults += 1
+                    continue
+                fault -= self.timeout_rate
+                if fault < self.error_rate:
+                    self.faults += 1
+                    writer.write(self.error_response(header, body, ERR_INJECTED))
+                else:
+                    try:
+                        data = self.execute(body)
+                        writer.write(self.response(header, data))
+                    except SLMPError as e:
+                        writer.write(self.error_response(header, body, e.end_code))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # Bị hủy khi dừng simulator: kết thúc bình thường để asyncio không in traceback
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def response(header, data):
+        return RESPONSE_SUBHEADER + header[2:7] + struct.pack('<HH', len(data) + 2, 0) + data
+
+    @staticmethod
+    def error_response(header, body, end_code):
+        # Thông tin lỗi: route của yêu cầu + lệnh + lệnh con
+        info = header[2:7] + body[2:6]
+        return RESPONSE_SUBHEADER + header[2:7] + struct.pack('<HH', len(info) + 2, end_code) + info
+
+    def execute(self, body):
+        if len(body) < 12:
+            raise SLMPError(ERR_REQUEST)
+        command, subcommand = struct.unpack_from('<HH', body, 2)
+        address = int.from_bytes(body[6:9], 'little')
+        device = DEVICES_BY_CODE.get(body[9])
+        points = struct.unpack_from('<H', body, 10)[0]
+        payload = body[12:]
+
+        if command not in (CMD_BATCH_READ, CMD_BATCH_WRITE) or subcommand not in (SUB_BIT, SUB_WORD):
+            raise SLMPError(ERR_COMMAND)
+        if device is None:
+            raise SLMPError(ERR_DEVICE)
+
+        if subcommand == SUB_BIT:
+            if not device.is_bit:
+                raise SLMPError(ERR_DEVICE)
+            if not 0 < points <= BIT_LIMIT:
+                raise SLMPError(ERR_BIT_POINTS)
+            if address + points > device.points:
+                raise SLMPError(ERR_RANGE)
+            if command == CMD_BATCH_READ:
+                return pack_bits(self.memory.read_bits(device, address, points))
+            if len(payload) != (points + 1) // 2:
+                raise SLMPError(ERR_REQUEST)
+            self.memory.write_bits(device, address, unpack_bits(payload, points))
+            return b''
+
+        if not 0 < points <= WORD_LIMIT:
+            raise SLMPError(ERR_WORD_POINTS)
+        span = points * 16 if device.is_bit else points
+        if address + span > device.points:
+            raise SLMPError(ERR_RANGE)
+        if command == CMD_BATCH_READ:
+            return self.memory.read_words(device, address, points).tobytes()
+        if len(payload) != points * 2:
+            raise SLMPError(ERR_REQUEST)
+        self.memory.write_words(device, address, struct.unpack(f'<{points}H', payload))
+        return b''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Giả lập PLC FX5U (SLMP 3E binary) để chạy thử không cần phần cứng")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="độ trễ mỗi phản hồi")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="dao động ngẫu nhiên ± của độ trễ")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="xác suất đóng kết nối")
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help="xác suất không trả lời")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="xác suất trả mã lỗi")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    simulator = PLCSimulator(args.host, args.port, args.latency_ms / 1000, args.jitter_ms / 1000,
+                             args.drop_rate, args.timeout_rate, args.error_rate, args.seed)
+    print(f"PLC simulator đang chạy tại {args.host}:{args.port}")
+    try:
+        asyncio.run(simulator.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import time
+import queue
+import rk_mcprotocol as mc
+from plc_devices import check_result
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class PLCRequest:
+    """Một yêu cầu I/O gửi tới PLC, được thực hiện tuần tự trong luồng worker"""
+    def __init__(self, name, func, kwargs, context=None):
+        self.name = name
+        self.func = func
+        self.kwargs = kwargs
+        self.context = context
+
+
+class PLCWorker(QThread):
+    """Luồng I/O duy nhất sở hữu socket PLC.
+
+    Mọi yêu cầu được đưa vào hàng đợi và thực hiện lần lượt từng cái một,
+    nên giao tiếp SLMP vẫn là half-duplex. Kết quả được trả về giao diện
+    qua signal kèm thời gian round-trip (ms).
+    """
+    connected = pyqtSignal(str, int)
+    disconnected = pyqtSignal(str)
+    request_done = pyqtSignal(str, object, float, object)
+    request_failed = pyqtSignal(str, str, float, object)
+
+    def __init__(self, protocol=mc, parent=None):
+        super().__init__(parent)
+        self.protocol = protocol
+        self.requests = queue.Queue()
+        self.socket = None
+
+    def connect_plc(self, host, port):
+        self.requests.put(('open', (host, port)))
+
+    def disconnect_plc(self, reason="Đã ngắt kết nối với PLC"):
+        self.requests.put(('close', reason))
+
+    def submit(self, name, func, context=None, **kwargs):
+        """Đưa một lệnh của protocol (read_bit, write_sign_word, ...) vào hàng đợi"""
+        self.requests.put(('call', PLCRequest(name, func, kwargs, context)))
+
+    def pending(self):
+        """Số yêu cầu đang chờ trong hàng đợi"""
+        return self.requests.qsize()
+
+    def stop(self):
+        self.requests.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            item = self.requests.get()
+            if item is None:
+                break
+            kind, payload = item
+            if kind == 'open':
+                self._open(*payload)
+            elif kind == 'close':
+                self._close(payload)
+            else:
+                self._execute(payload)
+        self._close(None)
+
+    def _open(self, host, port):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+        try:
+            self.socket = self.protocol.open_socket(host, port)
+            self.connected.emit(host, port)
+        except Exception as e:
+            self.disconnected.emit(f"Lỗi kết nối: {str(e)}")
+
+    def _close(self, reason):
+        if self.socket is None:
+            return
+        self.socket.close()
+        self.socket = None
+        if reason is not None:
+            self.disconnected.emit(reason)
+
+    def _execute(self, request):
+        if self.socket is None:
+            self.request_failed.emit(request.name, "Chưa kết nối với PLC", 0.0, request.context)
+            return
+
+        start = time.perf_counter()
+        try:
+            result = check_result(request.func(self.socket, **request.kwargs))
+        except Exception as e:
+            latency_ms = (time.perf_counter() - start) * 1000
+            self.request_failed.emit(request.name, str(e), latency_ms, request.context)
+            return
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.request_done.emit(request.name, result, latency_ms, request.context)
@@ -0,0 +1,120 @@
+import os
+import json
+from read_planner import DEFAULT_GAP_BYTES
+from tag_db import TagDef, TagDatabase
+from hsv_mask import color_to_dict, color_from_dict, ColorClassifier, label_palette
+from roi import ROI
+
+# Phiên bản định dạng file dự án. File chỉ có {"colors": [...]} (lưu từ
+# hsv_color_checker.py trước đây) được đọc như phiên bản 0.
+PROJECT_VERSION = 1
+
+
+class PLCEndpoint:
+    """Địa chỉ một PLC trong dự án"""
+    def __init__(self, name, host, port=1025):
+        self.name = name
+        self.host = host
+        self.port = int(port)
+
+    def to_dict(self):
+        return {'name': self.name, 'host': self.host, 'port': self.port}
+
+
+class Project:
+    """Dải màu, ROI, PLC và tag dùng chung cho hai giao diện và các chương trình chạy nền.
+
+    Khi nạp, bảng tra phân loại màu (ColorClassifier) và bảng tag (TagDatabase)
+    kèm kế hoạch đọc gộp của từng PLC được dựng sẵn một lần, chương trình chỉ
+    việc dùng lại. Tag (tag_db.TagDef) có kiểu dữ liệu và hệ số quy đổi.
+    """
+    def __init__(self, colors=(), rois=(), plcs=(), tags=(), gap_bytes=DEFAULT_GAP_BYTES):
+        self.colors = list(colors)
+        self.rois = list(rois)
+        self.plcs = list(plcs)
+        self.tags = list(tags)
+        self.gap_bytes = gap_bytes
+        self.compile()
+
+    def compile(self):
+        """Dựng lại bảng tra màu và kế hoạch đọc; gọi lại sau khi sửa dự án"""
+        names = [plc.name for plc in self.plcs]
+        if len(set(names)) != len(names):
+            raise ValueError("Tên PLC bị trùng trong dự án")
+        tag_names = [tag.name for tag in self.tags]
+        if len(set(tag_names)) != len(tag_names):
+            raise ValueError("Tên tag bị trùng trong dự án")
+        for tag in self.tags:
+            if tag.plc is not None and tag.plc not in names:
+                raise ValueError(f"Tag {tag.name} dùng PLC không có trong dự án: {tag.plc}")
+
+        self.classifier = ColorClassifier(self.colors)
+        self.palette = label_palette(self.colors)
+        self.databases = {}
+        for plc in self.plcs:
+            database = TagDatabase(self.tags_for(plc.name), self.gap_bytes)
+            database.plan()
+            self.databases[plc.name] = database
+
+    def plc(self, name=None):
+        """PLC theo tên, mặc định là PLC đầu tiên (None nếu dự án chưa có PLC)"""
+        if name is None:
+            return self.plcs[0] if self.plcs else None
+        for plc in self.plcs:
+            if plc.name == name:
+                return plc
+        raise KeyError(f"Không có PLC {name} trong dự án")
+
+    def tags_for(self, plc_name):
+        """Các tag của một PLC; tag không ghi PLC thuộc về PLC đầu tiên"""
+        default = self.plcs[0].name if self.plcs else None
+        return [tag for tag in self.tags if (tag.plc or default) == plc_name]
+
+    def tag_database(self, plc_name=None):
+        """Bảng tag (TagDatabase) của một PLC, mặc định PLC đầu tiên"""
+        plc = self.plc(plc_name)
+        return self.databases[plc.name] if plc is not None else TagDatabase(gap_bytes=self.gap_bytes)
+
+    def read_plan(self, plc_name=None):
+        """Kế hoạch đọc gộp đã dựng sẵn (TagReadPlan) của mọi tag của một PLC"""
+        return self.tag_database(plc_name).plan()
+
+    def to_dict(self):
+        return {
+            'version': PROJECT_VERSION,
+            'colors': [color_to_dict(color) for color in self.colors],
+            'rois': [roi.to_dict() for roi in self.rois],
+            'plcs': [plc.to_dict() for plc in self.plcs],
+            'tags': [tag.to_dict() for tag in self.tags],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        version = data.get('version', 0)
+        if version > PROJECT_VERSION:
+            raise ValueError(f"File dự án phiên bản {version} mới hơn chương trình ({PROJECT_VERSION})")
+        return cls(colors=[color_from_dict(color) for color in data.get('colors', [])],
+                   rois=[ROI.from_dict(roi) for roi in data.get('rois', [])],
+                   plcs=[PLCEndpoint(**plc) for plc in data.get('plcs', [])],
+                   tags=[TagDef(**tag) for tag in data.get('tags', [])])
+
+    def save(self, path):
+        # Ghi ra file tạm rồi đổi tên để file cũ không bị hỏng nếu chương trình dừng giữa chừng
+        temp = path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        os.replace(temp, path)
+
+
+def load_project(path):
+    with open(path, encoding='utf-8') as f:
+        return Project.from_dict(json.load(f))
+
+
+def project_path(argv):
+    """Giá trị của tham số --project trong argv, hoặc None"""
+    if '--project' in argv:
+        index = argv.index('--project')
+        if index + 1 < len(argv):
+            return argv[index + 1]
+    return None
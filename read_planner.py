@@ -0,0 +1,106 @@
+import rk_mcprotocol as mc
+from plc_devices import parse_address, check_range, check_result, headdevice, frame_limit
+
+# Chi phí một round-trip quy đổi ra số byte dữ liệu: đọc xuyên qua khoảng trống
+# rẻ hơn gửi thêm một frame khi khoảng trống nhỏ hơn giá trị này.
+# Binary 3E: 1 điểm bit = 0.5 byte, 1 word = 2 byte.
+DEFAULT_GAP_BYTES = 128
+
+
+class ReadBlock:
+    """Một lần đọc liên tục trên một thiết bị, phục vụ nhiều tag"""
+    def __init__(self, device, start, length=0):
+        self.device = device
+        self.start = start
+        self.length = length
+        self.items = []  # (tag, offset, size)
+
+    @property
+    def headdevice(self):
+        return headdevice(self.device, self.start)
+
+    def __repr__(self):
+        return f"ReadBlock({self.headdevice}, length={self.length}, tags={len(self.items)})"
+
+
+def max_gap(device, gap_bytes=DEFAULT_GAP_BYTES):
+    """Số điểm trống tối đa được đọc bắc cầu giữa hai tag"""
+    return gap_bytes * 2 if device.is_bit else gap_bytes // 2
+
+
+def plan_points(points, gap_bytes=DEFAULT_GAP_BYTES):
+    """Gộp danh sách (tag, Device, address, size) thành ít ReadBlock nhất.
+
+    Các tag được sắp theo địa chỉ trên từng thiết bị rồi gộp tham lam: một tag
+    được nối vào block hiện tại nếu khoảng trống không vượt max_gap và block
+    không vượt giới hạn frame (3584 bit / 960 word).
+    """
+    by_device = {}
+    for tag, device, address, size in points:
+        check_range(device, address, size)
+        by_device.setdefault(device.name, (device, []))[1].append((address, size, tag))
+
+    plan = []
+    for device, entries in by_device.values():
+        entries.sort(key=lambda e: e[0])
+        limit = frame_limit(device)
+        gap = max_gap(device, gap_bytes)
+        block = None
+        for address, size, tag in entries:
+            end = address + size
+            if block is not None:
+                block_end = block.start + block.length
+                if address - block_end <= gap and max(end, block_end) - block.start <= limit:
+                    block.length = max(block.length, end - block.start)
+                    block.items.append((tag, address - block.start, size))
+                    continue
+            block = ReadBlock(device, address, size)
+            block.items.append((tag, 0, size))
+            plan.append(block)
+    return plan
+
+
+def plan_reads(tags, gap_bytes=DEFAULT_GAP_BYTES):
+    """Lập kế hoạch đọc cho danh sách tag dạng chuỗi, ví dụ ['M12', 'D15', 'D16', 'R200', 'X7']"""
+    points = []
+    seen = set()
+    for tag in tags:
+        if tag in seen:
+            continue
+        seen.add(tag)
+        device, address = parse_address(tag)
+        points.append((tag, device, address, 1))
+    return plan_points(points, gap_bytes)
+
+
+def read_block(s, block, signed_type=True, protocol=mc):
+    """Thực hiện một ReadBlock, trả về danh sách giá trị thô của cả block"""
+    if block.device.is_bit:
+        return check_result(protocol.read_bit(s, headdevice=block.headdevice, length=block.length))
+    return check_result(protocol.read_sign_word(s, headdevice=block.headdevice,
+                                                length=block.length, signed_type=signed_type))
+
+
+def read_blocks(s, blocks, signed_type=True, protocol=mc):
+    """Đọc lần lượt các ReadBlock, trả về danh sách giá trị thô theo thứ tự blocks"""
+    return [read_block(s, block, signed_type, protocol) for block in blocks]
+
+
+def unpack_block(block, values, result):
+    """Tách giá trị thô của block vào dict theo tag"""
+    for tag, offset, size in block.items:
+        result[tag] = values[offset] if size == 1 else values[offset:offset + size]
+    return result
+
+
+def execute_plan(s, plan, signed_type=True, protocol=mc):
+    """Đọc toàn bộ kế hoạch, trả về dict {tag: giá trị}"""
+    result = {}
+    for block in plan:
+        unpack_block(block, read_block(s, block, signed_type, protocol), result)
+    return result
+
+
+def read_tags(s, tags, signed_type=True, gap_bytes=DEFAULT_GAP_BYTES, protocol=mc):
+    """Lập kế hoạch và đọc ngay một danh sách tag"""
+    return execute_plan(s, plan_reads(tags, gap_bytes), signed_type, protocol)
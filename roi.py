@@ -0,0 +1,117 @@
+import json
+import cv2
+import numpy as np
+from hsv_mask import ColorMeasurement, build_mask, measure_colors
+
+
+class ROI:
+    """A named region of interest: a rectangle, or a polygon inside its bounding rectangle.
+
+    Processing only touches the pixels of the bounding rectangle (a view into
+    the frame, no copy); polygon ROIs additionally clear the labels outside the
+    polygon with a mask that is built once per frame size.
+    """
+    def __init__(self, name, points):
+        if len(points) < 2:
+            raise ValueError("An ROI needs at least two points")
+        self.name = name
+        self.points = [(int(x), int(y)) for x, y in points]
+        self.is_rect = len(self.points) == 2
+        self._mask_cache = None
+
+    @classmethod
+    def rect(cls, name, x, y, w, h):
+        return cls(name, [(x, y), (x + w, y + h)])
+
+    def bounds(self, shape):
+        """(x, y, w, h) of the bounding rectangle clipped to a frame shape"""
+        xs = [p[0] for p in self.points]
+        ys = [p[1] for p in self.points]
+        x0, y0 = max(0, min(xs)), max(0, min(ys))
+        x1, y1 = min(shape[1], max(xs)), min(shape[0], max(ys))
+        return x0, y0, max(0, x1 - x0), max(0, y1 - y0)
+
+    def crop(self, image):
+        x, y, w, h = self.bounds(image.shape)
+        return image[y:y + h, x:x + w]
+
+    def crop_mask(self, shape):
+        """0/255 polygon mask for the cropped area, or None for a rectangle"""
+        if self.is_rect:
+            return None
+        key = tuple(shape[:2])
+        if self._mask_cache is None or self._mask_cache[0] != key:
+            x, y, w, h = self.bounds(shape)
+            mask = np.zeros((h, w), dtype=np.uint8)
+            polygon = np.array([(px - x, py - y) for px, py in self.points], dtype=np.int32)
+            cv2.fillPoly(mask, [polygon], 255)
+            self._mask_cache = (key, mask)
+        return self._mask_cache[1]
+
+    def draw(self, image, color=(0, 255, 255)):
+        if self.is_rect:
+            cv2.rectangle(image, self.points[0], self.points[1], color, 2)
+        else:
+            cv2.polylines(image, [np.array(self.points, dtype=np.int32)], True, color, 2)
+        cv2.putText(image, self.name, self.points[0], cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+    def to_dict(self):
+        return {'name': self.name, 'points': [list(p) for p in self.points]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['points'])
+
+
+def roi_labels(frame, roi, classifier):
+    """Label image of one ROI crop; only the crop is converted to HSV and classified"""
+    crop = roi.crop(frame)
+    if crop.size == 0:
+        return None
+    labels = classifier.classify(cv2.cvtColor(crop, cv2.COLOR_BGR2HSV))
+    mask = roi.crop_mask(frame.shape)
+    if mask is not None:
+        labels = cv2.bitwise_and(labels, mask)
+    return labels
+
+
+def roi_mask(frame, roi, color):
+    """(mask, crop) of one color range inside an ROI, or (None, crop) for an empty ROI"""
+    crop = roi.crop(frame)
+    if crop.size == 0:
+        return None, crop
+    mask = build_mask(cv2.cvtColor(crop, cv2.COLOR_BGR2HSV), color)
+    polygon = roi.crop_mask(frame.shape)
+    if polygon is not None:
+        cv2.bitwise_and(mask, polygon, dst=mask)
+    return mask, crop
+
+
+def measure_rois(frame, rois, colors, classifier):
+    """Per-ROI color measurements, with centroids and boxes in frame coordinates.
+
+    Every ROI yields one measurement per color, in color order; an ROI outside
+    the frame reports zero counts so positional outputs stay aligned.
+    """
+    results = []
+    for roi in rois:
+        labels = roi_labels(frame, roi, classifier)
+        if labels is None:
+            empty = [ColorMeasurement(color.get('name', f"Color_{index + 1}"), 0, (0, 0), (0, 0, 0, 0))
+                     for index, color in enumerate(colors)]
+            results.append((roi, empty))
+            continue
+        x, y, _, _ = roi.bounds(frame.shape)
+        measurements = measure_colors(labels, colors)
+        for m in measurements:
+            if m.count:
+                m.centroid = (m.centroid[0] + x, m.centroid[1] + y)
+                m.bbox = (m.bbox[0] + x, m.bbox[1] + y, m.bbox[2], m.bbox[3])
+        results.append((roi, measurements))
+    return results
+
+
+def load_rois(path):
+    """ROIs stored next to the color ranges in a color file"""
+    with open(path, encoding='utf-8') as f:
+        return [ROI.from_dict(data) for data in json.load(f).get('rois', [])]
@@ -0,0 +1,206 @@
+import time
+import rk_mcprotocol as mc
+from read_planner import DEFAULT_GAP_BYTES, plan_reads, read_block, unpack_block
+
+OVERRUN_SKIP = 'skip'
+OVERRUN_CATCH_UP = 'catch_up'
+
+
+class ScanClass:
+    """Một lớp quét: nhóm tag được đọc theo cùng một chu kỳ cố định"""
+    def __init__(self, name, period):
+        if period <= 0:
+            raise ValueError(f"Chu kỳ quét phải lớn hơn 0: {period}")
+        self.name = name
+        self.period = period
+        self.tags = []
+        self.next_due = None
+
+        # Thống kê
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_cycle_ms = 0.0
+        self.max_cycle_ms = 0.0
+        self.last_jitter_ms = 0.0
+        self.max_jitter_ms = 0.0
+        self.avg_jitter_ms = 0.0
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'period_ms': self.period * 1000,
+            'tags': len(self.tags),
+            'cycles': self.cycles,
+            'overruns': self.overruns,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'last_cycle_ms': self.last_cycle_ms,
+            'max_cycle_ms': self.max_cycle_ms,
+            'last_jitter_ms': self.last_jitter_ms,
+            'max_jitter_ms': self.max_jitter_ms,
+            'avg_jitter_ms': self.avg_jitter_ms,
+        }
+
+
+class ScanResult:
+    """Kết quả một chu kỳ quét: các block thô và giá trị theo tag (tạo khi cần)"""
+    def __init__(self, classes, timestamp, blocks):
+        self.classes = classes
+        self.timestamp = timestamp
+        self.blocks = blocks  # [(ReadBlock, danh sách giá trị thô)]
+        self._values = None
+
+    @property
+    def values(self):
+        if self._values is None:
+            self._values = {}
+            for block, raw in self.blocks:
+                unpack_block(block, raw, self._values)
+        return self._values
+
+
+class ScanEngine:
+    """Bộ quét tag theo chu kỳ với nhiều lớp quét (ví dụ 10 ms, 100 ms, 1 s).
+
+    Lịch quét không trôi: thời điểm kế tiếp = thời điểm dự kiến + chu kỳ, không
+    phụ thuộc thời gian thực thi. Khi các lớp đến hạn cùng lúc, tag của chúng
+    được gộp vào một kế hoạch đọc để dùng ít block nhất. Khi bị trễ quá một chu
+    kỳ: 'skip' bỏ qua các chu kỳ đã lỡ, 'catch_up' chạy bù liên tiếp.
+    """
+    def __init__(self, s, protocol=mc, signed_type=True, overrun=OVERRUN_SKIP,
+                 gap_bytes=DEFAULT_GAP_BYTES):
+        if overrun not in (OVERRUN_SKIP, OVERRUN_CATCH_UP):
+            raise ValueError(f"Chế độ overrun không hợp lệ: {overrun}")
+        self.socket = s
+        self.protocol = protocol
+        self.signed_type = signed_type
+        self.overrun = overrun
+        self.gap_bytes = gap_bytes
+        self.classes = {}
+        self.listeners = []
+        self.error_listeners = []
+        self._plans = {}
+        self._running = False
+
+    def add_class(self, name, period):
+        """Thêm lớp quét, period tính bằng giây"""
+        scan_class = ScanClass(name, period)
+        self.classes[name] = scan_class
+        self._plans.clear()
+        return scan_class
+
+    def add_tags(self, name, tags):
+        scan_class = self.classes[name]
+        scan_class.tags = scan_class.tags + [tag for tag in tags if tag not in scan_class.tags]
+        self._plans.clear()
+
+    def remove_tags(self, name, tags):
+        scan_class = self.classes[name]
+        scan_class.tags = [tag for tag in scan_class.tags if tag not in tags]
+        self._plans.clear()
+
+    def add_listener(self, callback):
+        """callback(ScanResult) được gọi sau mỗi chu kỳ đọc thành công"""
+        self.listeners.append(callback)
+
+    def add_error_listener(self, callback):
+        """callback(tên các lớp, exception) được gọi khi một chu kỳ đọc lỗi"""
+        self.error_listeners.append(callback)
+
+    def plan_for(self, names):
+        """Kế hoạch đọc gộp cho một tổ hợp lớp quét, được tính sẵn và lưu lại"""
+        key = tuple(sorted(names))
+        plan = self._plans.get(key)
+        if plan is None:
+            tags = []
+            for name in key:
+                tags.extend(self.classes[name].tags)
+            plan = plan_reads(tags, self.gap_bytes)
+            self._plans[key] = plan
+        return plan
+
+    def stats(self):
+        return [scan_class.stats() for scan_class in self.classes.values()]
+
+    def step(self, now=None):
+        """Chạy một chu kỳ cho các lớp đã đến hạn. Trả về thời điểm đến hạn kế tiếp"""
+        if now is None:
+            now = time.monotonic()
+        due = []
+        for scan_class in self.classes.values():
+            if scan_class.next_due is None:
+                scan_class.next_due = now
+            if now >= scan_class.next_due:
+                due.append(scan_class)
+
+        if due:
+            self._scan(due, now)
+
+        if not self.classes:
+            return None
+        return min(scan_class.next_due for scan_class in self.classes.values())
+
+    def _scan(self, due, now):
+        names = [scan_class.name for scan_class in due]
+        plan = self.plan_for(names)
+        start = time.monotonic()
+        try:
+            blocks = [(block, read_block(self.socket, block, self.signed_type, self.protocol))
+                      for block in plan]
+        except Exception as e:
+            blocks = None
+            for scan_class in due:
+                scan_class.errors += 1
+            for callback in self.error_listeners:
+                callback(names, e)
+        elapsed = time.monotonic() - start
+        cycle_ms = elapsed * 1000
+
+        # Lịch quét tính theo cùng trục thời gian với now (có thể là thời gian giả lập khi gọi step(now))
+        for scan_class in due:
+            self._account(scan_class, now, cycle_ms, now + elapsed)
+
+        if blocks is not None:
+            result = ScanResult(names, time.time(), blocks)
+            for callback in self.listeners:
+                callback(result)
+
+    def _account(self, scan_class, now, cycle_ms, end):
+        jitter_ms = (now - scan_class.next_due) * 1000
+        scan_class.cycles += 1
+        scan_class.last_cycle_ms = cycle_ms
+        scan_class.max_cycle_ms = max(scan_class.max_cycle_ms, cycle_ms)
+        scan_class.last_jitter_ms = jitter_ms
+        scan_class.max_jitter_ms = max(scan_class.max_jitter_ms, jitter_ms)
+        scan_class.avg_jitter_ms += (jitter_ms - scan_class.avg_jitter_ms) / min(scan_class.cycles, 100)
+
+        scan_class.next_due += scan_class.period
+        if end > scan_class.next_due:
+            scan_class.overruns += 1
+            if self.overrun == OVERRUN_SKIP:
+                missed = int((end - scan_class.next_due) // scan_class.period) + 1
+                scan_class.skipped += missed
+                scan_class.next_due += missed * scan_class.period
+
+    def run(self, duration=None):
+        """Quét liên tục cho tới khi stop() được gọi hoặc hết duration (giây)"""
+        self._running = True
+        deadline = None if duration is None else time.monotonic() + duration
+        while self._running:
+            next_due = self.step()
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            if next_due is None:
+                break
+            if next_due > now:
+                wait = next_due - now
+                if deadline is not None:
+                    wait = min(wait, deadline - now)
+                time.sleep(wait)
+        self._running = False
+
+    def stop(self):
+        self._running = False
@@ -0,0 +1,261 @@
+import asyncio
+import struct
+import threading
+from plc_devices import BIT_LIMIT, WORD_LIMIT, DWORD_LIMIT, parse_address, check_range
+from read_planner import unpack_block
+
+# Lệnh SLMP (MC protocol) frame 3E dạng binary
+CMD_BATCH_READ = 0x0401
+CMD_BATCH_WRITE = 0x1401
+SUB_WORD = 0x0000
+SUB_BIT = 0x0001
+
+REQUEST_SUBHEADER = b'\x50\x00'
+RESPONSE_SUBHEADER = b'\xd0\x00'
+# Network 00, PC FF, I/O FF03, station 00
+ACCESS_ROUTE = b'\x00\xff\xff\x03\x00'
+RESPONSE_HEADER_SIZE = 9
+
+DEFAULT_TIMEOUT = 6.0
+# Timer giám sát phía PLC, đơn vị 250 ms (0x0010 = 4 s)
+DEFAULT_MONITORING_TIMER = 0x0010
+
+
+class SLMPError(Exception):
+    """PLC trả về mã kết thúc khác 0"""
+    def __init__(self, end_code, command=None):
+        self.end_code = end_code
+        self.command = command
+        super().__init__(f"PLC error = {end_code:04X}(hex)")
+
+
+def build_request(command, subcommand, payload, monitoring_timer=DEFAULT_MONITORING_TIMER):
+    body = struct.pack('<HHH', monitoring_timer, command, subcommand) + payload
+    return REQUEST_SUBHEADER + ACCESS_ROUTE + struct.pack('<H', len(body)) + body
+
+
+def device_spec(headdevice, length, limit):
+    """Phần 'số thiết bị + mã thiết bị + số điểm' của frame, kèm kiểm tra giới hạn"""
+    device, address = parse_address(headdevice)
+    if not 0 < length <= limit:
+        raise ValueError(f"Số điểm {length} ngoài phạm vi 1 ~ {limit} (headdevice = '{headdevice}')")
+    check_range(device, address, length)
+    return device, address.to_bytes(3, 'little') + bytes([device.code]) + struct.pack('<H', length)
+
+
+def pack_bits(data_list):
+    """2 điểm mỗi byte, điểm đầu ở 4 bit cao"""
+    packed = bytearray((len(data_list) + 1) // 2)
+    for i, bit in enumerate(data_list):
+        if bit:
+            packed[i // 2] |= 0x10 if i % 2 == 0 else 0x01
+    return bytes(packed)
+
+
+def unpack_bits(data, length):
+    result = []
+    for byte in data:
+        result.append(byte >> 4 & 1)
+        result.append(byte & 1)
+    return result[:length]
+
+
+def unpack_words(data, signed_type):
+    fmt = 'h' if signed_type else 'H'
+    return list(struct.unpack(f'<{len(data) // 2}{fmt}', data))
+
+
+def unpack_dwords(data, signed_type):
+    fmt = 'i' if signed_type else 'I'
+    return list(struct.unpack(f'<{len(data) // 4}{fmt}', data))
+
+
+class AsyncSLMPClient:
+    """Client asyncio cho frame 3E binary của FX5U.
+
+    Mỗi client giữ một kết nối TCP; các yêu cầu trên cùng kết nối được khóa
+    tuần tự (SLMP là half-duplex). Nhiều client chạy song song trên cùng một
+    event loop để điều khiển nhiều PLC mà không cần thread cho từng PLC.
+    Khi một yêu cầu bị timeout hoặc bị hủy giữa chừng, kết nối bị đóng để
+    tránh lệch frame và sẽ được mở lại ở yêu cầu tiếp theo.
+    """
+    def __init__(self, host, port=1025, timeout=DEFAULT_TIMEOUT,
+                 monitoring_timer=DEFAULT_MONITORING_TIMER):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.monitoring_timer = monitoring_timer
+        self.reader = None
+        self.writer = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self):
+        return self.writer is not None
+
+    async def connect(self):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
+
+    async def close(self):
+        writer = self.writer
+        self._drop()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def _drop(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def request(self, command, subcommand, payload, timeout=None):
+        """Gửi một frame và chờ phản hồi, trả về phần dữ liệu sau mã kết thúc"""
+        frame = build_request(command, subcommand, payload, self.monitoring_timer)
+        async with self._lock:
+            try:
+                return await asyncio.wait_for(self._exchange(frame),
+                                              self.timeout if timeout is None else timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError, OSError, asyncio.IncompleteReadError):
+                self._drop()
+                raise
+            except SLMPError as e:
+                e.command = command
+                raise
+
+    async def _exchange(self, frame):
+        await self.connect()
+        self.writer.write(frame)
+        await self.writer.drain()
+        header = await self.reader.readexactly(RESPONSE_HEADER_SIZE)
+        if header[:2] != RESPONSE_SUBHEADER:
+            raise IOError(f"Subheader phản hồi không hợp lệ: {header[:2].hex()}")
+        length = struct.unpack_from('<H', header, 7)[0]
+        body = await self.reader.readexactly(length)
+        end_code = struct.unpack_from('<H', body, 0)[0]
+        if end_code != 0:
+            raise SLMPError(end_code)
+        return body[2:]
+
+    async def read_bit(self, headdevice, length, timeout=None):
+        _, spec = device_spec(headdevice, length, BIT_LIMIT)
+        data = await self.request(CMD_BATCH_READ, SUB_BIT, spec, timeout)
+        return unpack_bits(data, length)
+
+    async def read_sign_word(self, headdevice, length, signed_type, timeout=None):
+        _, spec = device_spec(headdevice, length, WORD_LIMIT)
+        data = await self.request(CMD_BATCH_READ, SUB_WORD, spec, timeout)
+        return unpack_words(data, signed_type)
+
+    async def read_sign_Dword(self, headdevice, length, signed_type, timeout=None):
+        device_spec(headdevice, length, DWORD_LIMIT)
+        _, spec = device_spec(headdevice, length * 2, WORD_LIMIT)
+        data = await self.request(CMD_BATCH_READ, SUB_WORD, spec, timeout)
+        return unpack_dwords(data, signed_type)
+
+    async def write_bit(self, headdevice, data_list, timeout=None):
+        _, spec = device_spec(headdevice, len(data_list), BIT_LIMIT)
+        await self.request(CMD_BATCH_WRITE, SUB_BIT, spec + pack_bits(data_list), timeout)
+        return "OK"
+
+    async def write_sign_word(self, headdevice, data_list, signed_type, timeout=None):
+        _, spec = device_spec(headdevice, len(data_list), WORD_LIMIT)
+        fmt = 'h' if signed_type else 'H'
+        data = struct.pack(f'<{len(data_list)}{fmt}', *data_list)
+        await self.request(CMD_BATCH_WRITE, SUB_WORD, spec + data, timeout)
+        return "OK"
+
+    async def write_sign_Dword(self, headdevice, data_list, signed_type, timeout=None):
+        device_spec(headdevice, len(data_list), DWORD_LIMIT)
+        _, spec = device_spec(headdevice, len(data_list) * 2, WORD_LIMIT)
+        fmt = 'i' if signed_type else 'I'
+        data = struct.pack(f'<{len(data_list)}{fmt}', *data_list)
+        await self.request(CMD_BATCH_WRITE, SUB_WORD, spec + data, timeout)
+        return "OK"
+
+
+async def execute_plan(client, plan, signed_type=True):
+    """Phiên bản async của read_planner.execute_plan"""
+    result = {}
+    for block in plan:
+        if block.device.is_bit:
+            values = await client.read_bit(block.headdevice, block.length)
+        else:
+            values = await client.read_sign_word(block.headdevice, block.length, signed_type)
+        unpack_block(block, values, result)
+    return result
+
+
+# --- Giao diện đồng bộ tương thích rk_mcprotocol -------------------------------
+# Cho phép dùng `import slmp_async as mc` trong main.py / PLCInterface: mọi
+# client đồng bộ dùng chung một event loop chạy trên một thread nền duy nhất.
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def shared_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='slmp-loop', daemon=True).start()
+    return _loop
+
+
+class SyncClient:
+    """Bọc AsyncSLMPClient để gọi từ code đồng bộ, thay cho socket của rk_mcprotocol"""
+    def __init__(self, client):
+        self.client = client
+        self.loop = shared_loop()
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def settimeout(self, timeout):
+        """Như socket.settimeout: timeout (giây) cho mỗi yêu cầu sau đó"""
+        self.client.timeout = timeout
+
+    def close(self):
+        self.call(self.client.close())
+
+
+def open_socket(HOST, PORT, timeout=DEFAULT_TIMEOUT):
+    s = SyncClient(AsyncSLMPClient(HOST, PORT, timeout))
+    s.call(s.client.connect())
+    return s
+
+
+def read_bit(s, headdevice, length):
+    return s.call(s.client.read_bit(headdevice, length))
+
+
+def read_sign_word(s, headdevice, length, signed_type):
+    return s.call(s.client.read_sign_word(headdevice, length, signed_type))
+
+
+def read_sign_Dword(s, headdevice, length, signed_type):
+    return s.call(s.client.read_sign_Dword(headdevice, length, signed_type))
+
+
+def write_bit(s, headdevice, data_list):
+    return s.call(s.client.write_bit(headdevice, data_list))
+
+
+def write_sign_word(s, headdevice, data_list, signed_type):
+    return s.call(s.client.write_sign_word(headdevice, data_list, signed_type))
+
+
+def write_sign_Dword(s, headdevice, data_list, signed_type):
+    return s.call(s.client.write_sign_Dword(headdevice, data_list, signed_type))
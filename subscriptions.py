@@ -0,0 +1,150 @@
+import asyncio
+import weakref
+import threading
+import numpy as np
+
+
+class Subscription:
+    """Đăng ký theo dõi thay đổi của một tag.
+
+    deadband: ngưỡng tuyệt đối, deadband_pct: ngưỡng theo % giá trị đã báo lần
+    trước (chỉ áp dụng cho word/dword). Bit luôn báo khi đổi trạng thái.
+    """
+    def __init__(self, tag, callback=None, deadband=0, deadband_pct=0):
+        if deadband < 0 or deadband_pct < 0:
+            raise ValueError("Deadband không được âm")
+        self.tag = tag
+        self.callback = callback
+        self.deadband = deadband
+        self.deadband_pct = deadband_pct
+        self.slot = None  # vị trí giá trị đã báo lần trước trong SubscriptionManager
+
+
+class BlockFilter:
+    """Mảng chỉ số đã biên dịch cho các subscription nằm trong một ReadBlock.
+
+    Không giữ trạng thái: giá trị đã báo lần trước nằm trong mảng chung của
+    SubscriptionManager theo slot của từng subscription, nên cùng một tag đọc
+    bởi các kế hoạch quét khác nhau vẫn chỉ báo mỗi thay đổi một lần.
+    """
+    def __init__(self, block, subscriptions):
+        offsets = {tag: offset for tag, offset, size in block.items}
+        entries = [s for s in subscriptions if s.tag in offsets]
+        self.is_bit = block.device.is_bit
+        self.subscriptions = entries
+        self.offsets = np.array([offsets[s.tag] for s in entries], dtype=np.intp)
+        self.slots = np.array([s.slot for s in entries], dtype=np.intp)
+        self.deadband = np.array([s.deadband for s in entries], dtype=np.float64)
+        self.deadband_pct = np.array([s.deadband_pct for s in entries], dtype=np.float64) / 100
+
+    def changed(self, raw, last_values):
+        """Chỉ số các subscription có giá trị thay đổi vượt deadband, cập nhật last_values"""
+        values = np.asarray(raw)[self.offsets].astype(np.float64)
+        last = last_values[self.slots]
+        if self.is_bit:
+            changed = values != last
+        else:
+            threshold = np.maximum(self.deadband, self.deadband_pct * np.abs(last))
+            changed = np.isnan(last) | (np.abs(values - last) > threshold)
+        index = np.flatnonzero(changed)
+        last_values[self.slots[index]] = values[index]
+        return index
+
+
+class SubscriptionManager:
+    """Lớp change-of-value trên bộ quét: chỉ báo khi giá trị thực sự thay đổi.
+
+    So sánh được làm theo từng block đọc bằng numpy, nên việc theo dõi hàng
+    nghìn bit M gần như không tốn thêm CPU mỗi chu kỳ. Kết quả được trả qua
+    callback hoặc qua async iterator changes().
+    """
+    def __init__(self):
+        self.subscriptions = []
+        # BlockFilter theo từng ReadBlock của kế hoạch quét; tham chiếu yếu nên bị bỏ cùng với kế hoạch
+        self._filters = weakref.WeakKeyDictionary()
+        self._last = np.full(64, np.nan)
+        self._next_slot = 0
+        self._attached = []
+        self._queues = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, tag, callback=None, deadband=0, deadband_pct=0):
+        subscription = Subscription(tag, callback, deadband, deadband_pct)
+        with self._lock:
+            if self._next_slot == len(self._last):
+                self._last = np.concatenate([self._last, np.full(len(self._last), np.nan)])
+            subscription.slot = self._next_slot
+            self._next_slot += 1
+            new_tag = tag not in self.tags()
+            self.subscriptions.append(subscription)
+            # Chỉ dựng lại chỉ số; giá trị đã báo của các subscription khác được giữ nguyên
+            self._filters.clear()
+        if new_tag:
+            for engine, class_name in self._attached:
+                engine.add_tags(class_name, [tag])
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions.remove(subscription)
+            self._filters.clear()
+            unused = subscription.tag not in self.tags()
+        if unused:
+            for engine, class_name in self._attached:
+                engine.remove_tags(class_name, [subscription.tag])
+
+    def tags(self):
+        return list(dict.fromkeys(s.tag for s in self.subscriptions))
+
+    def attach(self, engine, class_name):
+        """Thêm các tag đã đăng ký vào một lớp quét và nghe kết quả của ScanEngine.
+
+        Tag của các subscription tạo sau cũng được thêm vào (và bỏ khi hết
+        subscription) lớp quét này.
+        """
+        with self._lock:
+            tags = self.tags()
+            self._attached.append((engine, class_name))
+        engine.add_tags(class_name, tags)
+        engine.add_listener(self.on_scan)
+
+    def on_scan(self, result):
+        """Listener cho ScanEngine: so sánh từng block và phát các thay đổi"""
+        changes = []
+        with self._lock:
+            for block, raw in result.blocks:
+                block_filter = self._filters.get(block)
+                if block_filter is None:
+                    block_filter = BlockFilter(block, self.subscriptions)
+                    self._filters[block] = block_filter
+                if not block_filter.subscriptions:
+                    continue
+                for i in block_filter.changed(raw, self._last):
+                    changes.append((block_filter.subscriptions[i], raw[block_filter.offsets[i]]))
+
+        for subscription, value in changes:
+            if subscription.callback is not None:
+                subscription.callback(subscription.tag, value, result.timestamp)
+        if changes and self._queues:
+            self._publish([(s.tag, value, result.timestamp) for s, value in changes])
+
+    def _publish(self, items):
+        for loop, queue in list(self._queues):
+            loop.call_soon_threadsafe(self._put_all, queue, items)
+
+    @staticmethod
+    def _put_all(queue, items):
+        for item in items:
+            queue.put_nowait(item)
+
+    async def changes(self):
+        """async for tag, value, timestamp in manager.changes(): ..."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        entry = (loop, queue)
+        self._queues.append(entry)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._queues.remove(entry)
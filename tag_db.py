@@ -0,0 +1,233 @@
+import numpy as np
+import rk_mcprotocol as mc
+from plc_devices import parse_address, check_range, check_result, headdevice, frame_limit
+from read_planner import DEFAULT_GAP_BYTES, plan_points, read_block
+
+# Kiểu dữ liệu của tag: (dtype numpy, số word mỗi phần tử). 32 bit: word thấp
+# đứng trước (D100 = 16 bit thấp, D101 = 16 bit cao), đúng thứ tự của FX5U.
+TYPES = {
+    'bit': (None, 1),
+    'int16': (np.int16, 1),
+    'uint16': (np.uint16, 1),
+    'int32': (np.int32, 2),
+    'uint32': (np.uint32, 2),
+    'float': (np.float32, 2),
+}
+
+
+class TagDef:
+    """Một tag có tên: địa chỉ, kiểu dữ liệu, số phần tử và hệ số quy đổi.
+
+    Giá trị kỹ thuật = giá trị thô * scale + offset. Địa chỉ được tách và kiểm
+    tra theo hệ cơ số của thiết bị (X/Y bát phân, B/W thập lục phân) ngay khi
+    tạo tag; headdevice cũng được tính sẵn một lần.
+    """
+    def __init__(self, name, address, plc=None, size=1, type=None, scale=1.0, offset=0.0, unit=''):
+        self.name = name
+        self.address = address.upper()
+        self.plc = plc
+        self.size = int(size)
+        self.device, self.start = parse_address(self.address)
+        if type is None:
+            type = 'bit' if self.device.is_bit else 'int16'
+        if type not in TYPES:
+            raise ValueError(f"Tag {name}: kiểu dữ liệu không hợp lệ '{type}' ({', '.join(TYPES)})")
+        if (type == 'bit') != self.device.is_bit:
+            raise ValueError(f"Tag {name}: kiểu {type} không dùng được cho thiết bị {self.device.name}")
+        if scale == 0:
+            raise ValueError(f"Tag {name}: scale phải khác 0")
+        self.type = type
+        self.dtype, self.words = TYPES[type]
+        self.scale = float(scale)
+        self.offset = float(offset)
+        self.unit = unit
+        self.points = self.size * self.words
+        check_range(self.device, self.start, self.points)
+        if self.points > frame_limit(self.device):
+            raise ValueError(f"Tag {name}: {self.points} điểm vượt giới hạn một lần đọc "
+                             f"({frame_limit(self.device)}) của {self.device.name}")
+        self.headdevice = headdevice(self.device, self.start)
+        self.write_func = 'write_bit' if self.device.is_bit else 'write_sign_word'
+
+    @property
+    def scaled(self):
+        return self.scale != 1.0 or self.offset != 0.0
+
+    def encode(self, value):
+        """Giá trị kỹ thuật -> danh sách bit hoặc word có dấu để ghi (signed_type=True)"""
+        values = list(value) if self.size > 1 else [value]
+        if len(values) != self.size:
+            raise ValueError(f"Tag {self.name} cần {self.size} giá trị, nhận {len(values)}")
+        if self.type == 'bit':
+            return [1 if v else 0 for v in values]
+        raw = (np.asarray(values, dtype=np.float64) - self.offset) / self.scale
+        if self.type == 'float':
+            bits = raw.astype(np.float32)
+            if not np.isfinite(bits).all():
+                raise ValueError(f"Giá trị {value} ngoài phạm vi kiểu float của tag {self.name}")
+            bits = bits.view(np.uint32).astype(np.int64)
+        else:
+            raw = np.rint(raw)
+            info = np.iinfo(self.dtype)
+            if (raw < info.min).any() or (raw > info.max).any():
+                raise ValueError(f"Giá trị {value} ngoài phạm vi kiểu {self.type} của tag {self.name}")
+            bits = raw.astype(np.int64) & (0xFFFF if self.words == 1 else 0xFFFFFFFF)
+        if self.words == 2:
+            bits = np.stack([bits & 0xFFFF, bits >> 16], axis=1).ravel()
+        return ((bits ^ 0x8000) - 0x8000).tolist()
+
+    def write_kwargs(self, value):
+        """Tham số cho hàm ghi (write_func) của rk_mcprotocol / slmp_async"""
+        if self.device.is_bit:
+            return {'headdevice': self.headdevice, 'data_list': self.encode(value)}
+        return {'headdevice': self.headdevice, 'data_list': self.encode(value), 'signed_type': True}
+
+    def to_dict(self):
+        data = {'name': self.name, 'address': self.address}
+        if self.plc is not None:
+            data['plc'] = self.plc
+        if self.size != 1:
+            data['size'] = self.size
+        if self.type != ('bit' if self.device.is_bit else 'int16'):
+            data['type'] = self.type
+        if self.scale != 1.0:
+            data['scale'] = self.scale
+        if self.offset != 0.0:
+            data['offset'] = self.offset
+        if self.unit:
+            data['unit'] = self.unit
+        return data
+
+    def __repr__(self):
+        return f"TagDef({self.name}, {self.address}, {self.type})"
+
+
+class BlockDecoder:
+    """Mảng chỉ số đã biên dịch để giải mã giá trị thô của một ReadBlock thành giá trị tag.
+
+    Các tag cùng kiểu (và cùng có/không quy đổi) trong block được giải mã
+    chung một lần bằng numpy.
+    """
+    def __init__(self, block, tags):
+        groups = {}
+        for name, offset, size in block.items:
+            tag = tags[name]
+            groups.setdefault((tag.type, tag.scaled), []).append((tag, offset))
+        self.groups = []
+        for (type_name, scaled), entries in groups.items():
+            dtype, words = TYPES[type_name]
+            index, slices, scale, offset = [], [], [], []
+            for tag, start in entries:
+                first = len(index)
+                index.extend(start + i * words for i in range(tag.size))
+                slices.append((tag.name, tag.size, first, len(index)))
+                scale.extend([tag.scale] * tag.size)
+                offset.extend([tag.offset] * tag.size)
+            self.groups.append((dtype, words, np.array(index, dtype=np.intp), slices,
+                                np.array(scale) if scaled else None, np.array(offset) if scaled else None))
+
+    def decode(self, raw, result):
+        # Word đọc với signed_type=True hay False đều quy về cùng mẫu bit 16 bit
+        words = np.asarray(raw, dtype=np.int64).astype(np.uint16)
+        for dtype, size, index, slices, scale, offset in self.groups:
+            if dtype is None:
+                values = words[index]
+            elif size == 1:
+                values = words[index].view(dtype)
+            else:
+                values = (words[index].astype(np.uint32) | (words[index + 1].astype(np.uint32) << 16)).view(dtype)
+            if scale is not None:
+                values = values * scale + offset
+            values = values.tolist()
+            for name, count, first, last in slices:
+                result[name] = values[first] if count == 1 else values[first:last]
+        return result
+
+
+class TagReadPlan:
+    """Kế hoạch đọc gộp đã biên dịch cho một nhóm tag: các ReadBlock và bộ giải mã của chúng"""
+    def __init__(self, tags, gap_bytes=DEFAULT_GAP_BYTES):
+        self.tags = {tag.name: tag for tag in tags}
+        points = [(tag.name, tag.device, tag.start, tag.points) for tag in self.tags.values()]
+        self.blocks = plan_points(points, gap_bytes)
+        self.decoders = [BlockDecoder(block, self.tags) for block in self.blocks]
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def decode(self, raws):
+        """Giá trị thô của từng block (theo thứ tự self.blocks) -> {tên tag: giá trị}"""
+        result = {}
+        for decoder, raw in zip(self.decoders, raws):
+            decoder.decode(raw, result)
+        return result
+
+    def execute(self, s, protocol=mc):
+        return self.decode([read_block(s, block, True, protocol) for block in self.blocks])
+
+
+class TagDatabase:
+    """Bảng tag theo tên, đọc/ghi qua kế hoạch đã biên dịch sẵn.
+
+    Kế hoạch đọc cho mỗi nhóm tag được dựng một lần và dùng lại; lệnh ghi
+    dùng headdevice tính sẵn của tag, không tạo lại chuỗi địa chỉ mỗi lần gọi.
+    """
+    def __init__(self, tags=(), gap_bytes=DEFAULT_GAP_BYTES):
+        self.tags = {}
+        self.gap_bytes = gap_bytes
+        self._plans = {}
+        for tag in tags:
+            self.add(tag)
+
+    def add(self, tag):
+        if tag.name in self.tags:
+            raise ValueError(f"Tag {tag.name} đã có trong bảng tag")
+        self.tags[tag.name] = tag
+        self._plans.clear()
+        return tag
+
+    def remove(self, name):
+        del self.tags[name]
+        self._plans.clear()
+
+    def define(self, name, address, type=None, size=1, scale=1.0, offset=0.0, unit=''):
+        return self.add(TagDef(name, address, size=size, type=type, scale=scale, offset=offset, unit=unit))
+
+    def __getitem__(self, name):
+        return self.tags[name]
+
+    def __contains__(self, name):
+        return name in self.tags
+
+    def __iter__(self):
+        return iter(self.tags.values())
+
+    def __len__(self):
+        return len(self.tags)
+
+    def plan(self, names=None):
+        """Kế hoạch đọc cho các tag names (mặc định: mọi tag), được dựng sẵn và lưu lại"""
+        key = None if names is None else tuple(names)
+        plan = self._plans.get(key)
+        if plan is None:
+            tags = self.tags.values() if names is None else [self.tags[name] for name in names]
+            plan = self._plans[key] = TagReadPlan(tags, self.gap_bytes)
+        return plan
+
+    def read(self, s, names=None, protocol=mc):
+        """Đọc các tag, trả về {tên tag: giá trị kỹ thuật}"""
+        return self.plan(names).execute(s, protocol)
+
+    def write(self, s, name, value, protocol=mc):
+        """Ghi ngay một tag qua socket"""
+        tag = self.tags[name]
+        return check_result(getattr(protocol, tag.write_func)(s, **tag.write_kwargs(value)))
+
+    def queue_write(self, queue, name, value):
+        """Đưa lệnh ghi một tag vào WriteQueue (các word của tag 32 bit nằm liền nhau)"""
+        tag = self.tags[name]
+        for offset, word in enumerate(tag.encode(value)):
+            queue.write_point(tag.device, tag.start + offset, word, tag.name)
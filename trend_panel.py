@@ -0,0 +1,327 @@
+import time
+import numpy as np
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtCore import Qt, QPointF, QRectF
+from PyQt5.QtGui import QPainter, QPen, QColor, QPolygonF
+
+# Mỗi mức của tháp min/max gộp FACTOR phần tử của mức dưới
+FACTOR = 8
+TRACE_COLORS = ['#2980b9', '#c0392b', '#27ae60', '#8e44ad', '#d35400', '#16a085', '#2c3e50', '#f39c12']
+
+
+class TraceLevel:
+    """Một mức của tháp: vòng đệm thời gian đầu / thời gian cuối / min / max cấp phát sẵn"""
+    def __init__(self, capacity, shared=False):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.mins = np.zeros(capacity, dtype=np.float32)
+        # Mức 0 là mẫu gốc: min và max là cùng một mảng, thời gian cuối là thời gian mẫu
+        self.maxs = self.mins if shared else np.zeros(capacity, dtype=np.float32)
+        self.ends = self.times if shared else np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+
+    @property
+    def first(self):
+        """Số thứ tự phần tử cũ nhất còn trong vòng đệm"""
+        return max(0, self.count - self.capacity)
+
+    def write(self, times, mins, maxs, ends):
+        n = len(times)
+        if n > self.capacity:
+            times, mins, maxs, ends = (times[-self.capacity:], mins[-self.capacity:],
+                                       maxs[-self.capacity:], ends[-self.capacity:])
+            self.count += n - self.capacity
+            n = self.capacity
+        position = self.count % self.capacity
+        first = min(n, self.capacity - position)
+        arrays = [(self.times, times), (self.mins, mins)]
+        if self.maxs is not self.mins:
+            arrays += [(self.maxs, maxs), (self.ends, ends)]
+        for target, source in arrays:
+            target[position:position + first] = source[:first]
+            if first < n:
+                target[:n - first] = source[first:]
+        self.count += n
+
+    def search(self, t):
+        """Số thứ tự phần tử đầu tiên có thời gian >= t (thời gian tăng dần theo số thứ tự)"""
+        lo, hi = self.first, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[mid % self.capacity] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def take(self, start, stop):
+        return self.take_seq(np.arange(start, stop))
+
+    def take_seq(self, seqs):
+        positions = seqs % self.capacity
+        return self.times[positions], self.mins[positions], self.maxs[positions], self.ends[positions]
+
+
+class MinMaxTrace:
+    """Lịch sử một đường xu hướng dạng tháp min/max.
+
+    Mức 0 giữ các mẫu gốc, mức k giữ min/max và thời gian đầu/cuối của từng
+    nhóm FACTOR^k mẫu. Khi vẽ, mức thô nhất có mọi nhóm trong cửa sổ ngắn hơn
+    một cột điểm ảnh được chọn (thường 1 - FACTOR phần tử mỗi cột), nên chi phí
+    vẽ phụ thuộc độ rộng widget chứ không phụ thuộc số mẫu (hàng giờ dữ liệu
+    vẫn vẽ nhanh như vài giây).
+    """
+    def __init__(self, name, capacity=1 << 18):
+        self.name = name
+        self.levels = [TraceLevel(capacity, shared=True)]
+        size = capacity // FACTOR
+        while size >= 256:
+            self.levels.append(TraceLevel(size))
+            size //= FACTOR
+        self.last = None
+
+    def append(self, times, values):
+        """Thêm một loạt mẫu (thời gian tăng dần); các mức trên được gộp theo lô bằng numpy"""
+        if len(times) == 0:
+            return
+        self.last = (float(times[-1]), float(values[-1]))
+        self.levels[0].write(times, values, values, times)
+        for lower, upper in zip(self.levels, self.levels[1:]):
+            ready = lower.count // FACTOR
+            if ready <= upper.count:
+                break
+            # Nhóm có phần tử đã bị ghi đè (lô lớn hơn vòng đệm) bị bỏ qua
+            first = max(upper.count, -(-lower.first // FACTOR))
+            upper.count = first
+            if first < ready:
+                times, mins, maxs, ends = lower.take(first * FACTOR, ready * FACTOR)
+                upper.write(times[::FACTOR], mins.reshape(-1, FACTOR).min(axis=1),
+                            maxs.reshape(-1, FACTOR).max(axis=1), ends[FACTOR - 1::FACTOR])
+
+    def columns(self, t0, t1, width):
+        """(cột, min, max) của các cột điểm ảnh có dữ liệu trong [t0, t1] trên width cột.
+
+        Dùng mức thô nhất có mọi nhóm trong cửa sổ ngắn hơn một cột; nhóm nào
+        vắt qua ranh giới hai cột được tách xuống các nhóm con ở mức dưới (tới
+        mẫu gốc nếu cần), nên min/max mỗi cột đúng bằng min/max các mẫu trong
+        cột. Chỉ khi nhóm con đã bị ghi đè khỏi vòng đệm mức dưới, nhóm được
+        tính vào cả hai cột (sai lệch tối đa một cột ở phần dữ liệu cũ nhất).
+        """
+        scale = width / max(t1 - t0, 1e-9)
+        column_time = 1.0 / scale
+        for level_index in range(len(self.levels) - 1, -1, -1):
+            level = self.levels[level_index]
+            # Kể cả nhóm bắt đầu trước t0 nhưng kéo vào cửa sổ
+            seqs = np.arange(max(level.first, level.search(t0) - 1), level.search(t1 + 1e-9))
+            times, mins, maxs, ends = level.take_seq(seqs)
+            keep = ends >= t0
+            seqs, times, mins, maxs, ends = seqs[keep], times[keep], mins[keep], maxs[keep], ends[keep]
+            if level_index == 0 or len(times) == 0 or (ends - times).max() <= column_time:
+                break
+        col_mins = np.full(width, np.inf, dtype=np.float32)
+        col_maxs = np.full(width, -np.inf, dtype=np.float32)
+
+        def column(t):
+            return np.clip(((t - t0) * scale).astype(np.intp), 0, width - 1)
+
+        def add(cols, mins, maxs):
+            np.minimum.at(col_mins, cols, mins)
+            np.maximum.at(col_maxs, cols, maxs)
+
+        if level_index:
+            # Các mẫu mới nhất chưa đủ một nhóm của mức này: lấy từ mức 0 (ít hơn FACTOR^k mẫu)
+            base = self.levels[0]
+            tail = base.take(max(level.count * FACTOR ** level_index, base.search(t0)), base.search(t1 + 1e-9))
+            add(column(tail[0]), tail[1], tail[2])
+        while len(seqs):
+            first, last = column(times), column(ends)
+            # Nhóm vắt qua ranh giới cột hoặc qua mép cửa sổ được tách tiếp
+            inside = (first == last) & (times >= t0) & (ends <= t1)
+            add(first[inside], mins[inside], maxs[inside])
+            seqs = seqs[~inside]
+            if level_index == 0 or len(seqs) == 0:
+                break
+            lower = self.levels[level_index - 1]
+            # Nhóm con đã bị ghi đè ở mức dưới: tính nhóm vào cả hai cột
+            lost = seqs * FACTOR < lower.first
+            if lost.any():
+                straddle = np.flatnonzero(~inside)[lost]
+                add(first[straddle], mins[straddle], maxs[straddle])
+                add(last[straddle], mins[straddle], maxs[straddle])
+                seqs = seqs[~lost]
+            seqs = (seqs[:, None] * FACTOR + np.arange(FACTOR)).ravel()
+            level_index -= 1
+            times, mins, maxs, ends = lower.take_seq(seqs)
+            keep = (times <= t1) & (ends >= t0)
+            seqs, times, mins, maxs, ends = seqs[keep], times[keep], mins[keep], maxs[keep], ends[keep]
+        cols = np.flatnonzero(col_maxs >= col_mins)
+        return cols, col_mins[cols], col_maxs[cols]
+
+
+class TrendWidget(QWidget):
+    """Biểu đồ xu hướng nhiều đường, cập nhật theo lô mỗi khung hình.
+
+    add_sample() chỉ ghi vào mảng đệm cấp phát sẵn (không tạo đối tượng mỗi
+    mẫu); flush() được gọi theo QTimer (~30 lần/giây) đưa cả lô vào các
+    MinMaxTrace rồi vẽ lại một lần. Mỗi đường dùng lại một QPolygonF 2 điểm mỗi
+    cột (max, min) được điền thẳng từ numpy.
+    """
+    def __init__(self, parent=None, window=60.0, stage_size=4096):
+        super().__init__(parent)
+        self.setMinimumHeight(200)
+        self.window = window  # giây hiển thị, None = toàn bộ lịch sử
+        self.traces = {}
+        self.colors = {}
+        self.stage_size = stage_size
+        self._stage = {}      # tên -> (mảng thời gian, mảng giá trị, [số mẫu])
+        self._polygons = {}
+        self.paused = False
+        self.render_ms = 0.0
+
+    def add_trace(self, name, capacity=1 << 18):
+        if name in self.traces:
+            return self.traces[name]
+        trace = self.traces[name] = MinMaxTrace(name, capacity)
+        self.colors[name] = QColor(TRACE_COLORS[(len(self.traces) - 1) % len(TRACE_COLORS)])
+        self._stage[name] = (np.zeros(self.stage_size), np.zeros(self.stage_size), [0])
+        return trace
+
+    def remove_trace(self, name):
+        self.traces.pop(name, None)
+        self.colors.pop(name, None)
+        self._stage.pop(name, None)
+        self._polygons.pop(name, None)
+        self.update()
+
+    def clear(self):
+        for name in list(self.traces):
+            self.remove_trace(name)
+
+    def add_sample(self, name, timestamp, value):
+        stage = self._stage.get(name)
+        if stage is None:
+            return
+        times, values, count = stage
+        if count[0] == len(times):
+            self._flush_trace(name)
+        times[count[0]] = timestamp
+        values[count[0]] = value
+        count[0] += 1
+
+    def add_values(self, values, timestamp=None):
+        """Kết quả một lần đọc {tên: giá trị}; tên không có đường tương ứng bị bỏ qua"""
+        timestamp = time.time() if timestamp is None else timestamp
+        for name, value in values.items():
+            if name in self._stage and not isinstance(value, (list, tuple)):
+                self.add_sample(name, timestamp, value)
+
+    def _flush_trace(self, name):
+        times, values, count = self._stage[name]
+        if count[0]:
+            self.traces[name].append(times[:count[0]], values[:count[0]])
+            count[0] = 0
+
+    def flush(self):
+        """Đưa các mẫu đang chờ vào lịch sử và vẽ lại (gọi mỗi khung hình)"""
+        pending = False
+        for name in self._stage:
+            if self._stage[name][2][0]:
+                self._flush_trace(name)
+                pending = True
+        if pending and not self.paused:
+            self.update()
+
+    def time_range(self):
+        latest = [trace.last[0] for trace in self.traces.values() if trace.last is not None]
+        if not latest:
+            return None
+        t1 = max(latest)
+        if self.window is not None:
+            return t1 - self.window, t1
+        oldest = [trace.levels[0].times[trace.levels[0].first % trace.levels[0].capacity]
+                  for trace in self.traces.values() if trace.last is not None]
+        return min(oldest), t1
+
+    def _polygon(self, name, size):
+        polygon = self._polygons.get(name)
+        if polygon is None or polygon.size() != size:
+            polygon = self._polygons[name] = QPolygonF(size)
+        pointer = polygon.data()
+        pointer.setsize(size * 2 * 8)
+        return polygon, np.frombuffer(pointer, dtype=np.float64).reshape(size, 2)
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor('white'))
+        metrics = painter.fontMetrics()
+        margin_right, margin_top, margin_bottom = 10, 10, metrics.height() + 6
+        span = self.time_range()
+        if span is None or not self.traces:
+            painter.drawText(self.rect(), Qt.AlignCenter, "Chưa có dữ liệu")
+            return
+        t0, t1 = span
+        # Số cột được tính theo độ rộng ước lượng; nhãn trục y chỉ làm lệch vài cột
+        width = max(1, self.width() - 80)
+        columns = {name: trace.columns(t0, t1, width) for name, trace in self.traces.items()}
+        lows = [c[1].min() for c in columns.values() if len(c[0])]
+        highs = [c[2].max() for c in columns.values() if len(c[0])]
+        if not lows:
+            painter.drawText(self.rect(), Qt.AlignCenter, "Không có dữ liệu trong khoảng thời gian")
+            return
+        y_min, y_max = float(min(lows)), float(max(highs))
+        if y_max - y_min < 1e-9:
+            y_min, y_max = y_min - 1, y_max + 1
+        pad = (y_max - y_min) * 0.05
+        y_min, y_max = y_min - pad, y_max + pad
+        labels = [f"{y_max - (y_max - y_min) * i / 4:.6g}" for i in range(5)]
+        margin_left = max(metrics.horizontalAdvance(label) for label in labels) + 10
+        plot = QRectF(margin_left, margin_top, max(10, self.width() - margin_left - margin_right),
+                      max(10, self.height() - margin_top - margin_bottom))
+        painter.setPen(QPen(QColor('#bdc3c7')))
+        painter.drawRect(plot)
+        x_scale = plot.width() / width
+        y_scale = plot.height() / (y_max - y_min)
+
+        # Lưới và nhãn trục
+        painter.setPen(QPen(QColor('#ecf0f1')))
+        for i in range(1, 4):
+            y = plot.top() + plot.height() * i / 4
+            painter.drawLine(QPointF(plot.left(), y), QPointF(plot.right(), y))
+        painter.setPen(QPen(QColor('#7f8c8d')))
+        for i, label in enumerate(labels):
+            painter.drawText(QRectF(0, plot.top() + plot.height() * i / 4 - 8, margin_left - 5, 16),
+                             Qt.AlignRight | Qt.AlignVCenter, label)
+        painter.drawText(QRectF(plot.left(), plot.bottom() + 2, plot.width(), margin_bottom - 2),
+                         Qt.AlignLeft, time.strftime('%H:%M:%S', time.localtime(t0)))
+        painter.drawText(QRectF(plot.left(), plot.bottom() + 2, plot.width(), margin_bottom - 2),
+                         Qt.AlignRight, time.strftime('%H:%M:%S', time.localtime(t1)))
+
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.setClipRect(plot)
+        for name, (cols, mins, maxs) in columns.items():
+            if not len(cols):
+                continue
+            polygon, points = self._polygon(name, 2 * width)
+            n = len(cols)
+            # Mỗi cột hai điểm: max rồi min - đường nét đứng thể hiện toàn bộ dao động trong cột
+            points[0:2 * n:2, 0] = points[1:2 * n:2, 0] = plot.left() + (cols + 0.5) * x_scale
+            points[0:2 * n:2, 1] = plot.bottom() - (maxs - y_min) * y_scale
+            points[1:2 * n:2, 1] = plot.bottom() - (mins - y_min) * y_scale
+            points[2 * n:] = points[2 * n - 1]
+            # Bút 1 px (cosmetic): bút dày hơn làm drawPolyline chậm đi vài lần
+            painter.setPen(QPen(self.colors[name], 0))
+            painter.drawPolyline(polygon)
+        painter.setClipping(False)
+
+        # Chú thích: tên và giá trị mới nhất
+        x = plot.left() + 6
+        for name, trace in self.traces.items():
+            if trace.last is None:
+                continue
+            text = f"{name} = {trace.last[1]:.6g}"
+            painter.setPen(QPen(self.colors[name]))
+            painter.drawText(QPointF(x, plot.top() + 14), text)
+            x += painter.fontMetrics().horizontalAdvance(text) + 16
+        painter.end()
+        self.render_ms = (time.perf_counter() - start) * 1000
@@ -0,0 +1,178 @@
+import sys
+import time
+import argparse
+import cv2
+import rk_mcprotocol as mc
+from plc_devices import parse_address, check_range, headdevice
+from hsv_mask import ColorClassifier, load_colors, measure_colors
+from roi import load_rois, measure_rois
+from project import load_project
+from frame_pipeline import FrameQueue, CaptureWorker, ProcessingWorker, LatencyStats
+from write_queue import WriteQueue, socket_sender
+
+# Words written per color, starting at its register:
+# +0/+1 pixel count (low/high word), +2/+3 centroid x/y, +4..+7 bounding box x/y/w/h
+WORDS_PER_COLOR = 8
+
+
+def to_word(value):
+    """Signed 16-bit representation of an unsigned word (write_sign_word uses signed values)"""
+    value &= 0xFFFF
+    return value - 0x10000 if value >= 0x8000 else value
+
+
+class ColorOutput:
+    """PLC addresses a color is published to"""
+    def __init__(self, register, presence):
+        self.register = parse_address(register)
+        self.presence = parse_address(presence) if presence else None
+
+    def writes(self, measurement, min_pixels):
+        device, address = self.register
+        count = measurement.count
+        words = [count & 0xFFFF, count >> 16, *measurement.centroid, *measurement.bbox]
+        for offset, word in enumerate(words):
+            yield headdevice(device, address + offset), to_word(word)
+        if self.presence is not None:
+            device, address = self.presence
+            yield headdevice(device, address), 1 if count >= min_pixels else 0
+
+
+class VisionBridge:
+    """Headless pipeline: camera -> saved color classification -> D/R registers and M bits.
+
+    All writes of one frame go through a WriteQueue flushed at the end of the
+    frame, so adjacent registers of every color leave in as few block writes
+    as possible. Latency is measured from frame capture to the PLC
+    acknowledging the last write of that frame.
+    """
+    def __init__(self, colors, outputs, sender, min_pixels=50, rois=None, classifier=None):
+        self.colors = colors
+        self.rois = rois or []
+        self.outputs = outputs
+        self.min_pixels = min_pixels
+        self.classifier = classifier if classifier is not None else ColorClassifier(colors)
+        self.write_queue = WriteQueue(sender, max_pending=1 << 30)
+        self.latency = LatencyStats()
+        self.frames = 0
+        self.write_errors = 0
+        self.last_measurements = []
+
+    def process(self, frame):
+        if self.rois:
+            # Only the ROI crops are converted and classified; outputs go ROI by ROI
+            measurements = []
+            for roi, roi_measurements in measure_rois(frame.image, self.rois, self.colors, self.classifier):
+                for measurement in roi_measurements:
+                    measurement.name = f"{roi.name}.{measurement.name}"
+                measurements.extend(roi_measurements)
+        else:
+            hsv = cv2.cvtColor(frame.image, cv2.COLOR_BGR2HSV)
+            labels = self.classifier.classify(hsv)
+            measurements = measure_colors(labels, self.colors)
+        for measurement, output in zip(measurements, self.outputs):
+            for tag, value in output.writes(measurement, self.min_pixels):
+                self.write_queue.write(tag, value)
+        report = self.write_queue.flush()
+        self.write_errors += len(report.errors)
+        self.latency.add((time.monotonic() - frame.timestamp) * 1000)
+        self.frames += 1
+        self.last_measurements = measurements
+        return measurements
+
+
+def build_outputs(count, register_base, presence_base):
+    """Consecutive register blocks (WORDS_PER_COLOR words) and presence bits, one per measurement.
+
+    Raises ValueError when the blocks or bits run past the end of their device.
+    """
+    register_device, register_address = parse_address(register_base)
+    presence = parse_address(presence_base) if presence_base else None
+    if count:
+        check_range(register_device, register_address, count * WORDS_PER_COLOR)
+        if presence:
+            check_range(presence[0], presence[1], count)
+    outputs = []
+    for index in range(count):
+        register = headdevice(register_device, register_address + index * WORDS_PER_COLOR)
+        bit = headdevice(presence[0], presence[1] + index) if presence else None
+        outputs.append(ColorOutput(register, bit))
+    return outputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publish per-color detection results to the PLC")
+    sources = parser.add_mutually_exclusive_group(required=True)
+    sources.add_argument('--colors', help="color file saved by hsv_color_checker.py")
+    sources.add_argument('--project', help="project file (project.py); also supplies the PLC host/port")
+    parser.add_argument('--camera', type=int, default=0)
+    parser.add_argument('--video', default=None, help="read frames from a video file instead of a camera")
+    parser.add_argument('--host', default=None, help="default: the project PLC, else 192.168.0.23")
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--backend', choices=('rk', 'async'), default='rk')
+    parser.add_argument('--register-base', default='D100',
+                        help=f"first register; each color uses {WORDS_PER_COLOR} words")
+    parser.add_argument('--presence-base', default='M100', help="first presence bit, one per color")
+    parser.add_argument('--min-pixels', type=int, default=50, help="pixel count that sets the presence bit")
+    parser.add_argument('--stats-interval', type=float, default=1.0)
+    parser.add_argument('--rois', action='store_true',
+                        help="measure only inside the saved ROIs, one output block per ROI and color")
+    args = parser.parse_args(argv)
+
+    protocol = mc
+    if args.backend == 'async':
+        import slmp_async as protocol
+
+    host, port = args.host or '192.168.0.23', args.port or 1025
+    classifier = None
+    if args.project:
+        project = load_project(args.project)
+        classifier = project.classifier
+        colors = project.colors
+        rois = project.rois if args.rois else []
+        endpoint = project.plc()
+        if endpoint is not None:
+            host, port = args.host or endpoint.host, args.port or endpoint.port
+    else:
+        colors = load_colors(args.colors)
+        rois = load_rois(args.colors) if args.rois else []
+    if args.rois and not rois:
+        print("The color file has no ROIs")
+        return 1
+    try:
+        outputs = build_outputs(len(colors) * max(1, len(rois)), args.register_base, args.presence_base)
+    except ValueError as e:
+        print(f"Invalid output addresses: {e}")
+        return 1
+    source = cv2.VideoCapture(args.video if args.video else args.camera)
+    if not source.isOpened():
+        print("Cannot open video source")
+        return 1
+    s = protocol.open_socket(host, port)
+    bridge = VisionBridge(colors, outputs, socket_sender(s, protocol), args.min_pixels, rois, classifier)
+
+    queue = FrameQueue(maxsize=2)
+    capture = CaptureWorker(source, queue)
+    processing = ProcessingWorker(queue, bridge.process, lambda result: None)
+    capture.start()
+    processing.start()
+    try:
+        while processing.is_alive():
+            processing.join(args.stats_interval)
+            summary = ", ".join(f"{m.name}={m.count}" for m in bridge.last_measurements)
+            print(f"capture {capture.meter.rate:5.1f} fps | processing {processing.meter.rate:5.1f} fps | "
+                  f"dropped {queue.dropped} | latency p50 {bridge.latency.percentile(50):.1f} ms "
+                  f"p99 {bridge.latency.percentile(99):.1f} ms | write errors {bridge.write_errors} | {summary}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.stop()
+        queue.close()
+        processing.stop()
+        source.release()
+        s.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+import sys
+import json
+import time
+import argparse
+import threading
+import cv2
+from hsv_mask import ColorClassifier, load_colors, measure_colors
+from roi import ROI, load_rois, measure_rois
+from frame_pipeline import FrameQueue, CaptureWorker, ProcessingWorker, LatencyStats, StageTimer
+from blob_analysis import BlobAnalyzer, FrameSkipper, wall_time
+
+
+def rescale(values, factor):
+    """Coordinates measured on a scaled frame, back in full-frame pixels"""
+    return tuple(int(round(v * factor)) if isinstance(v, int) else v * factor for v in values)
+
+
+def scale_roi(roi, scale):
+    return ROI(roi.name, [(x * scale, y * scale) for x, y in roi.points])
+
+
+class VisionRunner:
+    """Capture -> HSV mask -> measurements without a window, for line PCs with no display.
+
+    Frames can be decimated (every n-th frame, or adaptively while processing
+    is slower than the camera) and downscaled before the HSV conversion to cap
+    CPU use; measurements are reported in full-frame pixels either way.
+    Every stage is timed into self.timer.
+    """
+    def __init__(self, colors, rois=(), scale=1.0, every=1, adaptive=False, analyzer=None):
+        self.colors = colors
+        self.names = [color.get('name', f"Color_{index + 1}") for index, color in enumerate(colors)]
+        self.classifier = ColorClassifier(colors)
+        self.scale = scale
+        self.rois = [scale_roi(roi, scale) for roi in rois] if scale != 1.0 else list(rois)
+        if adaptive:
+            self.skipper = FrameSkipper('adaptive')
+        else:
+            self.skipper = FrameSkipper('every' if every > 1 else 'none', every)
+        self.analyzer = analyzer
+        if analyzer is not None and scale != 1.0:
+            # Area limits are given in full-frame pixels
+            analyzer.min_area = max(1, int(analyzer.min_area * scale * scale))
+            if analyzer.max_area is not None:
+                analyzer.max_area = int(analyzer.max_area * scale * scale)
+        self.timer = StageTimer()
+        self.latency = LatencyStats()
+        self.buffer = None
+
+    def resize(self, image):
+        if self.scale == 1.0:
+            return image
+        height, width = image.shape[:2]
+        size = (max(1, int(width * self.scale)), max(1, int(height * self.scale)))
+        if self.buffer is None or self.buffer.shape[:2] != (size[1], size[0]):
+            self.buffer = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        else:
+            cv2.resize(image, size, dst=self.buffer, interpolation=cv2.INTER_AREA)
+        return self.buffer
+
+    def process(self, frame):
+        """Result dict of one frame (JSON-serializable), or None for a skipped frame"""
+        if not self.skipper.should_process(frame):
+            return None
+        start = time.perf_counter()
+        image = self.resize(frame.image)
+        factor = 1.0 / self.scale
+        stamps = [('scale', time.perf_counter())]
+        result = {'frame': frame.index, 'timestamp': wall_time(frame.timestamp)}
+
+        if self.rois:
+            rois = {}
+            for roi, measurements in measure_rois(image, self.rois, self.colors, self.classifier):
+                rois[roi.name] = [self._measurement(m, factor) for m in measurements]
+            result['rois'] = rois
+            stamps.append(('rois', time.perf_counter()))
+        else:
+            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+            stamps.append(('hsv', time.perf_counter()))
+            labels = self.classifier.classify(hsv)
+            stamps.append(('classify', time.perf_counter()))
+            result['colors'] = [self._measurement(m, factor) for m in measure_colors(labels, self.colors)]
+            stamps.append(('measure', time.perf_counter()))
+            if self.analyzer is not None:
+                blobs = {}
+                for index, name in enumerate(self.names):
+                    analysis = self.analyzer.analyze(self.classifier.mask(labels, index))
+                    blobs[name] = [{'area': int(round(blob.area * factor * factor)),
+                                    'centroid': rescale(blob.centroid, factor),
+                                    'bbox': rescale(blob.bbox, factor)} for blob in analysis.blobs]
+                result['blobs'] = blobs
+                stamps.append(('blobs', time.perf_counter()))
+
+        previous = start
+        for name, stamp in stamps:
+            self.timer.add(name, stamp - previous)
+            previous = stamp
+        self.skipper.record(previous - start)
+        latency = (time.monotonic() - frame.timestamp) * 1000
+        self.latency.add(latency)
+        result['latency_ms'] = round(latency, 2)
+        return result
+
+    def _measurement(self, m, factor):
+        if factor == 1.0:
+            return m.as_dict()
+        return {'name': m.name, 'count': int(round(m.count * factor * factor)),
+                'centroid': rescale(m.centroid, factor), 'bbox': rescale(m.bbox, factor)}
+
+
+def format_text(result):
+    if 'rois' in result:
+        parts = [f"{roi}: " + ", ".join(f"{m['name']}={m['count']}" for m in measurements)
+                 for roi, measurements in result['rois'].items()]
+    else:
+        parts = [f"{m['name']}={m['count']} @{m['centroid']}" for m in result['colors']]
+        for name, blobs in result.get('blobs', {}).items():
+            parts.append(f"{name} blobs={len(blobs)}")
+    return f"frame {result['frame']} ({result['latency_ms']:.1f} ms): " + " | ".join(parts)
+
+
+class ResultWriter:
+    """Writes results as JSON lines or text lines, flushed per line so pipes see them at once.
+
+    done is set once limit results have been written.
+    """
+    def __init__(self, stream, fmt='json', limit=None):
+        self.stream = stream
+        self.fmt = fmt
+        self.limit = limit
+        self.count = 0
+        self.done = threading.Event()
+
+    def __call__(self, result):
+        if self.done.is_set():
+            return
+        self.count += 1
+        if self.limit is not None and self.count >= self.limit:
+            self.done.set()
+        if self.fmt == 'none':
+            return
+        line = json.dumps(result) if self.fmt == 'json' else format_text(result)
+        self.stream.write(line + '\n')
+        self.stream.flush()
+
+
+def stats_report(runner, capture, processing, queue):
+    return {
+        'capture_fps': round(capture.meter.rate, 1),
+        'processing_fps': round(processing.meter.rate, 1),
+        'processed': runner.skipper.processed,
+        'skipped': runner.skipper.skipped,
+        'dropped': queue.dropped,
+        'latency_p50_ms': round(runner.latency.percentile(50), 2),
+        'latency_p99_ms': round(runner.latency.percentile(99), 2),
+        'stages_ms': {name: round(mean, 2) for name, (mean, _) in runner.timer.summary().items()},
+    }
+
+
+def open_source(args):
+    if args.recording:
+        from frame_recorder import FrameReader, ReplaySource
+        return ReplaySource(FrameReader(args.recording), speed=args.speed)
+    return cv2.VideoCapture(args.video if args.video else args.camera)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the color detection without a display")
+    parser.add_argument('--colors', required=True, help="color or project file saved by hsv_color_checker.py")
+    parser.add_argument('--camera', type=int, default=0)
+    parser.add_argument('--video', default=None, help="read frames from a video file instead of a camera")
+    parser.add_argument('--recording', default=None, help="replay a recording made with frame_recorder.py")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed of --recording, 0 = as fast as possible")
+    parser.add_argument('--rois', action='store_true', help="measure only inside the ROIs saved in the file")
+    parser.add_argument('--blobs', action='store_true', help="also report the blobs of every color")
+    parser.add_argument('--min-area', type=int, default=50, help="smallest blob, in full-frame pixels")
+    parser.add_argument('--scale', type=float, default=1.0, help="downscale frames before processing (e.g. 0.5)")
+    parser.add_argument('--every', type=int, default=1, help="process one frame in every n")
+    parser.add_argument('--adaptive', action='store_true', help="skip frames while processing is slower than the camera")
+    parser.add_argument('--format', choices=('json', 'text', 'none'), default='json',
+                        help="result lines on stdout (or --output)")
+    parser.add_argument('--output', default=None, help="write results to a file instead of stdout")
+    parser.add_argument('--stats-interval', type=float, default=1.0, help="seconds between stats lines on stderr, 0 = off")
+    parser.add_argument('--frames', type=int, default=None, help="stop after this many processed frames")
+    parser.add_argument('--duration', type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args(argv)
+    if not 0 < args.scale <= 1.0:
+        parser.error("--scale must be in (0, 1]")
+    if args.every < 1:
+        parser.error("--every must be at least 1")
+    if args.rois and args.blobs:
+        parser.error("--blobs analyses the whole frame and cannot be combined with --rois")
+
+    # Color and project files share the "colors"/"rois" layout, so the PLC side of project.py is not needed here
+    colors = load_colors(args.colors)
+    rois = load_rois(args.colors) if args.rois else []
+    if args.rois and not rois:
+        print("The color file has no ROIs", file=sys.stderr)
+        return 1
+    analyzer = BlobAnalyzer(min_area=args.min_area) if args.blobs else None
+    runner = VisionRunner(colors, rois, args.scale, args.every, args.adaptive, analyzer)
+
+    source = open_source(args)
+    if not source.isOpened():
+        print("Cannot open video source", file=sys.stderr)
+        return 1
+    stream = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    writer = ResultWriter(stream, args.format, args.frames)
+    # A file is read as fast as it is processed, so it only loses frames to --every/--adaptive
+    queue = FrameQueue(maxsize=2, block=bool(args.video or args.recording))
+    capture = CaptureWorker(source, queue)
+    processing = ProcessingWorker(queue, runner.process, writer)
+    capture.start()
+    processing.start()
+    started = time.monotonic()
+    last_stats = started
+    try:
+        while processing.is_alive() and not writer.done.wait(0.1):
+            now = time.monotonic()
+            if args.stats_interval > 0 and now - last_stats >= args.stats_interval:
+                last_stats = now
+                stats = stats_report(runner, capture, processing, queue)
+                if args.format == 'json':
+                    print(json.dumps({'stats': stats}), file=sys.stderr)
+                else:
+                    stages = ", ".join(f"{name} {ms:.2f}" for name, ms in stats['stages_ms'].items())
+                    print(f"capture {stats['capture_fps']:5.1f} fps | processing {stats['processing_fps']:5.1f} fps | "
+                          f"skipped {stats['skipped']} | dropped {stats['dropped']} | "
+                          f"latency p50 {stats['latency_p50_ms']:.1f} ms p99 {stats['latency_p99_ms']:.1f} ms | "
+                          f"stages (ms) {stages}", file=sys.stderr)
+            if args.duration is not None and now - started >= args.duration:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Close first: a capture thread waiting on a full blocking queue is released
+        queue.close()
+        capture.stop()
+        processing.stop()
+        source.release()
+        if stream is not sys.stdout:
+            stream.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
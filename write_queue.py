@@ -0,0 +1,183 @@
+import time
+import threading
+import rk_mcprotocol as mc
+from plc_devices import parse_address, check_range, format_number, headdevice, frame_limit, check_result
+
+
+class WriteBlock:
+    """Một lần ghi liên tục: các địa chỉ liền nhau trên cùng thiết bị"""
+    def __init__(self, device, start):
+        self.device = device
+        self.start = start
+        self.values = []
+        self.tags = []
+        self.sources = []  # nơi phát lệnh ghi của từng địa chỉ (ví dụ 'quick'), None = không đánh dấu
+
+    @property
+    def headdevice(self):
+        return headdevice(self.device, self.start)
+
+    @property
+    def func_name(self):
+        return 'write_bit' if self.device.is_bit else 'write_sign_word'
+
+    def kwargs(self, signed_type=True):
+        """Tham số cho hàm ghi của rk_mcprotocol / slmp_async"""
+        if self.device.is_bit:
+            return {'headdevice': self.headdevice, 'data_list': list(self.values)}
+        return {'headdevice': self.headdevice, 'data_list': list(self.values), 'signed_type': signed_type}
+
+    def __repr__(self):
+        return f"WriteBlock({self.headdevice}, {self.values})"
+
+
+class FlushReport:
+    """Kết quả một lần flush: các block đã gửi và các lệnh ghi đã bị gộp"""
+    def __init__(self):
+        self.blocks = []
+        self.requested = 0
+        self.coalesced = []  # (tag, giá trị bị thay thế, giá trị cuối)
+        self.errors = []     # (WriteBlock, exception)
+
+    def __repr__(self):
+        return (f"FlushReport(requested={self.requested}, blocks={len(self.blocks)}, "
+                f"coalesced={len(self.coalesced)}, errors={len(self.errors)})")
+
+
+def socket_sender(s, protocol=mc, signed_type=True):
+    """Tạo hàm gửi WriteBlock trực tiếp qua socket (đồng bộ)"""
+    def send(block):
+        check_result(getattr(protocol, block.func_name)(s, **block.kwargs(signed_type)))
+    return send
+
+
+class WriteQueue:
+    """Hàng đợi ghi gộp cho bit M / thanh ghi D.
+
+    Các lệnh ghi tới cùng một địa chỉ được gộp (lệnh sau thắng), các địa chỉ
+    liền nhau được đóng gói thành một lần ghi block. Trong một đoạn, thứ tự
+    giữa các địa chỉ khác nhau không được đảm bảo; gọi barrier() khi chương
+    trình PLC phụ thuộc vào thứ tự ghi - mọi lệnh trước barrier được gửi xong
+    trước các lệnh sau nó và không bị gộp qua barrier.
+
+    Hàng đợi tự flush khi số lệnh chờ đạt max_pending, hoặc khi poll() / luồng
+    nền (start()) thấy lệnh cũ nhất đã chờ quá flush_interval giây.
+    """
+    def __init__(self, sender, flush_interval=0.05, max_pending=256, on_flush=None):
+        self.sender = sender
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.on_flush = on_flush
+        self._segments = [{}]  # mỗi đoạn: {(thiết bị, địa chỉ): (tag, giá trị, Device, nguồn)}
+        self._requested = 0
+        self._coalesced = []
+        self._first_at = None
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def write(self, tag, value):
+        device, address = parse_address(tag)
+        return self.write_point(device, address, value, tag)
+
+    def write_point(self, device, address, value, tag=None, source=None):
+        """Ghi theo (Device, số địa chỉ) đã tách sẵn, không phải tách chuỗi địa chỉ mỗi lần.
+
+        source đánh dấu nơi phát lệnh ghi, được giữ trong WriteBlock.sources
+        (lệnh sau thắng khi gộp cùng địa chỉ).
+        """
+        if tag is None:
+            check_range(device, address)
+            tag = f"{device.name}{format_number(device, address)}"
+        if device.is_bit:
+            value = 1 if value else 0
+        key = (device.name, address)
+        with self._lock:
+            segment = self._segments[-1]
+            previous = segment.get(key)
+            if previous is not None:
+                self._coalesced.append((previous[0], previous[1], value))
+            segment[key] = (tag, value, device, source)
+            self._requested += 1
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            full = self.pending() >= self.max_pending
+        if full:
+            return self.flush()
+        return None
+
+    def barrier(self):
+        """Các lệnh ghi sau barrier chỉ được gửi sau khi các lệnh trước đó đã gửi"""
+        with self._lock:
+            if self._segments[-1]:
+                self._segments.append({})
+
+    def pending(self):
+        return sum(len(segment) for segment in self._segments)
+
+    def poll(self):
+        """Flush nếu lệnh cũ nhất đã chờ quá flush_interval; gọi định kỳ (QTimer, vòng lặp)"""
+        first_at = self._first_at
+        if first_at is not None and time.monotonic() - first_at >= self.flush_interval:
+            return self.flush()
+        return None
+
+    def flush(self):
+        with self._lock:
+            segments = [segment for segment in self._segments if segment]
+            report = FlushReport()
+            report.requested = self._requested
+            report.coalesced = self._coalesced
+            self._segments = [{}]
+            self._requested = 0
+            self._coalesced = []
+            self._first_at = None
+
+        with self._send_lock:
+            for segment in segments:
+                for block in pack_segment(segment):
+                    report.blocks.append(block)
+                    try:
+                        self.sender(block)
+                    except Exception as e:
+                        report.errors.append((block, e))
+        if self.on_flush is not None and (report.blocks or report.errors):
+            self.on_flush(report)
+        return report
+
+    def start(self):
+        """Chạy luồng nền gọi poll() theo flush_interval"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='write-queue', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval / 2):
+            self.poll()
+
+
+def pack_segment(segment):
+    """Đóng gói các lệnh ghi trong một đoạn thành các WriteBlock liên tục"""
+    blocks = []
+    block = None
+    for key in sorted(segment):
+        tag, value, device, source = segment[key]
+        address = key[1]
+        if (block is None or block.device is not device
+                or block.start + len(block.values) != address
+                or len(block.values) >= frame_limit(device)):
+            block = WriteBlock(device, address)
+            blocks.append(block)
+        block.values.append(value)
+        block.tags.append(tag)
+        block.sources.append(source)
+    return blocks